@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, Text
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, Text, Index, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
@@ -51,7 +51,28 @@ class PredictionHistory(Base):
     result_data = Column(Text, nullable=True)  # JSON string of results
     reliability_score = Column(String(20), nullable=True)
     confidence = Column(String(10), nullable=True)
+    input_fingerprint = Column(String(64), nullable=True)  # Hash of the prediction inputs, prompt and model
     created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index('ix_prediction_history_user_fingerprint', 'user_id', 'input_fingerprint'),
+        Index('ix_prediction_history_user_supplier', 'user_id', 'supplier_id'),
+    )
+
+class BatchCheckpoint(Base):
+    __tablename__ = 'batch_checkpoints'
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, nullable=False)
+    upload_fingerprint = Column(String(64), nullable=False)  # sha256 of the uploaded file
+    row_start = Column(Integer, nullable=False)
+    row_end = Column(Integer, nullable=False)
+    result_data = Column(Text, nullable=False)  # JSON: the chunk's results and summary
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index('ix_batch_checkpoints_user_upload', 'user_id', 'upload_fingerprint', 'row_start'),
+    )
 
 # Database setup
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./supplier_predictor.db")
@@ -64,6 +85,22 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def create_tables():
     Base.metadata.create_all(bind=engine)
+    upgrade_tables()
+
+def upgrade_tables():
+    """Add columns and indexes introduced after an existing database was created"""
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=engine.dialect)
+            with engine.begin() as conn:
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+            print(f"✅ Added column {table.name}.{column.name}")
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
 
 def get_db():
     db = SessionLocal()
@@ -6,8 +6,10 @@ from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
-from backend.routes import predict, auth
+from backend.routes import predict, auth, orders, vendors
 from backend.database import create_tables, create_default_admin
+from backend.services.azure_ai_service import get_ai_service
+from backend.services.faiss_db import close_similarity_engine
 
 app = FastAPI(
     title="Supplier Performance Predictor",
@@ -37,9 +39,18 @@ async def health_check():
     return {
         "status": "healthy",
         "service": "Supplier Performance Predictor",
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "azure_openai": get_ai_service().health_status()
     }
 
+@app.get("/health/ai")
+def ai_health_check(refresh: bool = False):
+    """Cached Azure OpenAI health state; pass refresh=true to probe now."""
+    service = get_ai_service()
+    if refresh:
+        return service.probe_health()
+    return service.health_status()
+
 # Initialize database
 create_tables()
 create_default_admin()
@@ -50,6 +61,17 @@ app.add_middleware(SessionMiddleware, secret_key="your-secret-key-change-this-in
 # Mount static files
 app.mount("/static", StaticFiles(directory="frontend/static"), name="static")
 
+@app.on_event("shutdown")
+async def close_ai_service():
+    await get_ai_service().aclose()
+
+@app.on_event("shutdown")
+def close_similarity_index():
+    # Pending similarity index changes are written before the worker exits
+    close_similarity_engine()
+
 # Include routers
 app.include_router(auth.router)  # Auth routes (includes root)
 app.include_router(predict.router, prefix="/api")
+app.include_router(orders.router, prefix="/api")
+app.include_router(vendors.router, prefix="/api")
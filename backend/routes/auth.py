@@ -14,8 +14,6 @@ import pandas as pd
 from pydantic import BaseModel
 
 from ..database import get_db, User, PredictionHistory, SystemSettings, create_tables, create_default_admin
-from ..services.azure_ai_service import AzureAIService
-from ..services.supplier import predict_reliability
 from observability.langsmith_hook import tracer
 
 def simple_hash_password(password):
@@ -743,7 +741,10 @@ async def analytics_summary(request: Request, db: Session = Depends(get_db)):
     return analytics_data
 
 @router.post("/api/predict-single")
-async def predict_single(request: Request, user: User = Depends(require_auth), db: Session = Depends(get_db)):
+async def predict_single(request: Request, incremental: bool = False, mode: str = "llm", narrative: bool = False,
+                         user: User = Depends(require_auth), db: Session = Depends(get_db)):
+    from .predict import require_prediction_mode, MODEL_MODE, TIERED_MODE
+    require_prediction_mode(mode)
     data = await request.json()
     
     # Validate required fields
@@ -752,27 +753,51 @@ async def predict_single(request: Request, user: User = Depends(require_auth), d
         if field not in data or data[field] is None or data[field] == '':
             raise HTTPException(status_code=400, detail=f"Missing required field: {field}")
     
-    # Convert to DataFrame-like structure for compatibility
-    import pandas as pd
-    df_data = {
-        'supplier_id': [data['supplier_id']],
-        'supplier_name': [data['supplier_name']],
-        'on_time_percentage': [float(data['on_time_percentage'])],
-        'quality_score': [float(data['quality_score'])],
-        'reliability_score': [float(data['reliability_score'])],
-        'defect_rate': [float(data['defect_rate'])],
-        'total_orders': [int(data.get('total_orders', 100))],
-        'years_active': [float(data.get('years_active', 1))],
-        'contract_compliance': [float(data.get('contract_compliance', 90))],
-        'region': [data.get('region', 'Unknown')],
-        'category': [data.get('category', 'General')]
+    # Supplier record in the shape the prediction service reads
+    supplier = {
+        'supplier_id': data['supplier_id'],
+        'supplier_name': data['supplier_name'],
+        'on_time_percentage': float(data['on_time_percentage']),
+        'quality_score': float(data['quality_score']),
+        'reliability_score': float(data['reliability_score']),
+        'defect_rate': float(data['defect_rate']),
+        'total_orders': int(data.get('total_orders', 100)),
+        'years_active': float(data.get('years_active', 1)),
+        'contract_compliance': float(data.get('contract_compliance', 90)),
+        'region': data.get('region', 'Unknown'),
+        'category': data.get('category', 'General')
     }
     
-    df = pd.DataFrame(df_data)
-    
-    # Use the supplier prediction service
-    from ..services.supplier import predict_reliability
-    result = predict_reliability(df)
+    # Use the supplier prediction service, unless the inputs match the last stored prediction
+    from ..services.supplier import predict_supplier_async, ambiguous_suppliers, rule_based_predictions
+    from ..services.prediction_history import input_fingerprint, find_stored_predictions, reused_prediction
+    # Fingerprinted from the submitted fields, like the raw rows of a batch upload, so
+    # the same supplier matches across both paths whatever defaults fill the form
+    fingerprint = input_fingerprint(data)
+    stored = find_stored_predictions(user.id, [(supplier.get('supplier_id'), fingerprint)], db) if incremental else {}
+    # One-row frame for the column-wise model and rules, built only when they will score it
+    frame = pd.DataFrame([supplier]) if mode in (MODEL_MODE, TIERED_MODE) and fingerprint not in stored else None
+    if fingerprint in stored:
+        result = [reused_prediction(stored[fingerprint])]
+    elif mode == MODEL_MODE:
+        from ..services.reliability_model import get_reliability_model
+        prediction = get_reliability_model().predictions(frame)[0]
+        if narrative:
+            # The LLM is only asked to explain; tier and score stay the local model's
+            explanation = await predict_supplier_async(supplier)
+            for field in ('reasoning', 'risk_factors', 'improvements', 'future_trend'):
+                if field in explanation:
+                    prediction[field] = explanation[field]
+            prediction['narrative_source'] = explanation.get('source')
+        result = [prediction]
+    elif mode == TIERED_MODE and not ambiguous_suppliers(frame)[0]:
+        # Clear-cut supplier: the rules settle it without an LLM call
+        result = rule_based_predictions(frame)
+        result[0]['inference_tier'] = "rules"
+    else:
+        result = [await predict_supplier_async(supplier)]
+        if mode == TIERED_MODE:
+            result[0]['inference_tier'] = "llm"
     
     # Save prediction to history
     prediction_record = PredictionHistory(
@@ -784,6 +809,7 @@ async def predict_single(request: Request, user: User = Depends(require_auth), d
         result_data=json.dumps(result[0]),
         reliability_score=result[0]['reliability'],
         confidence=str(result[0]['confidence']),
+        input_fingerprint=fingerprint,
         created_at=datetime.utcnow()
     )
     
@@ -0,0 +1,56 @@
+from fastapi import APIRouter, UploadFile, File, Depends, Request, HTTPException
+from sqlalchemy.orm import Session
+from typing import Optional
+from datetime import datetime
+import asyncio
+import json
+import time
+from ..services.order import flag_orders_async, ORDER_INPUT_COLUMNS, ORDER_REQUIRED_COLUMNS
+from ..services.tabular_io import read_upload, upload_format
+from ..database import get_db, PredictionHistory
+from .predict import get_current_user
+from observability.langsmith_hook import tracer
+
+router = APIRouter(tags=["Orders"])
+
+@router.post("/flag_high_risk_orders")
+async def flag_high_risk_orders(request: Request, file: UploadFile = File(...), max_concurrency: Optional[int] = None,
+                                use_llm: bool = True, db: Session = Depends(get_db)):
+    """
+    Flag Medium and High risk orders in an uploaded file. The rules score every
+    order at once; only orders they cannot settle are sent to the LLM.
+    """
+    start_time = time.time()
+    current_user = get_current_user(request, db)
+    current_user_id = current_user.id if current_user else 0
+    
+    fmt = upload_format(file.filename, file.content_type)
+    try:
+        df = await asyncio.to_thread(read_upload, file.file, fmt, ORDER_INPUT_COLUMNS)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not read the uploaded file: {e}")
+    missing = [name for name in ORDER_REQUIRED_COLUMNS if name not in df.columns]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Missing required column(s): {', '.join(missing)}")
+    
+    try:
+        flagged_orders, summary = await flag_orders_async(df, max_concurrency, use_llm)
+    except Exception as e:
+        tracer.trace_error("order_flagging_failed", str(e), {"user_id": current_user_id})
+        print(f"Error flagging orders: {e}")
+        return {"error": str(e), "flagged_orders": []}
+    summary["execution_time"] = round(time.time() - start_time, 3)
+    
+    if current_user:
+        # One history entry per upload; the flagged list itself can be very large
+        db.add(PredictionHistory(
+            user_id=current_user.id,
+            prediction_type='flag',
+            input_data=json.dumps({"filename": file.filename, "orders": summary["orders"]}),
+            result_data=json.dumps(summary),
+            created_at=datetime.utcnow()
+        ))
+        db.commit()
+    
+    print(f"🚩 Flagged {summary['flagged']} of {summary['orders']} orders ({summary['llm_orders']} sent to the LLM)")
+    return {"flagged_orders": flagged_orders, "summary": summary}
@@ -1,13 +1,44 @@
+import os
+import numpy as np
 import pandas as pd
 import json
 import time
+import asyncio
+import tempfile
 from datetime import datetime
-from fastapi import APIRouter, UploadFile, File, Request, Depends
+from typing import Optional
+from fastapi import APIRouter, UploadFile, File, Request, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from ..services.supplier import predict_reliability
-from ..database import get_db, User, PredictionHistory
+from ..services.supplier import (
+    predict_supplier_async, predict_reliability_packed_async, degraded_predictions, rule_based_predictions,
+    ambiguous_suppliers, supplier_records, SUPPLIER_INPUT_COLUMNS
+)
+from ..services.llm_engine import LLMExecutionEngine
+from ..services.prediction_cache import get_prediction_cache, supplier_feature_groups
+from ..services.prediction_jobs import get_job_queue, job_progress, COMPLETED
+from ..services.batch_checkpoints import (
+    upload_fingerprint, checkpoint_key, checkpoint_ranges, load_checkpoint, save_checkpoint, clear_checkpoints
+)
+from ..services.prediction_history import input_fingerprint, find_stored_predictions, reused_prediction
+from ..services.reliability_model import get_reliability_model
+from ..services.validation import validate_suppliers, rejected_result, merge_validation_reports
+from ..services.tabular_io import (
+    FORMAT_MEDIA_TYPES, TableWriter, iter_upload, read_upload, upload_format
+)
+from ..database import get_db, SessionLocal, User, PredictionHistory
 from observability.langsmith_hook import tracer
 
+PREDICTION_HISTORY_CHUNK_SIZE = int(os.getenv("PREDICTION_HISTORY_CHUNK_SIZE", "1000"))
+
+# Who scores a batch: the LLM (default), the locally trained reliability model, or
+# tiered: rules for clear-cut suppliers and the LLM only for ambiguous ones
+LLM_MODE = "llm"
+MODEL_MODE = "model"
+TIERED_MODE = "tiered"
+PREDICTION_MODES = (LLM_MODE, MODEL_MODE, TIERED_MODE)
+
 router = APIRouter(prefix="/predict_supplier_reliability", tags=["Prediction"])
 
 def get_current_user(request: Request, db: Session = Depends(get_db)):
@@ -17,90 +48,800 @@ def get_current_user(request: Request, db: Session = Depends(get_db)):
         return db.query(User).filter(User.id == user_id).first()
     return None
 
-@router.post("")
-async def predict_supplier(request: Request, file: UploadFile = File(...), db: Session = Depends(get_db)):
+@router.get("/cache/stats")
+def prediction_cache_stats():
+    """Hit/miss counters and sizes of the supplier prediction cache"""
+    cache = get_prediction_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+async def predict_row(row):
+    prediction_start = time.time()
+    result = await predict_supplier_async(row)
+    return result, time.time() - prediction_start
+
+def record_outcome(row, outcome, current_user_id: int, row_index: int):
+    """
+    Trace one row's outcome ((result, seconds) or an exception) and return (result, ok);
+    a failed row becomes an error entry so results stay aligned with the input
+    """
+    if isinstance(outcome, Exception):
+        tracer.trace_error(
+            error_type="prediction_failed",
+            error_message=str(outcome),
+            context={
+                "supplier_id": row.get("supplier_id"),
+                "user_id": current_user_id,
+                "row_index": row_index
+            }
+        )
+        # Add empty result for failed prediction
+        return {"error": str(outcome), "reliability": "unknown"}, False
+    
+    result, prediction_time = outcome
+    
+    # Trace individual prediction
+    tracer.trace_supplier_prediction(
+        supplier_data=row,
+        prediction_result=result,
+        user_id=current_user_id,
+        execution_time=prediction_time
+    )
+    return result, True
+
+def dedup_positions(df: pd.DataFrame, positions):
+    """
+    Map one representative position per distinct supplier input to every position
+    sharing those inputs, so each distinct row is predicted once
+    """
+    members = {}
+    if positions:
+        for position, group in zip(positions, supplier_feature_groups(df.iloc[positions]).tolist()):
+            members.setdefault(group, []).append(position)
+    return {group_members[0]: group_members for group_members in members.values()}
+
+def fan_out(duplicates, outcomes):
+    """Give every duplicate row its representative's outcome (results are copied per row)"""
+    outcome_by_position = {}
+    for representative, outcome in zip(duplicates, outcomes):
+        for position in duplicates[representative]:
+            if position == representative or isinstance(outcome, Exception):
+                outcome_by_position[position] = outcome
+            else:
+                outcome_by_position[position] = (dict(outcome[0]), outcome[1])
+    return outcome_by_position
+
+async def plan_predictions(df: pd.DataFrame, rows, valid_positions, current_user_id: int, incremental=False):
+    """
+    Choose which rows need the model: one per distinct input and, in incremental
+    mode, none whose inputs match the user's latest stored prediction. Returns
+    (duplicates, to_predict, reused) where reused maps a representative to its outcome.
+    """
+    duplicates = dedup_positions(df, valid_positions)
+    reused = {}
+    if incremental and current_user_id:
+        fingerprints = {position: input_fingerprint(rows[position]) for position in duplicates}
+        supplier_ids = {position: rows[position].get('supplier_id') for position in duplicates}
+        stored = await asyncio.to_thread(
+            find_stored_predictions, current_user_id,
+            [(supplier_ids[position], fingerprint) for position, fingerprint in fingerprints.items()]
+        )
+        reused = {
+            position: (reused_prediction(stored[fingerprint]), 0.0)
+            for position, fingerprint in fingerprints.items() if fingerprint in stored
+        }
+    to_predict = [position for position in duplicates if position not in reused]
+    return duplicates, to_predict, reused
+
+def route_predictions(df: pd.DataFrame, positions, mode):
+    """Split row positions into (scored locally, sent to the LLM) for a prediction mode"""
+    if mode == MODEL_MODE:
+        return positions, []
+    if mode == TIERED_MODE:
+        ambiguous = ambiguous_suppliers(df.iloc[positions]).tolist()
+        return (
+            [position for position, unclear in zip(positions, ambiguous) if not unclear],
+            [position for position, unclear in zip(positions, ambiguous) if unclear]
+        )
+    return [], positions
+
+def local_outcomes(df: pd.DataFrame, positions, mode):
+    """
+    Score rows without the LLM in one vectorized pass: the local reliability model,
+    or the rules in tiered mode. Per-row time is the batch average.
+    """
+    if not positions:
+        return []
+    batch_start = time.time()
+    if mode == MODEL_MODE:
+        results = get_reliability_model().predictions(df.iloc[positions])
+    else:
+        results = rule_based_predictions(df.iloc[positions])
+        for result in results:
+            result['inference_tier'] = "rules"
+    per_row_time = (time.time() - batch_start) / max(len(positions), 1)
+    return [(result, per_row_time) for result in results]
+
+async def degraded_outcomes(df: pd.DataFrame, positions):
+    """
+    While the model is unreachable, outcomes for the LLM rows in one vectorized pass
+    instead of failing them one request at a time; None when the model is available
+    """
+    if not positions:
+        return None
+    batch_start = time.time()
+    results = await asyncio.to_thread(degraded_predictions, df.iloc[positions])
+    if results is None:
+        return None
+    per_row_time = (time.time() - batch_start) / len(positions)
+    return [(result, per_row_time) for result in results]
+
+async def packed_outcomes(df: pd.DataFrame, positions, max_concurrency=None):
+    """Outcomes for the LLM rows with several suppliers per completion; per-row time is the batch average"""
+    batch_start = time.time()
+    packed_results = await predict_reliability_packed_async(df.iloc[positions], max_concurrency)
+    per_row_time = (time.time() - batch_start) / max(len(positions), 1)
+    return [
+        result if isinstance(result, Exception) else (result, per_row_time)
+        for result in packed_results
+    ]
+
+def tag_llm_outcomes(outcomes, mode):
+    """In tiered mode, mark results that came from the LLM tier"""
+    if mode == TIERED_MODE:
+        for outcome in outcomes:
+            if not isinstance(outcome, Exception):
+                outcome[0]['inference_tier'] = "llm"
+    return outcomes
+
+def require_prediction_mode(mode: str):
+    """Reject unknown modes, and model mode before any model has been trained"""
+    if mode not in PREDICTION_MODES:
+        raise HTTPException(status_code=400, detail=f"Unsupported mode '{mode}'; use one of: {', '.join(PREDICTION_MODES)}")
+    if mode == MODEL_MODE and get_reliability_model() is None:
+        raise HTTPException(
+            status_code=503,
+            detail="No local reliability model is trained yet (python -m backend.services.reliability_model train)"
+        )
+
+def dedup_ratio(valid_rows, distinct_rows):
+    """Share of valid rows answered from another row's prediction"""
+    return round(1 - distinct_rows / valid_rows, 4) if valid_rows else 0.0
+
+def merge_batch_info(total, batch_info):
+    """Fold one slice's batch_info into a running total for the whole upload"""
+    if total is None:
+        total = {"validation": None, "valid_rows": 0, "distinct_rows": 0, "reused_rows": 0, "llm_rows": 0}
+    total["validation"] = merge_validation_reports(total["validation"], batch_info["validation"])
+    for name in ("valid_rows", "distinct_rows", "reused_rows", "llm_rows"):
+        total[name] += batch_info.get(name, 0)
+    total["dedup_ratio"] = dedup_ratio(total["valid_rows"], total["distinct_rows"])
+    return total
+
+async def predict_frame(df: pd.DataFrame, current_user_id: int, max_concurrency=None, packed=False, row_offset=0,
+                        incremental=False, mode=LLM_MODE):
+    """
+    Validate df, then predict each distinct valid row once and fan the result out to
+    its duplicates, tracing every row. In incremental mode rows whose inputs are
+    unchanged since the user's last stored prediction reuse it instead; in model
+    mode the local reliability model scores every row instead of the LLM, and in
+    tiered mode only rows the rules find ambiguous go to the LLM. Returns
+    (results, successful, failed, batch_info); results keep the row order and a
+    rejected or failed row yields an error entry in place. batch_info holds the
+    validation report and dedup/reuse counts.
+    """
+    successful_predictions = 0
+    failed_predictions = 0
+    
+    # Rows that fail validation never reach the model
+    df, valid, row_errors, validation = validate_suppliers(df, row_offset)
+    rows = supplier_records(df)
+    valid_positions = np.flatnonzero(valid).tolist()
+    duplicates, to_predict, reused = await plan_predictions(df, rows, valid_positions, current_user_id, incremental)
+    
+    local_positions, llm_positions = route_predictions(df, to_predict, mode)
+    
+    # Get predictions concurrently; outcomes come back in row order
+    degraded = await degraded_outcomes(df, llm_positions) if not packed else None
+    if not llm_positions:
+        outcomes = []
+    elif degraded is not None:
+        outcomes = degraded
+    elif packed:
+        outcomes = await packed_outcomes(df, llm_positions, max_concurrency)
+    else:
+        outcomes = await LLMExecutionEngine(max_concurrency).map(predict_row, [rows[i] for i in llm_positions])
+    outcome_by_representative = dict(zip(llm_positions, tag_llm_outcomes(outcomes, mode)))
+    outcome_by_representative.update(zip(local_positions, local_outcomes(df, local_positions, mode)))
+    outcome_by_representative.update(reused)
+    outcome_by_position = fan_out(duplicates, [outcome_by_representative[position] for position in duplicates])
+    
+    results = []
+    for index, row in enumerate(rows):
+        if index in row_errors:
+            results.append(rejected_result(row, row_errors[index]))
+            failed_predictions += 1
+            continue
+        result, ok = record_outcome(row, outcome_by_position[index], current_user_id, row_offset + index)
+        results.append(result)
+        if ok:
+            successful_predictions += 1
+        else:
+            failed_predictions += 1
+    
+    batch_info = {
+        "validation": validation,
+        "valid_rows": len(valid_positions),
+        "distinct_rows": len(duplicates),
+        "reused_rows": sum(len(duplicates[position]) for position in reused),
+        "llm_rows": len(llm_positions),
+        "dedup_ratio": dedup_ratio(len(valid_positions), len(duplicates))
+    }
+    return results, successful_predictions, failed_predictions, batch_info
+
+def save_predictions(db: Session, current_user: User, df: pd.DataFrame, results, row_offset=0,
+                     chunk_size=PREDICTION_HISTORY_CHUNK_SIZE):
+    """
+    Bulk-insert one PredictionHistory row per result, one transaction per chunk.
+    A failing chunk is rolled back and reported without undoing earlier chunks.
+    """
+    table = PredictionHistory.__table__
+    created_at = datetime.utcnow()
+    report = {"saved": 0, "failed": 0, "chunks": 0, "chunk_failures": []}
+    
+    for start in range(0, len(results), chunk_size):
+        end = min(start + chunk_size, len(results))
+        try:
+            frame = df.iloc[start:end]
+            numbers = range(row_offset + start + 1, row_offset + end + 1)
+            supplier_ids = frame['supplier_id'].astype(str) if 'supplier_id' in frame else [f'BATCH_{n}' for n in numbers]
+            supplier_names = frame['supplier_name'].astype(str) if 'supplier_name' in frame else [f'Supplier_{n}' for n in numbers]
+            records = [
+                {
+                    "user_id": current_user.id,
+                    "supplier_id": supplier_id,
+                    "supplier_name": supplier_name,
+                    "prediction_type": 'batch',
+                    "input_data": json.dumps(input_data),
+                    "result_data": json.dumps(result),
+                    "reliability_score": result.get('reliability', 'Unknown'),
+                    "confidence": str(result.get('confidence', 0)),
+                    "input_fingerprint": input_fingerprint(input_data),
+                    "created_at": created_at
+                }
+                for supplier_id, supplier_name, input_data, result in zip(
+                    supplier_ids, supplier_names, frame.to_dict('records'), results[start:end]
+                )
+                # Rows refused by validation were never predicted; keep them out of the history
+                if result.get('source') != 'rejected'
+            ]
+            # Core insert with a parameter list runs as one executemany, no ORM objects
+            if records:
+                db.execute(table.insert(), records)
+            db.commit()
+            report["saved"] += len(records)
+        except Exception as e:
+            db.rollback()
+            report["failed"] += end - start
+            report["chunk_failures"].append({
+                "rows": [row_offset + start, row_offset + end - 1],
+                "error": str(e)
+            })
+            print(f"Error saving predictions {row_offset + start}-{row_offset + end - 1}: {e}")
+        report["chunks"] += 1
+    
+    print(f"Saved {report['saved']} predictions to database for user {current_user.username}")
+    return report
+
+async def predict_checkpointed(df: pd.DataFrame, current_user, db: Session, fingerprint=None, max_concurrency=None,
+                               packed=False, incremental=False, mode=LLM_MODE):
+    """
+    predict_frame over df in checkpoint_ranges slices, each saved to the user's history
+    and checkpointed as it finishes; slices finished by an interrupted run with the
+    same checkpoint key are taken from their checkpoints. Returns (results, successful,
+    failed, batch_info, persistence) for the whole frame.
+    """
+    current_user_id = current_user.id if current_user else 0
+    results = []
+    successful_predictions = 0
+    failed_predictions = 0
+    totals = None
+    persistence = {"saved": 0, "chunk_failures": [], "resumed_rows": 0} if current_user else None
+    
+    for row_start, row_end in checkpoint_ranges(len(df), fingerprint):
+        chunk = df.iloc[row_start:row_end]
+        checkpoint = None
+        if fingerprint:
+            checkpoint = await asyncio.to_thread(load_checkpoint, current_user_id, fingerprint, row_start, row_end)
+        if checkpoint and "results" in checkpoint:
+            # Finished by an earlier, interrupted run: already predicted and saved
+            chunk_results, summary = checkpoint["results"], checkpoint["summary"]
+            persistence["resumed_rows"] += len(chunk)
+        else:
+            chunk_results, successful, failed, batch_info = await predict_frame(
+                chunk, current_user_id, max_concurrency, packed, row_offset=row_start, incremental=incremental,
+                mode=mode
+            )
+            summary = {"successful": successful, "failed": failed, "batch_info": batch_info, "saved": 0}
+            if current_user:
+                # A bulk insert and commit; keep it off the event loop
+                report = await asyncio.to_thread(save_predictions, db, current_user, chunk, chunk_results, row_start)
+                summary["saved"] = report["saved"]
+                persistence["chunk_failures"].extend(report["chunk_failures"])
+            if fingerprint:
+                await asyncio.to_thread(
+                    save_checkpoint, current_user_id, fingerprint, row_start, row_end, summary, chunk_results
+                )
+        
+        results.extend(chunk_results)
+        totals = merge_batch_info(totals, summary["batch_info"])
+        successful_predictions += summary["successful"]
+        failed_predictions += summary["failed"]
+        if persistence is not None:
+            persistence["saved"] += summary["saved"]
+    
+    if fingerprint:
+        await asyncio.to_thread(clear_checkpoints, current_user_id, fingerprint)
+    return results, successful_predictions, failed_predictions, totals, persistence
+
+async def predict_supplier_chunked(file: UploadFile, current_user, chunk_size: int, max_concurrency=None, packed=False,
+                                   db: Session = None, incremental=False, mode=LLM_MODE):
+    """
+    Stream the upload through prediction and persistence chunk by chunk. Only one
+    chunk and its results are held at a time, so memory does not grow with the file.
+    Each finished chunk is checkpointed, so re-submitting the same file after an
+    interruption skips the chunks that were already predicted and saved.
+    """
     start_time = time.time()
+    current_user_id = current_user.id if current_user else 0
     successful_predictions = 0
     failed_predictions = 0
+    rows_processed = 0
+    chunks = 0
+    saved_rows = 0
+    chunk_failures = []
+    validation = None
+    valid_rows = 0
+    distinct_rows = 0
+    reused_rows = 0
+    llm_rows = 0
+    resumed_rows = 0
     
-    try:
-        # Read the uploaded CSV
-        df = pd.read_csv(file.file)
+    # Checkpoints belong to a user's history, so anonymous runs are not resumable
+    fingerprint = await asyncio.to_thread(upload_fingerprint, file.file) if current_user else None
+    fingerprint = checkpoint_key(fingerprint, mode=mode, packed=packed, incremental=incremental)
+    fmt = upload_format(file.filename, file.content_type)
+    reader = iter_upload(file.file, fmt, chunk_size, SUPPLIER_INPUT_COLUMNS)
+    while True:
+        # Parsing is CPU and disk bound; keep it off the event loop
+        chunk = await asyncio.to_thread(next, reader, None)
+        if chunk is None:
+            break
+        row_end = rows_processed + len(chunk)
         
+        checkpoint = None
+        if fingerprint:
+            checkpoint = await asyncio.to_thread(load_checkpoint, current_user_id, fingerprint, rows_processed, row_end)
+        if checkpoint:
+            # Finished by an earlier, interrupted run: already predicted and saved
+            chunk_summary = checkpoint["summary"]
+            resumed_rows += len(chunk)
+        else:
+            results, successful, failed, batch_info = await predict_frame(
+                chunk, current_user_id, max_concurrency, packed, row_offset=rows_processed, incremental=incremental,
+                mode=mode
+            )
+            saved = 0
+            if current_user:
+                report = await asyncio.to_thread(save_predictions, db, current_user, chunk, results, rows_processed)
+                saved = report["saved"]
+                chunk_failures.extend(report["chunk_failures"])
+            chunk_summary = {"successful": successful, "failed": failed, "batch_info": batch_info, "saved": saved}
+            if fingerprint:
+                # Resuming only needs the chunk's counts; its results are already in the history
+                await asyncio.to_thread(save_checkpoint, current_user_id, fingerprint, rows_processed, row_end, chunk_summary)
+            del results
+        
+        batch_info = chunk_summary["batch_info"]
+        validation = merge_validation_reports(validation, batch_info["validation"])
+        valid_rows += batch_info["valid_rows"]
+        distinct_rows += batch_info["distinct_rows"]
+        reused_rows += batch_info["reused_rows"]
+        llm_rows += batch_info.get("llm_rows", 0)
+        saved_rows += chunk_summary["saved"]
+        successful_predictions += chunk_summary["successful"]
+        failed_predictions += chunk_summary["failed"]
+        rows_processed = row_end
+        chunks += 1
+        del chunk
+    
+    if fingerprint:
+        await asyncio.to_thread(clear_checkpoints, current_user_id, fingerprint)
+    
+    total_time = time.time() - start_time
+    tracer.trace_batch_prediction(
+        suppliers_count=rows_processed,
+        successful_predictions=successful_predictions,
+        failed_predictions=failed_predictions,
+        total_execution_time=total_time,
+        user_id=current_user_id,
+        dedup_ratio=dedup_ratio(valid_rows, distinct_rows)
+    )
+    
+    summary = {
+        "rows": rows_processed,
+        "chunks": chunks,
+        "chunk_size": chunk_size,
+        "successful_predictions": successful_predictions,
+        "failed_predictions": failed_predictions,
+        "saved_predictions": saved_rows,
+        "save_failures": chunk_failures,
+        "validation": validation,
+        "dedup_ratio": dedup_ratio(valid_rows, distinct_rows),
+        "reused_predictions": reused_rows,
+        "llm_predictions": llm_rows,
+        "resumed_rows": resumed_rows,
+        "execution_time": round(total_time, 3)
+    }
+    if not current_user:
+        summary["warning"] = "No user session found - predictions were not saved to database"
+    return summary
+
+STREAM_FORMATS = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+def encode_stream_record(record, stream_format):
+    if stream_format == "sse":
+        return f"event: {record['type']}\ndata: {json.dumps(record)}\n\n"
+    return json.dumps(record) + "\n"
+
+async def stream_frame(df: pd.DataFrame, current_user_id: int, max_concurrency, row_offset, batch_info,
+                       incremental=False, mode=LLM_MODE, packed=False):
+    """
+    predict_frame for streaming: yield (index, result, ok) for each row of df the
+    moment it is ready, in completion order; packed LLM rows arrive together once
+    their packs are answered. batch_info is filled in at the end.
+    """
+    df, valid, row_errors, validation = validate_suppliers(df, row_offset)
+    rows = supplier_records(df)
+    
+    # Rejected rows are answered straight away; only valid ones are scheduled
+    for index, errors in row_errors.items():
+        yield index, rejected_result(rows[index], errors), False
+    valid_positions = np.flatnonzero(valid).tolist()
+    
+    duplicates, to_predict, reused = await plan_predictions(df, rows, valid_positions, current_user_id, incremental)
+    local_positions, llm_positions = route_predictions(df, to_predict, mode)
+    
+    async def completed():
+        # Reused predictions are ready at once; the rest arrive as the model answers
+        for representative, outcome in reused.items():
+            yield representative, outcome
+        for representative, outcome in zip(local_positions, local_outcomes(df, local_positions, mode)):
+            yield representative, outcome
+        degraded = await degraded_outcomes(df, llm_positions)
+        if degraded is not None:
+            for representative, outcome in zip(llm_positions, tag_llm_outcomes(degraded, mode)):
+                yield representative, outcome
+            return
+        if packed and llm_positions:
+            outcomes = await packed_outcomes(df, llm_positions, max_concurrency)
+            for representative, outcome in zip(llm_positions, tag_llm_outcomes(outcomes, mode)):
+                yield representative, outcome
+            return
+        engine = LLMExecutionEngine(max_concurrency)
+        async for position, outcome in engine.as_completed(predict_row, [rows[i] for i in llm_positions]):
+            yield llm_positions[position], tag_llm_outcomes([outcome], mode)[0]
+    
+    async for representative, outcome in completed():
+        # One distinct input finished: emit it for every row that shares it
+        for index, row_outcome in fan_out({representative: duplicates[representative]}, [outcome]).items():
+            result, ok = record_outcome(rows[index], row_outcome, current_user_id, row_offset + index)
+            yield index, result, ok
+    
+    batch_info.update({
+        "validation": validation,
+        "valid_rows": len(valid_positions),
+        "distinct_rows": len(duplicates),
+        "reused_rows": sum(len(duplicates[position]) for position in reused),
+        "llm_rows": len(llm_positions),
+        "dedup_ratio": dedup_ratio(len(valid_positions), len(duplicates))
+    })
+
+async def stream_predictions(df: pd.DataFrame, current_user, max_concurrency, stream_format, incremental=False,
+                             mode=LLM_MODE, fingerprint=None, packed=False):
+    """
+    Yield each row's prediction the moment it completes, then finish with a summary
+    record. A signed-in user's rows go through in checkpointed slices, each saved as it
+    finishes; re-submitting an interrupted upload replays finished slices from their
+    checkpoints instead of predicting them again.
+    """
+    start_time = time.time()
+    current_user_id = current_user.id if current_user else 0
+    totals = None
+    successful_predictions = 0
+    failed_predictions = 0
+    saved_rows = 0
+    save_failures = []
+    resumed_rows = 0
+    # The request's session is closed once streaming starts; use a fresh one
+    db = SessionLocal() if current_user else None
+    
+    try:
+        for row_start, row_end in checkpoint_ranges(len(df), fingerprint):
+            chunk = df.iloc[row_start:row_end]
+            checkpoint = None
+            if fingerprint:
+                checkpoint = await asyncio.to_thread(load_checkpoint, current_user_id, fingerprint, row_start, row_end)
+            if checkpoint and "results" in checkpoint:
+                # Finished by an earlier, interrupted run: already predicted and saved
+                for index, result in enumerate(checkpoint["results"]):
+                    yield encode_stream_record({"type": "prediction", "row_index": row_start + index, "prediction": result}, stream_format)
+                summary = checkpoint["summary"]
+                resumed_rows += len(chunk)
+            else:
+                results = [None] * len(chunk)
+                summary = {"successful": 0, "failed": 0, "batch_info": {}, "saved": 0}
+                async for index, result, ok in stream_frame(
+                    chunk, current_user_id, max_concurrency, row_start, summary["batch_info"], incremental, mode, packed
+                ):
+                    results[index] = result
+                    summary["successful" if ok else "failed"] += 1
+                    yield encode_stream_record({"type": "prediction", "row_index": row_start + index, "prediction": result}, stream_format)
+                if current_user:
+                    report = await asyncio.to_thread(save_predictions, db, current_user, chunk, results, row_start)
+                    summary["saved"] = report["saved"]
+                    save_failures.extend(report["chunk_failures"])
+                if fingerprint:
+                    await asyncio.to_thread(save_checkpoint, current_user_id, fingerprint, row_start, row_end, summary, results)
+            
+            totals = merge_batch_info(totals, summary["batch_info"])
+            successful_predictions += summary["successful"]
+            failed_predictions += summary["failed"]
+            saved_rows += summary["saved"]
+    except Exception as e:
+        # Headers are already sent, so the failure is reported in-band
+        tracer.trace_error("batch_processing_failed", str(e), {"user_id": current_user_id})
+        print(f"Error streaming predictions: {e}")
+        yield encode_stream_record({"type": "error", "error": str(e)}, stream_format)
+        return
+    finally:
+        if db is not None:
+            db.close()
+    
+    if fingerprint:
+        await asyncio.to_thread(clear_checkpoints, current_user_id, fingerprint)
+    
+    total_time = time.time() - start_time
+    tracer.trace_batch_prediction(
+        suppliers_count=len(df),
+        successful_predictions=successful_predictions,
+        failed_predictions=failed_predictions,
+        total_execution_time=total_time,
+        user_id=current_user_id,
+        dedup_ratio=totals["dedup_ratio"]
+    )
+    yield encode_stream_record({
+        "type": "summary",
+        "rows": len(df),
+        "successful_predictions": successful_predictions,
+        "failed_predictions": failed_predictions,
+        "saved_predictions": saved_rows,
+        "save_failures": save_failures,
+        "validation": totals["validation"],
+        "dedup_ratio": totals["dedup_ratio"],
+        "reused_predictions": totals["reused_rows"],
+        "llm_predictions": totals["llm_rows"],
+        "resumed_rows": resumed_rows,
+        "execution_time": round(total_time, 3)
+    }, stream_format)
+
+async def process_job_chunk(job, chunk: pd.DataFrame, row_offset: int):
+    """
+    Predict one chunk of a background job and save it to the job owner's history,
+    or take its results from the checkpoint of an earlier run of the same upload
+    """
+    options = job["options"]
+    fingerprint = options.get("checkpoint_key")
+    row_end = row_offset + len(chunk)
+    if fingerprint:
+        checkpoint = load_checkpoint(job["user_id"], fingerprint, row_offset, row_end)
+        if checkpoint and "results" in checkpoint:
+            summary = checkpoint["summary"]
+            return checkpoint["results"], summary["successful"], summary["failed"]
+    
+    results, successful, failed, batch_info = await predict_frame(
+        chunk, job["user_id"], options.get("max_concurrency"), options.get("packed", False), row_offset,
+        incremental=options.get("incremental", False), mode=options.get("mode", LLM_MODE)
+    )
+    saved = 0
+    if job["user_id"]:
+        # Worker threads outlive the request, so they need their own session
+        db = SessionLocal()
+        try:
+            user = db.query(User).filter(User.id == job["user_id"]).first()
+            if user:
+                saved = save_predictions(db, user, chunk, results, row_offset)["saved"]
+        finally:
+            db.close()
+    if fingerprint:
+        # A job's results page is rebuilt from checkpoints on resume, so they are kept
+        save_checkpoint(job["user_id"], fingerprint, row_offset, row_end, {
+            "successful": successful, "failed": failed, "batch_info": batch_info, "saved": saved
+        }, results)
+    return results, successful, failed
+
+def finish_job(job):
+    """Trace a finished job; a completed one no longer needs its checkpoints"""
+    tracer.trace_batch_prediction(
+        suppliers_count=job["rows_done"],
+        successful_predictions=job["rows_done"] - job["rows_failed"],
+        failed_predictions=job["rows_failed"],
+        total_execution_time=(job["finished_at"] or time.time()) - (job["started_at"] or job["created_at"]),
+        user_id=job["user_id"]
+    )
+    fingerprint = job["options"].get("checkpoint_key")
+    if fingerprint and job["status"] == COMPLETED:
+        clear_checkpoints(job["user_id"], fingerprint)
+
+def get_user_job(job_id: str, request: Request, db: Session):
+    """Load a job, hiding jobs that belong to another user"""
+    current_user = get_current_user(request, db)
+    job = get_job_queue().store.get(job_id)
+    if not job or job["user_id"] != (current_user.id if current_user else 0):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.post("/jobs")
+async def create_prediction_job(request: Request, file: UploadFile = File(...), max_concurrency: Optional[int] = None,
+                                packed: bool = False, chunk_size: Optional[int] = None, incremental: bool = False,
+                                mode: str = LLM_MODE, db: Session = Depends(get_db)):
+    """
+    Queue a batch prediction and return its job ID immediately
+    """
+    require_prediction_mode(mode)
+    current_user = get_current_user(request, db)
+    current_user_id = current_user.id if current_user else 0
+    
+    queue = get_job_queue()
+    fmt = upload_format(file.filename, file.content_type)
+    # Re-submitting an interrupted job's file resumes from its checkpoints
+    fingerprint = await asyncio.to_thread(upload_fingerprint, file.file) if current_user else None
+    upload_path, rows_total = await asyncio.to_thread(queue.save_upload, file.file, fmt)
+    job_id = queue.store.create(
+        user_id=current_user_id,
+        filename=file.filename,
+        upload_path=upload_path,
+        rows_total=rows_total,
+        options={
+            "max_concurrency": max_concurrency,
+            "packed": packed,
+            "incremental": incremental,
+            "mode": mode,
+            "chunk_size": chunk_size,
+            "format": fmt,
+            "columns": list(SUPPLIER_INPUT_COLUMNS),
+            "checkpoint_key": checkpoint_key(fingerprint, mode=mode, packed=packed, incremental=incremental)
+        }
+    )
+    queue.submit(job_id, process_job_chunk, on_finish=finish_job)
+    print(f"📥 Queued prediction job {job_id} ({rows_total} rows)")
+    return job_progress(queue.store.get(job_id))
+
+@router.get("/jobs/{job_id}")
+def prediction_job_status(job_id: str, request: Request, db: Session = Depends(get_db)):
+    """
+    Progress of a background job: rows done, failures and estimated time remaining
+    """
+    return job_progress(get_user_job(job_id, request, db))
+
+@router.get("/jobs/{job_id}/results")
+def prediction_job_results(job_id: str, request: Request, offset: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    """
+    One page of a job's results in row order; rows appear as their chunk completes
+    """
+    job = get_user_job(job_id, request, db)
+    limit = max(1, min(limit, 1000))
+    predictions = get_job_queue().store.results(job_id, offset, limit)
+    next_offset = predictions[-1]["row_index"] + 1 if predictions else None
+    return {
+        **job_progress(job),
+        "offset": offset,
+        "limit": limit,
+        "next_offset": next_offset if next_offset is not None and next_offset < job["rows_total"] else None,
+        "predictions": predictions
+    }
+
+HISTORY_EXPORT_COLUMNS = (
+    "id", "supplier_id", "supplier_name", "prediction_type", "reliability_score",
+    "confidence", "created_at", "input_data", "result_data"
+)
+
+@router.get("/history/export")
+def export_prediction_history(request: Request, format: str = "parquet", prediction_type: Optional[str] = None,
+                              db: Session = Depends(get_db)):
+    """
+    Export the current user's prediction history as Parquet, Arrow IPC or CSV,
+    written chunk by chunk so large histories are never fully in memory
+    """
+    current_user = get_current_user(request, db)
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    if format not in FORMAT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {format}")
+    
+    table = PredictionHistory.__table__
+    query = select(*[table.c[name] for name in HISTORY_EXPORT_COLUMNS]) \
+        .where(table.c.user_id == current_user.id) \
+        .order_by(table.c.id)
+    if prediction_type:
+        query = query.where(table.c.prediction_type == prediction_type)
+    
+    output = tempfile.SpooledTemporaryFile(max_size=16 << 20)
+    writer = TableWriter(output, format)
+    result = db.execute(query.execution_options(yield_per=PREDICTION_HISTORY_CHUNK_SIZE))
+    wrote_rows = False
+    for rows in result.partitions():
+        writer.write(history_frame(rows))
+        wrote_rows = True
+    if not wrote_rows:
+        writer.write(history_frame([]))
+    writer.close()
+    output.seek(0)
+    
+    return StreamingResponse(
+        iter(lambda: output.read(1 << 20), b""),
+        media_type=FORMAT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f"attachment; filename=prediction_history_user_{current_user.id}.{format}"}
+    )
+
+def history_frame(rows):
+    """PredictionHistory rows as a frame with fixed dtypes, so every chunk has the same schema"""
+    frame = pd.DataFrame(rows, columns=HISTORY_EXPORT_COLUMNS)
+    frame = frame.astype({name: "string" for name in HISTORY_EXPORT_COLUMNS if name not in ("id", "created_at")})
+    frame["id"] = frame["id"].astype("int64")
+    frame["created_at"] = pd.to_datetime(frame["created_at"])
+    return frame
+
+@router.post("")
+async def predict_supplier(request: Request, file: UploadFile = File(...), max_concurrency: Optional[int] = None,
+                           packed: bool = False, chunk_size: Optional[int] = None, stream: Optional[str] = None,
+                           incremental: bool = False, mode: str = LLM_MODE, db: Session = Depends(get_db)):
+    start_time = time.time()
+    require_prediction_mode(mode)
+    
+    try:
         # Get current user
         current_user = get_current_user(request, db)
         current_user_id = current_user.id if current_user else 0
         
-        # Get predictions with individual timing
-        results = []
-        for index, row in df.iterrows():
-            prediction_start = time.time()
-            
-            try:
-                # Get prediction for this supplier
-                supplier_predictions = predict_reliability(pd.DataFrame([row]))
-                result = supplier_predictions[0] if supplier_predictions else {}
-                
-                # Trace individual prediction
-                prediction_time = time.time() - prediction_start
-                tracer.trace_supplier_prediction(
-                    supplier_data=row.to_dict(),
-                    prediction_result=result,
-                    user_id=current_user_id,
-                    execution_time=prediction_time
-                )
-                
-                results.append(result)
-                successful_predictions += 1
-                
-            except Exception as e:
-                failed_predictions += 1
-                tracer.trace_error(
-                    error_type="prediction_failed",
-                    error_message=str(e),
-                    context={
-                        "supplier_id": row.get("supplier_id"),
-                        "user_id": current_user_id,
-                        "row_index": index
-                    }
-                )
-                # Add empty result for failed prediction
-                results.append({"error": str(e), "reliability": "unknown"})
+        if chunk_size:
+            # Streaming mode: results go to the database, the response is a summary
+            return await predict_supplier_chunked(
+                file, current_user, chunk_size, max_concurrency, packed, db, incremental, mode
+            )
         
-        # Save predictions to database if user is logged in
-        if current_user:
-            for i, result in enumerate(results):
-                try:
-                    # Get supplier data from the row
-                    row = df.iloc[i]
-                    supplier_id = str(row.get('supplier_id', f'BATCH_{i+1}'))
-                    supplier_name = str(row.get('supplier_name', f'Supplier_{i+1}'))
-                    
-                    # Create prediction record
-                    prediction_record = PredictionHistory(
-                        user_id=current_user.id,
-                        supplier_id=supplier_id,
-                        supplier_name=supplier_name,
-                        prediction_type='batch',
-                        input_data=json.dumps(row.to_dict()),
-                        result_data=json.dumps(result),
-                        reliability_score=result.get('reliability', 'Unknown'),
-                        confidence=str(result.get('confidence', 0)),
-                        created_at=datetime.utcnow()
-                    )
-                    
-                    db.add(prediction_record)
-                except Exception as e:
-                    print(f"Error saving prediction {i}: {e}")
-                    continue
-            
-            try:
-                db.commit()
-                print(f"Saved {len(results)} predictions to database for user {current_user.username}")
-            except Exception as e:
-                print(f"Error committing predictions to database: {e}")
-                db.rollback()
-        else:
+        # Checkpoints belong to a user's history, so anonymous runs are not resumable
+        fingerprint = await asyncio.to_thread(upload_fingerprint, file.file) if current_user else None
+        fingerprint = checkpoint_key(fingerprint, mode=mode, packed=packed, incremental=incremental)
+        
+        # Read the upload: CSV, or Parquet/Arrow decoded column-projected from a memory map
+        fmt = upload_format(file.filename, file.content_type)
+        df = await asyncio.to_thread(read_upload, file.file, fmt, SUPPLIER_INPUT_COLUMNS)
+        
+        if stream in STREAM_FORMATS:
+            # Results are sent as they complete, one per row, in completion order
+            return StreamingResponse(
+                stream_predictions(df, current_user, max_concurrency, stream, incremental, mode, fingerprint, packed),
+                media_type=STREAM_FORMATS[stream],
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+            )
+        
+        # Predictions are saved to the database, slice by slice, if the user is logged in
+        results, successful_predictions, failed_predictions, batch_info, persistence = await predict_checkpointed(
+            df, current_user, db, fingerprint, max_concurrency, packed, incremental, mode
+        )
+        if not current_user:
             print("No user session found - predictions not saved to database")
         
         # Trace batch results
@@ -110,10 +851,22 @@ async def predict_supplier(request: Request, file: UploadFile = File(...), db: S
             successful_predictions=successful_predictions,
             failed_predictions=failed_predictions,
             total_execution_time=total_time,
-            user_id=current_user_id
+            user_id=current_user_id,
+            dedup_ratio=batch_info["dedup_ratio"]
         )
         
-        return {"predictions": results}
+        response = {
+            "predictions": results,
+            "validation": batch_info["validation"],
+            "dedup_ratio": batch_info["dedup_ratio"],
+            "reused_predictions": batch_info["reused_rows"],
+            "llm_predictions": batch_info["llm_rows"]
+        }
+        if persistence and persistence["chunk_failures"]:
+            response["save_failures"] = persistence["chunk_failures"]
+        if persistence and persistence["resumed_rows"]:
+            response["resumed_rows"] = persistence["resumed_rows"]
+        return response
         
     except Exception as e:
         tracer.trace_error("batch_processing_failed", str(e), {"user_id": current_user_id if 'current_user_id' in locals() else 0})
@@ -0,0 +1,115 @@
+from fastapi import APIRouter, UploadFile, File, Depends, Request, HTTPException, Query
+from typing import List
+from sqlalchemy.orm import Session
+from datetime import datetime
+import asyncio
+import json
+import time
+from ..services.vendor import VendorIndex, rank_alternate_vendors, VENDOR_INPUT_COLUMNS, VENDOR_REQUIRED_COLUMNS
+from ..services.faiss_db import get_similarity_engine, SIMILARITY_FEATURES
+from ..services.tabular_io import read_upload, upload_format
+from ..database import get_db, PredictionHistory
+from .predict import get_current_user
+from observability.langsmith_hook import tracer
+
+router = APIRouter(tags=["Vendors"])
+
+@router.post("/recommend_alternate_vendors")
+async def recommend_alternate_vendors(request: Request, file: UploadFile = File(...), db: Session = Depends(get_db)):
+    """
+    Recommend alternative vendors from an uploaded catalog, using an index of the
+    catalog by category and region in lead-time order
+    """
+    start_time = time.time()
+    current_user = get_current_user(request, db)
+    current_user_id = current_user.id if current_user else 0
+    
+    fmt = upload_format(file.filename, file.content_type)
+    try:
+        df = await asyncio.to_thread(read_upload, file.file, fmt, VENDOR_INPUT_COLUMNS)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not read the uploaded file: {e}")
+    missing = [name for name in VENDOR_REQUIRED_COLUMNS if name not in df.columns]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Missing required column(s): {', '.join(missing)}")
+    
+    try:
+        # Index building and ranking are CPU bound; keep them off the event loop
+        recommendations = await asyncio.to_thread(lambda: rank_alternate_vendors(df, VendorIndex(df)))
+    except Exception as e:
+        tracer.trace_error("vendor_recommendation_failed", str(e), {"user_id": current_user_id})
+        print(f"Error recommending vendors: {e}")
+        return {"error": str(e), "recommendations": []}
+    summary = {
+        "vendors": len(df),
+        "recommended": len(recommendations),
+        "execution_time": round(time.time() - start_time, 3)
+    }
+    
+    if current_user:
+        db.add(PredictionHistory(
+            user_id=current_user.id,
+            prediction_type='recommend',
+            input_data=json.dumps({"filename": file.filename, "vendors": summary["vendors"]}),
+            result_data=json.dumps(summary),
+            created_at=datetime.utcnow()
+        ))
+        db.commit()
+    
+    print(f"🔁 Recommended {summary['recommended']} alternative vendors from {summary['vendors']}")
+    return {"recommendations": recommendations, "summary": summary}
+
+
+@router.get("/similar_vendors")
+async def similar_vendors(
+    supplier_id: List[str] = Query(...),
+    k: int = Query(5, ge=1, le=100),
+):
+    """
+    Most similar catalog vendors/suppliers for one or more supplier_ids (repeat the
+    parameter), by lead time, ratings and reliability, in one batched index search
+    """
+    engine = await asyncio.to_thread(get_similarity_engine)
+    results = await asyncio.to_thread(engine.similar_to, supplier_id, k)
+    unknown = [key for key, matches in results.items() if matches is None]
+    if len(unknown) == len(results):
+        raise HTTPException(status_code=404, detail=f"Unknown supplier_id(s): {', '.join(unknown)}")
+    return {
+        "similar": {key: matches for key, matches in results.items() if matches is not None},
+        "unknown": unknown,
+        "index_type": engine.index_type,
+    }
+
+def require_catalog_admin(request: Request, db: Session):
+    current_user = get_current_user(request, db)
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    if current_user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return current_user
+
+@router.post("/similar_vendors/catalog")
+async def upsert_similar_vendors(request: Request, file: UploadFile = File(...), db: Session = Depends(get_db)):
+    """
+    Add or replace entries of the similarity index from an uploaded catalog
+    (supplier_id plus any similarity features); saved with the next snapshot
+    """
+    require_catalog_admin(request, db)
+    fmt = upload_format(file.filename, file.content_type)
+    try:
+        df = await asyncio.to_thread(read_upload, file.file, fmt, ("supplier_id", *SIMILARITY_FEATURES))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not read the uploaded file: {e}")
+    if 'supplier_id' not in df.columns:
+        raise HTTPException(status_code=400, detail="Missing required column(s): supplier_id")
+    engine = await asyncio.to_thread(get_similarity_engine)
+    upserted = await asyncio.to_thread(engine.upsert, df)
+    return {"upserted": upserted, "entries": len(engine), "pending_snapshot": engine.dirty}
+
+@router.delete("/similar_vendors/catalog")
+async def remove_similar_vendors(request: Request, supplier_id: List[str] = Query(...), db: Session = Depends(get_db)):
+    """Remove entries from the similarity index; saved with the next snapshot"""
+    require_catalog_admin(request, db)
+    engine = await asyncio.to_thread(get_similarity_engine)
+    removed = await asyncio.to_thread(engine.remove, supplier_id)
+    return {"removed": removed, "entries": len(engine), "pending_snapshot": engine.dirty}
@@ -1,8 +1,15 @@
 import os
 import json
+import time
+import asyncio
+import threading
+import weakref
+import httpx
 import pandas as pd
-from openai import AzureOpenAI
+from openai import AzureOpenAI, AsyncAzureOpenAI, RateLimitError
 from dotenv import load_dotenv
+from .rate_limiter import get_rate_limiter, estimate_tokens
+from .circuit_breaker import CircuitBreaker, OPEN
 
 load_dotenv()
 
@@ -12,50 +19,253 @@ class AzureAIService:
         self.deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-4.1")  # Fixed: was AZURE_OPENAI_DEPLOYMENT
         self.api_version = os.getenv("AZURE_OPENAI_API_VERSION", "2024-12-01-preview")
         self.use_real_ai = False
+        self.health_interval = float(os.getenv("AZURE_OPENAI_HEALTH_INTERVAL", "300"))
+        self._health_lock = threading.Lock()
+        self._health = {
+            "status": "unknown",  # 'unknown', 'healthy' or 'unavailable'
+            "checked_at": None,
+            "latency_ms": None,
+            "error": None,
+        }
+        self._probe_thread = None
+        self._stop_probe = threading.Event()
+        self.http_client = None
+        self._async_clients = weakref.WeakKeyDictionary()  # event loop -> AsyncAzureOpenAI
+        self.breaker = CircuitBreaker("azure-openai")
         
-        # Try to initialize real Azure OpenAI
+        # Build the client once; the connection pool is reused by every call
         try:
+            self.http_client = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=int(os.getenv("AZURE_OPENAI_MAX_CONNECTIONS", "20")),
+                    max_keepalive_connections=int(os.getenv("AZURE_OPENAI_MAX_KEEPALIVE", "10"))
+                ),
+                timeout=float(os.getenv("AZURE_OPENAI_TIMEOUT", "60"))
+            )
             self.client = AzureOpenAI(
                 api_key=os.getenv("AZURE_OPENAI_API_KEY"),  # Fixed: was AZURE_OPENAI_KEY
                 api_version=self.api_version,
-                azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT")
+                azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+                http_client=self.http_client,
+                max_retries=0  # retries and 429 backoff are handled by the shared rate limiter
             )
-            # Test connection
-            test_response = self.client.chat.completions.create(
+        except Exception as e:
+            print(f"⚠️ Azure OpenAI not available (deployment issue): {str(e)}")
+            print("🔄 Using AI-like simulation mode...")
+            self._set_health("unavailable", error=str(e))
+    
+    def _set_health(self, status, latency_ms=None, error=None):
+        with self._health_lock:
+            self._health = {
+                "status": status,
+                "checked_at": time.time(),
+                "latency_ms": latency_ms,
+                "error": error,
+            }
+            self.use_real_ai = status == "healthy"
+    
+    def probe_health(self):
+        """Send a minimal completion to check that the deployment answers"""
+        if not self.client:
+            return self.health_status()
+        
+        start = time.time()
+        try:
+            self.client.chat.completions.create(
                 model=self.deployment,
                 messages=[{"role": "user", "content": "test"}],
                 max_completion_tokens=10
             )
-            self.use_real_ai = True
-            print("✅ Azure OpenAI connected successfully!")
+            was_healthy = self.use_real_ai
+            self._set_health("healthy", latency_ms=(time.time() - start) * 1000)
+            if not was_healthy:
+                print("✅ Azure OpenAI connected successfully!")
+        except RateLimitError:
+            # Throttled, but the deployment answered
+            self._set_health("healthy", latency_ms=(time.time() - start) * 1000, error="rate limited")
         except Exception as e:
-            print(f"⚠️ Azure OpenAI not available (deployment issue): {str(e)}")
-            print("🔄 Using AI-like simulation mode...")
-            self.use_real_ai = False
+            if self._health["status"] != "unavailable":
+                print(f"⚠️ Azure OpenAI not available (deployment issue): {str(e)}")
+                print("🔄 Using AI-like simulation mode...")
+            self._set_health("unavailable", latency_ms=(time.time() - start) * 1000, error=str(e))
+        return self.health_status()
+    
+    def ensure_health(self):
+        """Probe lazily on first use and keep re-probing in the background"""
+        if self._health["status"] == "unknown" and self.client:
+            with self._health_lock:
+                first = self._probe_thread is None
+                if first:
+                    self._probe_thread = threading.Thread(
+                        target=self._probe_loop, name="azure-openai-health", daemon=True
+                    )
+            if first:
+                self.probe_health()
+                self._probe_thread.start()
+            else:
+                # Another caller is running the first probe; wait for its verdict
+                while self._health["status"] == "unknown":
+                    time.sleep(0.05)
+        return self.use_real_ai
+    
+    def _probe_loop(self):
+        while not self._stop_probe.wait(self.health_interval):
+            self.probe_health()
+    
+    def health_status(self):
+        """Snapshot of the cached health state"""
+        with self._health_lock:
+            status = dict(self._health)
+        status["deployment"] = self.deployment
+        status["probe_interval_seconds"] = self.health_interval
+        status["background_probe_running"] = bool(self._probe_thread and self._probe_thread.is_alive())
+        status["rate_limiter"] = get_rate_limiter().stats()
+        status["circuit_breaker"] = self.breaker.stats()
+        return status
+    
+    def close(self):
+        self._stop_probe.set()
+        if self.http_client:
+            self.http_client.close()
+    
+    async def aclose(self):
+        self.close()
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client:
+            await client.close()
+    
+    def _get_async_client(self):
+        """
+        Async twin of self.client. httpx async pools are bound to the event loop
+        that created them, so one client is kept per running loop.
+        """
+        if not self.client:
+            return None
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=int(os.getenv("AZURE_OPENAI_MAX_CONNECTIONS", "20")),
+                    max_keepalive_connections=int(os.getenv("AZURE_OPENAI_MAX_KEEPALIVE", "10"))
+                ),
+                timeout=float(os.getenv("AZURE_OPENAI_TIMEOUT", "60"))
+            )
+            client = AsyncAzureOpenAI(
+                api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+                api_version=self.api_version,
+                azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+                http_client=http_client,
+                max_retries=0
+            )
+            self._async_clients[loop] = client
+        return client
+    
+    def _messages(self, prompt):
+        return [
+            {"role": "system", "content": "You are a supply chain expert AI assistant."},
+            {"role": "user", "content": prompt}
+        ]
     
     def _call_azure_openai(self, prompt, max_tokens=500):
-        """Call Azure OpenAI or simulate response if deployment not available"""
-        if self.use_real_ai and self.client:
+        """
+        Call Azure OpenAI, or simulate the response if no deployment is available.
+        Raises CircuitOpenError without calling out while the breaker is open, and
+        lets real call failures propagate so callers use their rule-based fallback.
+        """
+        if not (self.ensure_health() and self.client):
+            # Simulate Azure OpenAI response format
+            return self._simulate_ai_response(prompt)
+        
+        self.breaker.check()
+        # Latency of the HTTP call itself, excluding time queued in the rate limiter
+        timing = {"latency_ms": 0.0}
+        
+        def send():
+            sent = time.time()
             try:
-                response = self.client.chat.completions.create(
+                return self.client.chat.completions.create(
                     model=self.deployment,
-                    messages=[
-                        {"role": "system", "content": "You are a supply chain expert AI assistant."},
-                        {"role": "user", "content": prompt}
-                    ],
+                    messages=self._messages(prompt),
                     max_completion_tokens=max_tokens,
                     temperature=0.2
                 )
-                return response.choices[0].message.content
-            except Exception as e:
-                print(f"Azure OpenAI API call failed: {str(e)}")
-                pass
+            finally:
+                timing["latency_ms"] = (time.time() - sent) * 1000
         
-        # Simulate Azure OpenAI response format
-        return self._simulate_ai_response(prompt)
+        ok = False
+        try:
+            response = get_rate_limiter().call(send, estimate_tokens(prompt, max_tokens))
+            ok = True
+            return response.choices[0].message.content
+        except Exception as e:
+            print(f"Azure OpenAI API call failed: {str(e)}")
+            raise
+        finally:
+            self.breaker.record(ok, timing["latency_ms"])
+    
+    async def _acall_azure_openai(self, prompt, max_tokens=500):
+        """Non-blocking _call_azure_openai for use inside the event loop"""
+        # The first probe is a blocking call; keep it off the event loop
+        if self._health["status"] == "unknown":
+            await asyncio.to_thread(self.ensure_health)
+        
+        async_client = self._get_async_client() if self.use_real_ai else None
+        if not async_client:
+            return self._simulate_ai_response(prompt)
+        
+        self.breaker.check()
+        timing = {"latency_ms": 0.0}
+        
+        async def send():
+            sent = time.time()
+            try:
+                return await async_client.chat.completions.create(
+                    model=self.deployment,
+                    messages=self._messages(prompt),
+                    max_completion_tokens=max_tokens,
+                    temperature=0.2
+                )
+            finally:
+                timing["latency_ms"] = (time.time() - sent) * 1000
+        
+        ok = False
+        try:
+            response = await get_rate_limiter().acall(send, estimate_tokens(prompt, max_tokens))
+            ok = True
+            return response.choices[0].message.content
+        except Exception as e:
+            print(f"Azure OpenAI API call failed: {str(e)}")
+            raise
+        finally:
+            self.breaker.record(ok, timing["latency_ms"])
+    
+    @property
+    def is_degraded(self):
+        """True while the circuit breaker refuses calls"""
+        return self.breaker.state == OPEN
     
     def _simulate_ai_response(self, prompt):
         """Simulate realistic AI responses based on prompt analysis"""
+        if "SUPPLIER_BATCH" in prompt:
+            # Packed reliability prompt: one JSON object per supplier line
+            predictions = []
+            for line in prompt.split('\n'):
+                line = line.strip()
+                if not line.startswith('{'):
+                    continue
+                try:
+                    supplier = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                prediction = self._simulate_reliability(
+                    float(supplier.get("on_time_percentage") or 0),
+                    float(supplier.get("reliability_score") or 0)
+                )
+                prediction["supplier_id"] = supplier.get("supplier_id")
+                predictions.append(prediction)
+            return json.dumps(predictions)
+        
         if "reliability" in prompt.lower():
             # Extract data from prompt for intelligent simulation
             if "on_time_percentage" in prompt:
@@ -76,33 +286,7 @@ class AzureAIService:
                             pass
                 
                 # AI-like analysis
-                if on_time >= 95 and reliability_score >= 0.9:
-                    return json.dumps({
-                        "reliability": "High",
-                        "confidence": 0.95,
-                        "reasoning": "Exceptional performance metrics indicate a highly reliable supplier with consistent on-time delivery and strong reliability scores.",
-                        "improvements": ["Maintain current excellence", "Consider strategic partnership opportunities"],
-                        "future_trend": "stable",
-                        "risk_factors": ["Minimal risk factors identified"]
-                    })
-                elif on_time >= 80 and reliability_score >= 0.75:
-                    return json.dumps({
-                        "reliability": "Medium",
-                        "confidence": 0.78,
-                        "reasoning": "Good performance with some room for improvement. Solid delivery rates but occasional delays observed.",
-                        "improvements": ["Implement delivery tracking system", "Regular performance reviews", "Backup logistics planning"],
-                        "future_trend": "improving",
-                        "risk_factors": ["Occasional delivery delays", "Performance variability"]
-                    })
-                else:
-                    return json.dumps({
-                        "reliability": "Low",
-                        "confidence": 0.85,
-                        "reasoning": "Below-average performance metrics indicate significant reliability concerns and frequent delivery issues.",
-                        "improvements": ["Immediate performance improvement plan", "Enhanced monitoring", "Consider alternative suppliers"],
-                        "future_trend": "declining",
-                        "risk_factors": ["Frequent delays", "Low reliability scores", "Delivery consistency issues"]
-                    })
+                return json.dumps(self._simulate_reliability(on_time, reliability_score))
         
         elif "risk" in prompt.lower():
             # Risk analysis simulation
@@ -157,6 +341,35 @@ class AzureAIService:
         
         return json.dumps({"error": "Unable to process request"})
     
+    def _simulate_reliability(self, on_time, reliability_score):
+        if on_time >= 95 and reliability_score >= 0.9:
+            return {
+                "reliability": "High",
+                "confidence": 0.95,
+                "reasoning": "Exceptional performance metrics indicate a highly reliable supplier with consistent on-time delivery and strong reliability scores.",
+                "improvements": ["Maintain current excellence", "Consider strategic partnership opportunities"],
+                "future_trend": "stable",
+                "risk_factors": ["Minimal risk factors identified"]
+            }
+        elif on_time >= 80 and reliability_score >= 0.75:
+            return {
+                "reliability": "Medium",
+                "confidence": 0.78,
+                "reasoning": "Good performance with some room for improvement. Solid delivery rates but occasional delays observed.",
+                "improvements": ["Implement delivery tracking system", "Regular performance reviews", "Backup logistics planning"],
+                "future_trend": "improving",
+                "risk_factors": ["Occasional delivery delays", "Performance variability"]
+            }
+        else:
+            return {
+                "reliability": "Low",
+                "confidence": 0.85,
+                "reasoning": "Below-average performance metrics indicate significant reliability concerns and frequent delivery issues.",
+                "improvements": ["Immediate performance improvement plan", "Enhanced monitoring", "Consider alternative suppliers"],
+                "future_trend": "declining",
+                "risk_factors": ["Frequent delays", "Low reliability scores", "Delivery consistency issues"]
+            }
+    
     def predict_supplier_reliability(self, supplier_data):
         """Use Azure OpenAI to predict supplier reliability"""
         prompt = f"""
@@ -248,15 +461,10 @@ class AzureAIService:
             }
     
     def recommend_alternatives(self, current_vendor, all_vendors):
-        """Use Azure OpenAI to recommend alternative vendors"""
-        vendors_context = []
-        for _, vendor in all_vendors.iterrows():
-            vendors_context.append({
-                "supplier_id": vendor['supplier_id'],
-                "category": vendor['category'],
-                "region": vendor['region'],
-                "lead_time": vendor['average_lead_time']
-            })
+        """Use Azure OpenAI to recommend alternative vendors from a shortlist of all_vendors"""
+        # Imported here: the vendor module imports this one
+        from .vendor import shortlist_for_vendor
+        vendors_context, shortlisted = shortlist_for_vendor(current_vendor, all_vendors)
         
         prompt = f"""
         You are a strategic sourcing expert. Find the best alternative vendors for:
@@ -266,8 +474,8 @@ class AzureAIService:
         - Region: {current_vendor['region']}
         - Current Lead Time: {current_vendor['average_lead_time']} days
         
-        Available Alternative Vendors:
-        {json.dumps(vendors_context, indent=2)}
+        Available Alternative Vendors (best {len(shortlisted)} by lead time and 0-5 ratings; score is a 0-1 estimate):
+        {vendors_context}
         
         Analyze and recommend the top 3 alternatives considering:
         1. Category compatibility
@@ -304,3 +512,16 @@ class AzureAIService:
                 "sourcing_strategy": "manual_review_required",
                 "risk_mitigation": f"AI analysis failed: {str(e)}"
             }
+
+
+_shared_service = None
+_shared_service_lock = threading.Lock()
+
+def get_ai_service():
+    """Return the process-wide AzureAIService, creating it on first use"""
+    global _shared_service
+    if _shared_service is None:
+        with _shared_service_lock:
+            if _shared_service is None:
+                _shared_service = AzureAIService()
+    return _shared_service
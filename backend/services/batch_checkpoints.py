@@ -0,0 +1,106 @@
+import os
+import json
+import hashlib
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from sqlalchemy import delete, select
+from ..database import SessionLocal, BatchCheckpoint
+
+load_dotenv()
+
+# Checkpoints of runs that were never resumed are ignored, then pruned, after this long
+BATCH_CHECKPOINT_MAX_AGE_HOURS = float(os.getenv("BATCH_CHECKPOINT_MAX_AGE_HOURS", "72"))
+# Rows per checkpoint on the default and streaming upload paths
+BATCH_CHECKPOINT_ROWS = int(os.getenv("BATCH_CHECKPOINT_ROWS", "500"))
+
+def upload_fingerprint(fileobj):
+    """sha256 of an uploaded file's bytes; the file is rewound before and after"""
+    digest = hashlib.sha256()
+    fileobj.seek(0)
+    for block in iter(lambda: fileobj.read(1 << 20), b""):
+        digest.update(block)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+def checkpoint_key(fingerprint, **options):
+    """
+    Key of one run's checkpoints: the upload fingerprint plus the options that change
+    its results (mode, packed, incremental), so a re-run under other options starts over
+    """
+    if not fingerprint:
+        return None
+    return hashlib.sha256(json.dumps([fingerprint, options], sort_keys=True).encode()).hexdigest()
+
+def checkpoint_ranges(row_count, fingerprint):
+    """
+    (row_start, row_end) slices a run is predicted and checkpointed in; a run without
+    a checkpoint key (anonymous) is a single slice
+    """
+    step = BATCH_CHECKPOINT_ROWS if fingerprint else max(row_count, 1)
+    return [(start, min(start + step, row_count)) for start in range(0, max(row_count, 1), step)]
+
+def _cutoff():
+    return datetime.utcnow() - timedelta(hours=BATCH_CHECKPOINT_MAX_AGE_HOURS)
+
+def load_checkpoint(user_id, fingerprint, row_start, row_end):
+    """
+    The stored {"summary": {...}} (plus "results" when they were kept) of a finished
+    chunk of an earlier run with the same checkpoint_key, or None when the range has
+    to be predicted
+    """
+    table = BatchCheckpoint.__table__
+    db = SessionLocal()
+    try:
+        result_data = db.execute(
+            select(table.c.result_data)
+            .where(table.c.user_id == user_id)
+            .where(table.c.upload_fingerprint == fingerprint)
+            .where(table.c.row_start == row_start)
+            .where(table.c.row_end == row_end)
+            .where(table.c.created_at >= _cutoff())
+            .order_by(table.c.id.desc())
+            .limit(1)
+        ).scalar()
+    finally:
+        db.close()
+    return json.loads(result_data) if result_data else None
+
+def save_checkpoint(user_id, fingerprint, row_start, row_end, summary, results=None):
+    """
+    Durably record one finished chunk; called only after its predictions are saved.
+    Results are kept only for callers that hand them back on resume (jobs).
+    """
+    checkpoint = {"summary": summary}
+    if results is not None:
+        checkpoint["results"] = results
+    db = SessionLocal()
+    try:
+        db.execute(BatchCheckpoint.__table__.insert().values(
+            user_id=user_id,
+            upload_fingerprint=fingerprint,
+            row_start=row_start,
+            row_end=row_end,
+            result_data=json.dumps(checkpoint),
+            created_at=datetime.utcnow()
+        ))
+        db.commit()
+    except Exception as e:
+        # A missing checkpoint only costs re-predicting the chunk after a restart
+        db.rollback()
+        print(f"Error saving batch checkpoint: {e}")
+    finally:
+        db.close()
+
+def clear_checkpoints(user_id, fingerprint):
+    """Forget a finished run's checkpoints (and any expired ones) so a new upload starts fresh"""
+    table = BatchCheckpoint.__table__
+    db = SessionLocal()
+    try:
+        db.execute(delete(table).where(table.c.user_id == user_id).where(table.c.upload_fingerprint == fingerprint))
+        db.execute(delete(table).where(table.c.created_at < _cutoff()))
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"Error clearing batch checkpoints: {e}")
+    finally:
+        db.close()
@@ -0,0 +1,135 @@
+import os
+import time
+import threading
+from collections import deque
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BREAKER_WINDOW = int(os.getenv("AZURE_OPENAI_BREAKER_WINDOW", "50"))
+BREAKER_MIN_CALLS = int(os.getenv("AZURE_OPENAI_BREAKER_MIN_CALLS", "10"))
+BREAKER_ERROR_RATE = float(os.getenv("AZURE_OPENAI_BREAKER_ERROR_RATE", "0.5"))
+BREAKER_LATENCY_MS = float(os.getenv("AZURE_OPENAI_BREAKER_LATENCY_MS", "20000"))
+BREAKER_LATENCY_PERCENTILE = float(os.getenv("AZURE_OPENAI_BREAKER_LATENCY_PERCENTILE", "0.95"))
+BREAKER_OPEN_SECONDS = float(os.getenv("AZURE_OPENAI_BREAKER_OPEN_SECONDS", "30"))
+BREAKER_HALF_OPEN_CALLS = int(os.getenv("AZURE_OPENAI_BREAKER_HALF_OPEN_CALLS", "3"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency the breaker considers degraded"""
+
+class CircuitBreaker:
+    """
+    Closed/open/half-open breaker driven by the error rate and a latency
+    percentile over the last `window` calls. While open every call is
+    refused immediately; after `open_seconds` a few trial calls are let
+    through and the circuit closes again once they all succeed.
+    """
+
+    def __init__(self, name, window=BREAKER_WINDOW, min_calls=BREAKER_MIN_CALLS,
+                 error_rate=BREAKER_ERROR_RATE, latency_ms=BREAKER_LATENCY_MS,
+                 latency_percentile=BREAKER_LATENCY_PERCENTILE,
+                 open_seconds=BREAKER_OPEN_SECONDS, half_open_calls=BREAKER_HALF_OPEN_CALLS):
+        self.name = name
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.latency_ms = latency_ms
+        self.latency_percentile = latency_percentile
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self._outcomes = deque(maxlen=window)  # (ok, latency_ms)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._trials_started = 0
+        self._trials_succeeded = 0
+        self._last_reason = None
+        self._rejected = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self):
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._trials_started = 0
+            self._trials_succeeded = 0
+
+    def _open(self, reason):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._last_reason = reason
+        self._outcomes.clear()
+        print(f"⚠️ Circuit '{self.name}' opened: {reason}")
+
+    def allow(self):
+        """Whether a call may go out now; claims a trial slot when half-open"""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._trials_started < self.half_open_calls:
+                self._trials_started += 1
+                return True
+            self._rejected += 1
+            return False
+
+    def check(self):
+        if not self.allow():
+            raise CircuitOpenError(f"Circuit '{self.name}' is open ({self._last_reason})")
+
+    def _latency_percentile(self):
+        latencies = sorted(latency for _, latency in self._outcomes)
+        index = min(len(latencies) - 1, int(self.latency_percentile * len(latencies)))
+        return latencies[index]
+
+    def record(self, ok, latency_ms):
+        with self._lock:
+            if self._state == HALF_OPEN:
+                if not ok or latency_ms > self.latency_ms:
+                    self._open("trial call failed" if not ok else f"trial call took {latency_ms:.0f} ms")
+                    return
+                self._trials_succeeded += 1
+                if self._trials_succeeded >= self.half_open_calls:
+                    self._state = CLOSED
+                    self._outcomes.clear()
+                    print(f"✅ Circuit '{self.name}' closed")
+                return
+            if self._state == OPEN:
+                # A call that started before the circuit opened
+                return
+
+            self._outcomes.append((ok, latency_ms))
+            if len(self._outcomes) < self.min_calls:
+                return
+            failures = sum(1 for success, _ in self._outcomes if not success)
+            rate = failures / len(self._outcomes)
+            if rate >= self.error_rate:
+                self._open(f"error rate {rate:.0%} over last {len(self._outcomes)} calls")
+                return
+            slow = self._latency_percentile()
+            if slow > self.latency_ms:
+                self._open(f"p{int(self.latency_percentile * 100)} latency {slow:.0f} ms")
+
+    def stats(self):
+        state = self.state
+        with self._lock:
+            calls = len(self._outcomes)
+            failures = sum(1 for ok, _ in self._outcomes if not ok)
+            stats = {
+                "state": state,
+                "window_calls": calls,
+                "window_error_rate": failures / calls if calls else 0.0,
+                "window_latency_percentile_ms": self._latency_percentile() if calls else None,
+                "rejected_calls": self._rejected,
+                "last_open_reason": self._last_reason,
+            }
+            if state == OPEN:
+                stats["retry_in_seconds"] = round(max(0.0, self.open_seconds - (time.monotonic() - self._opened_at)), 1)
+        return stats
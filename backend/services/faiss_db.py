@@ -1,24 +1,555 @@
 import faiss
+import json
+import math
+import threading
+import time
+import warnings
+from contextlib import contextmanager
 import numpy as np
 import os
 import pandas as pd
+from dotenv import load_dotenv
 
+try:
+    import fcntl
+except ImportError:  # Windows: snapshots are written without an inter-process lock
+    fcntl = None
+
+load_dotenv()
+
+# Snapshot files are written next to this path: FAISS_INDEX_PATH.json names the current generation
 FAISS_INDEX_PATH = os.getenv("FAISS_INDEX_PATH", "data/faiss.index")
+# Seconds between background rounds that snapshot pending changes or pick up a newer snapshot
+FAISS_SNAPSHOT_INTERVAL = float(os.getenv("FAISS_SNAPSHOT_INTERVAL", "60"))
+VENDORS_CSV_PATH = os.getenv("VENDORS_CSV_PATH", "data/vendors.csv")
+SUPPLIERS_CSV_PATH = os.getenv("SUPPLIERS_CSV_PATH", "data/suppliers.csv")
+
+# Catalog size limits for the index type: exact search below the first, HNSW graph
+# below the second, inverted lists (IVF) above
+FAISS_FLAT_MAX_VECTORS = int(os.getenv("FAISS_FLAT_MAX_VECTORS", "20000"))
+FAISS_HNSW_MAX_VECTORS = int(os.getenv("FAISS_HNSW_MAX_VECTORS", "1000000"))
+FAISS_HNSW_M = 32
+FAISS_HNSW_EF_SEARCH = int(os.getenv("FAISS_HNSW_EF_SEARCH", "64"))
+FAISS_IVF_NPROBE = int(os.getenv("FAISS_IVF_NPROBE", "16"))
+
+# Columns compared when looking for similar vendors/suppliers
+SIMILARITY_FEATURES = (
+    "average_lead_time",
+    "quality_rating",
+    "price_competitiveness",
+    "communication_score",
+    "reliability_score",
+)
+
+def catalog_frame(vendors: pd.DataFrame = None, suppliers: pd.DataFrame = None):
+    """
+    One row per supplier_id combining the vendor catalog (lead time, ratings) with
+    supplier records (reliability); a supplier known to only one side keeps NaNs
+    """
+    frames = [frame for frame in (vendors, suppliers) if frame is not None and 'supplier_id' in frame.columns]
+    if not frames:
+        return pd.DataFrame(columns=['supplier_id', *SIMILARITY_FEATURES])
+    catalog = frames[0].drop_duplicates('supplier_id', keep='last')
+    for frame in frames[1:]:
+        frame = frame.drop_duplicates('supplier_id', keep='last')
+        extra = ['supplier_id'] + [name for name in frame.columns if name not in catalog.columns]
+        catalog = catalog.merge(frame[extra], on='supplier_id', how='outer')
+    return catalog.reset_index(drop=True)
+
+class FeatureScaler:
+    """
+    Standardizes the similarity features: each column is centred and scaled by
+    its catalog mean and spread, and missing values sit at the mean (zero)
+    """
+
+    def __init__(self, mean, scale):
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
 
-# Example: create/load FAISS index for supplier embeddings
-def get_faiss_index(dim=4):
-    if os.path.exists(FAISS_INDEX_PATH):
-        index = faiss.read_index(FAISS_INDEX_PATH)
+    @classmethod
+    def fit(cls, df: pd.DataFrame):
+        return cls.fit_raw(cls.raw(df))
+
+    @classmethod
+    def fit_raw(cls, raw: np.ndarray):
+        with warnings.catch_warnings():
+            # A feature missing from the whole catalog has no mean; it becomes all zeros
+            warnings.simplefilter("ignore", RuntimeWarning)
+            mean = np.nanmean(raw, axis=0) if len(raw) else np.zeros(raw.shape[1])
+            scale = np.nanstd(raw, axis=0) if len(raw) else np.ones(raw.shape[1])
+        mean = np.nan_to_num(mean, nan=0.0)
+        scale = np.where(np.nan_to_num(scale, nan=0.0) > 0, scale, 1.0)
+        return cls(mean, scale)
+
+    @staticmethod
+    def raw(df: pd.DataFrame):
+        return np.column_stack([
+            pd.to_numeric(df[name], errors='coerce').to_numpy(dtype=np.float64) if name in df.columns
+            else np.full(len(df), np.nan)
+            for name in SIMILARITY_FEATURES
+        ])
+
+    def transform(self, df: pd.DataFrame):
+        return self.transform_raw(self.raw(df))
+
+    def transform_raw(self, raw: np.ndarray):
+        vectors = (raw - self.mean) / self.scale
+        return np.ascontiguousarray(np.nan_to_num(vectors, nan=0.0), dtype=np.float32)
+
+def build_faiss_index(vectors: np.ndarray):
+    """
+    An ID-mapped L2 index over vectors (labels 0..n-1), suited to the catalog size:
+    exact (flat) search for small catalogs, an HNSW graph for large ones, inverted
+    lists (IVF) for very large ones
+    """
+    count, dim = vectors.shape
+    if count <= FAISS_FLAT_MAX_VECTORS:
+        inner = faiss.IndexFlatL2(dim)
+    elif count <= FAISS_HNSW_MAX_VECTORS:
+        inner = faiss.IndexHNSWFlat(dim, FAISS_HNSW_M)
+        inner.hnsw.efSearch = FAISS_HNSW_EF_SEARCH
     else:
-        index = faiss.IndexFlatL2(dim)
+        # About 4 * sqrt(n) lists, with enough training points per list
+        nlist = max(1, min(int(4 * math.sqrt(count)), count // 39))
+        inner = faiss.IndexIVFFlat(faiss.IndexFlatL2(dim), dim, nlist, faiss.METRIC_L2)
+        inner.train(vectors)
+        inner.nprobe = FAISS_IVF_NPROBE
+    index = faiss.IndexIDMap2(inner)
+    if count:
+        index.add_with_ids(np.ascontiguousarray(vectors, dtype=np.float32), np.arange(count, dtype=np.int64))
     return index
 
-def save_faiss_index(index):
-    faiss.write_index(index, FAISS_INDEX_PATH)
+def _index_type(index):
+    return type(faiss.downcast_index(index.index)).__name__
+
+def _mmap_flags(index_type):
+    # IVF maps its inverted lists with IO_FLAG_MMAP; flat and HNSW storage needs
+    # IO_FLAG_MMAP_IFC (faiss >= 1.9) to be mapped instead of copied
+    if index_type == "IndexIVFFlat":
+        return faiss.IO_FLAG_MMAP
+    return getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+
+def read_manifest(path=None):
+    """The current snapshot manifest at path, or None"""
+    try:
+        with open(f"{path or FAISS_INDEX_PATH}.json") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _atomic_write(final, write):
+    tmp = f"{final}.tmp"
+    with open(tmp, "wb") as f:
+        write(f)
+    os.replace(tmp, final)
+
+@contextmanager
+def snapshot_lock(path=None):
+    """Exclusive lock, across processes, around reading and replacing the snapshot at path"""
+    path = path or FAISS_INDEX_PATH
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(f"{path}.lock", "a") as handle:
+        if fcntl:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+def write_snapshot(path, index, supplier_ids, vectors, scaler, source_mtime=0):
+    """
+    Write a snapshot: index, vectors and supplier_ids go to files of a new
+    generation, then the manifest naming them replaces the previous one with a
+    single os.replace, so readers see the old snapshot or the new one, never a mix.
+    The superseded generation's files are removed; workers that still map them
+    keep reading their copy until they switch. Returns the manifest.
+    """
+    directory, name = os.path.split(path)
+    directory = directory or "."
+    os.makedirs(directory, exist_ok=True)
+    previous = read_manifest(path)
+    generation = f"{int(time.time() * 1000)}-{os.getpid()}"
+    files = {
+        "index_file": f"{name}.{generation}",
+        "vectors_file": f"{name}.{generation}.vectors.npy",
+        "ids_file": f"{name}.{generation}.ids.npy",
+    }
+    index_path = os.path.join(directory, files["index_file"])
+    faiss.write_index(index, f"{index_path}.tmp")
+    os.replace(f"{index_path}.tmp", index_path)
+    _atomic_write(os.path.join(directory, files["vectors_file"]), lambda f: np.save(f, np.asarray(vectors, dtype=np.float32)))
+    _atomic_write(os.path.join(directory, files["ids_file"]), lambda f: np.save(f, np.asarray(supplier_ids, dtype=str)))
+    manifest = {
+        "generation": generation,
+        **files,
+        "count": int(index.ntotal),
+        "index_type": _index_type(index),
+        "features": list(SIMILARITY_FEATURES),
+        "mean": scaler.mean.tolist(),
+        "scale": scaler.scale.tolist(),
+        "source_mtime": source_mtime,
+        "created_at": time.time(),
+    }
+    _atomic_write(f"{path}.json", lambda f: f.write(json.dumps(manifest).encode()))
+
+    for key in ("index_file", "vectors_file", "ids_file") if previous else ():
+        if previous.get(key) and previous[key] != files[key]:
+            try:
+                os.remove(os.path.join(directory, previous[key]))
+            except OSError:
+                pass
+    return manifest
+
+def load_snapshot(path=None):
+    """
+    (manifest, index, supplier_ids, vectors) of the current snapshot, all
+    memory-mapped so every worker shares the one on-disk copy; None when there is
+    no usable snapshot
+    """
+    path = path or FAISS_INDEX_PATH
+    manifest = read_manifest(path)
+    if not manifest or manifest.get("features") != list(SIMILARITY_FEATURES):
+        return None
+    directory = os.path.dirname(path) or "."
+    try:
+        index = faiss.read_index(os.path.join(directory, manifest["index_file"]), _mmap_flags(manifest["index_type"]))
+        vectors = np.load(os.path.join(directory, manifest["vectors_file"]), mmap_mode="r")
+        supplier_ids = np.load(os.path.join(directory, manifest["ids_file"]), mmap_mode="r")
+    except (OSError, RuntimeError, ValueError, KeyError) as e:
+        print(f"⚠️ Could not load similarity index snapshot: {e}")
+        return None
+    if index.ntotal != len(supplier_ids) or len(vectors) != len(supplier_ids):
+        return None
+    return manifest, index, supplier_ids, vectors
+
+class SimilarityEngine:
+    """
+    Nearest-neighbour search over a vendor/supplier catalog. Rows are standardized
+    feature vectors stored in FAISS under integer labels, mapped back to supplier_ids.
+    The base index (normally a memory-mapped snapshot) is never modified: upserts go
+    to a small in-memory delta index, removals to a set of dropped base labels, and
+    both are folded into the next snapshot. Queries are batched: one search of each
+    index for many suppliers.
+    """
+
+    def __init__(self, scaler, supplier_ids, vectors, index=None, generation=None, source_mtime=0):
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._snapshot_thread = None
+        self._version = 0
+        self.source_mtime = source_mtime
+        self._set_base(scaler, index if index is not None else build_faiss_index(vectors), supplier_ids, vectors, generation)
+
+    @classmethod
+    def from_catalog(cls, catalog: pd.DataFrame, source_mtime=0):
+        catalog = catalog.drop_duplicates('supplier_id', keep='last').reset_index(drop=True)
+        scaler = FeatureScaler.fit(catalog)
+        supplier_ids = np.asarray(catalog['supplier_id'].astype(str).to_numpy(), dtype=str)
+        return cls(scaler, supplier_ids, scaler.transform(catalog), source_mtime=source_mtime)
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        manifest, index, supplier_ids, vectors = snapshot
+        scaler = FeatureScaler(manifest["mean"], manifest["scale"])
+        return cls(scaler, supplier_ids, vectors, index, manifest["generation"], manifest.get("source_mtime", 0))
+
+    def _set_base(self, scaler, index, supplier_ids, vectors, generation):
+        self.scaler = scaler
+        self.base = index
+        self.base_ids = supplier_ids
+        self.base_vectors = vectors
+        self.generation = generation
+        self._labels = {supplier_id: label for label, supplier_id in enumerate(supplier_ids.tolist())}
+        self._removed = set()
+        self.delta = faiss.IndexIDMap2(faiss.IndexFlatL2(len(SIMILARITY_FEATURES)))
+        self._delta_ids = {}
+        self._delta_raw = {}  # label -> unscaled features, to rescale delta entries at the next snapshot
+        # supplier_id -> unscaled features (upsert) or None (removal) since the base, replayed
+        # onto a newer snapshot from another worker before this one writes its own
+        self._pending = {}
+        self._next_label = len(supplier_ids)
+        self._base_version = self._version
+
+    @property
+    def index_type(self):
+        return _index_type(self.base)
+
+    @property
+    def dirty(self):
+        """Whether entries changed since the base was written"""
+        return self._version != self._base_version
+
+    def __len__(self):
+        return len(self._labels)
+
+    def _supplier_id(self, label):
+        return str(self.base_ids[label]) if label < len(self.base_ids) else self._delta_ids[label]
+
+    def _vector(self, label):
+        return self.base_vectors[label] if label < len(self.base_ids) else self.delta.reconstruct(label)
+
+    def _search(self, vectors, k, exclude=None):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._lock:
+            found = []
+            for index in (self.base, self.delta):
+                if index.ntotal:
+                    # Fetch past dropped labels and the query's own entry
+                    found.append(index.search(vectors, min(index.ntotal, k + 1 + len(self._removed))))
+            if not found:
+                return [[] for _ in range(len(vectors))]
+            # FAISS reports squared L2 distances
+            distances = np.sqrt(np.maximum(np.hstack([distance for distance, _ in found]), 0.0))
+            labels = np.hstack([label for _, label in found])
+            order = np.argsort(distances, axis=1, kind='stable')
+            distances = np.take_along_axis(distances, order, axis=1)
+            labels = np.take_along_axis(labels, order, axis=1)
+
+            results = []
+            for row, (row_distances, row_labels) in enumerate(zip(distances.tolist(), labels.tolist())):
+                skip = exclude[row] if exclude is not None else None
+                matches = []
+                for distance, label in zip(row_distances, row_labels):
+                    if label < 0 or label == skip or label in self._removed:
+                        continue
+                    matches.append({
+                        "supplier_id": self._supplier_id(label),
+                        "distance": round(distance, 6),
+                        "similarity": round(1.0 / (1.0 + distance), 6),
+                    })
+                    if len(matches) == k:
+                        break
+                results.append(matches)
+            return results
+
+    def similar_to(self, supplier_ids, k=5):
+        """
+        Top-k most similar catalog entries for each supplier_id, in one batched
+        search. Returns {supplier_id: [matches]}; unknown ids map to None.
+        """
+        results = {supplier_id: None for supplier_id in supplier_ids}
+        with self._lock:
+            known = [supplier_id for supplier_id in results if supplier_id in self._labels]
+            if not known:
+                return results
+            labels = [self._labels[supplier_id] for supplier_id in known]
+            vectors = np.vstack([self._vector(label) for label in labels])
+            for supplier_id, matches in zip(known, self._search(vectors, k, exclude=labels)):
+                results[supplier_id] = matches
+        return results
+
+    def similar_to_records(self, df: pd.DataFrame, k=5):
+        """Top-k catalog matches for each row of df (suppliers not in the catalog), batched"""
+        if not len(df):
+            return []
+        return self._search(self.scaler.transform(df), k)
+
+    def _drop(self, supplier_ids):
+        delta_labels = []
+        dropped = 0
+        for supplier_id in supplier_ids:
+            label = self._labels.pop(supplier_id, None)
+            if label is None:
+                continue
+            dropped += 1
+            if label < len(self.base_ids):
+                self._removed.add(label)
+            else:
+                self._delta_ids.pop(label)
+                self._delta_raw.pop(label)
+                delta_labels.append(label)
+        if delta_labels:
+            self.delta.remove_ids(np.array(delta_labels, dtype=np.int64))
+        return dropped
+
+    def _record(self, supplier_id, features):
+        # Re-inserted so the log keeps the order of the latest change per supplier
+        self._pending.pop(supplier_id, None)
+        self._pending[supplier_id] = features
+
+    def _upsert_raw(self, supplier_ids, raw):
+        vectors = self.scaler.transform_raw(raw)
+        self._drop(supplier_ids)
+        labels = np.arange(self._next_label, self._next_label + len(supplier_ids), dtype=np.int64)
+        self._next_label += len(supplier_ids)
+        if len(labels):
+            self.delta.add_with_ids(vectors, labels)
+        for label, supplier_id, features in zip(labels.tolist(), supplier_ids, raw):
+            self._labels[supplier_id] = label
+            self._delta_ids[label] = supplier_id
+            self._delta_raw[label] = features
+            self._record(supplier_id, features)
+
+    def upsert(self, df: pd.DataFrame):
+        """
+        Add catalog entries, or replace those whose supplier_id is already indexed,
+        without rebuilding the index. Vectors use the scaler of the current base.
+        """
+        df = df.drop_duplicates('supplier_id', keep='last')
+        supplier_ids = df['supplier_id'].astype(str).tolist()
+        raw = FeatureScaler.raw(df)
+        with self._lock:
+            self._upsert_raw(supplier_ids, raw)
+            self._version += 1
+        return len(supplier_ids)
+
+    def remove(self, supplier_ids):
+        """Drop catalog entries by supplier_id; returns how many were indexed"""
+        with self._lock:
+            dropped = [supplier_id for supplier_id in supplier_ids if supplier_id in self._labels]
+            self._drop(dropped)
+            for supplier_id in dropped:
+                self._record(supplier_id, None)
+            if dropped:
+                self._version += 1
+        return len(dropped)
+
+    def _replay(self, pending):
+        """Apply another base's pending upserts and removals to this one (caller holds the lock)"""
+        removed = [supplier_id for supplier_id, features in pending.items() if features is None]
+        upserted = [supplier_id for supplier_id, features in pending.items() if features is not None]
+        self._drop(removed)
+        for supplier_id in removed:
+            self._record(supplier_id, None)
+        if upserted:
+            self._upsert_raw(upserted, np.vstack([pending[supplier_id] for supplier_id in upserted]))
+        if pending:
+            self._version += 1
+
+    def _live_entries(self):
+        """(supplier_ids, vectors, scaler) of every live entry, base first"""
+        keep = np.ones(len(self.base_ids), dtype=bool)
+        keep[list(self._removed)] = False
+        delta_labels = faiss.vector_to_array(self.delta.id_map).tolist()
+        supplier_ids = np.concatenate([np.asarray(self.base_ids)[keep], np.array([self._delta_ids[label] for label in delta_labels], dtype=str)])
+        raw = np.array([self._delta_raw[label] for label in delta_labels]).reshape(-1, len(SIMILARITY_FEATURES))
+        scaler = self.scaler
+        if not len(self.base_ids) and len(raw):
+            # A catalog built empty has an identity scaler; fit it on the entries added since
+            scaler = FeatureScaler.fit_raw(raw)
+        vectors = np.vstack([np.asarray(self.base_vectors)[keep], scaler.transform_raw(raw)])
+        return supplier_ids, vectors, scaler
+
+    def _adopt(self, snapshot):
+        manifest, index, supplier_ids, vectors = snapshot
+        self._set_base(FeatureScaler(manifest["mean"], manifest["scale"]), index, supplier_ids, vectors, manifest["generation"])
+
+    def snapshot(self, path=None):
+        """
+        Write the live entries (base minus removals, plus the delta) as a new
+        snapshot and switch to it memory-mapped. Under the snapshot lock, a newer
+        snapshot from another worker is adopted first and this worker's pending
+        changes replayed onto it, so no worker's changes are lost. The index is
+        rebuilt outside the engine lock; if entries change meanwhile, the engine
+        keeps its pending changes and the next round snapshots again.
+        """
+        path = path or FAISS_INDEX_PATH
+        with snapshot_lock(path):
+            return self._snapshot(path)
+
+    def _snapshot(self, path):
+        if self.dirty:
+            current = read_manifest(path)
+            if current and current.get("generation") != self.generation:
+                loaded = load_snapshot(path)
+                if loaded:
+                    with self._lock:
+                        pending = dict(self._pending)
+                        self._adopt(loaded)
+                        self._replay(pending)
+        with self._lock:
+            version = self._version
+            if self.dirty:
+                supplier_ids, vectors, scaler = self._live_entries()
+                index = None
+            else:
+                supplier_ids, vectors, index, scaler = self.base_ids, self.base_vectors, self.base, self.scaler
+        if index is None:
+            index = build_faiss_index(vectors)
+        manifest = write_snapshot(path, index, supplier_ids, vectors, scaler, self.source_mtime)
+        loaded = load_snapshot(path)
+        with self._lock:
+            if loaded and self._version == version and loaded[0]["generation"] == manifest["generation"]:
+                self._adopt(loaded)
+        return manifest
+
+    def sync(self, path=None):
+        """Snapshot pending changes, or switch to a newer snapshot written by another worker"""
+        path = path or FAISS_INDEX_PATH
+        if self.dirty:
+            self.snapshot(path)
+            return
+        manifest = read_manifest(path)
+        if manifest and manifest.get("generation") != self.generation:
+            loaded = load_snapshot(path)
+            with self._lock:
+                if loaded and not self.dirty:
+                    self._adopt(loaded)
+                    print(f"🔄 Similarity index switched to snapshot {self.generation} ({len(self)} entries)")
+
+    def start_snapshots(self, interval=None, path=None):
+        """Sync with the snapshot on disk every interval seconds in a background thread"""
+        interval = interval or FAISS_SNAPSHOT_INTERVAL
+        with self._lock:
+            if self._snapshot_thread is None:
+                self._snapshot_thread = threading.Thread(
+                    target=self._snapshot_loop, args=(interval, path), name="faiss-snapshots", daemon=True
+                )
+                self._snapshot_thread.start()
+
+    def _snapshot_loop(self, interval, path):
+        while not self._stop.wait(interval):
+            try:
+                self.sync(path)
+            except Exception as e:
+                print(f"⚠️ Similarity index snapshot failed: {e}")
+
+    def close(self, path=None):
+        """Stop background snapshots, writing pending changes first"""
+        self._stop.set()
+        if self.dirty:
+            self.snapshot(path)
+
+def catalog_mtime():
+    """Latest modification time of the catalog CSVs (0 when none exist)"""
+    return max([os.path.getmtime(path) for path in (VENDORS_CSV_PATH, SUPPLIERS_CSV_PATH) if os.path.exists(path)], default=0)
+
+def load_catalog():
+    """The vendor and supplier CSVs configured for the similarity engine, combined"""
+    frames = [pd.read_csv(path) if os.path.exists(path) else None for path in (VENDORS_CSV_PATH, SUPPLIERS_CSV_PATH)]
+    return catalog_frame(*frames)
+
+_similarity_engine = None
+_similarity_engine_lock = threading.Lock()
+
+def get_similarity_engine():
+    """
+    Return the process-wide SimilarityEngine: the snapshot on disk, memory-mapped,
+    unless the catalog CSVs are newer, in which case the index is rebuilt from
+    them and snapshotted for the other workers
+    """
+    global _similarity_engine
+    if _similarity_engine is None:
+        with _similarity_engine_lock:
+            if _similarity_engine is None:
+                source_mtime = catalog_mtime()
+                manifest = read_manifest()
+                snapshot = load_snapshot() if manifest and manifest.get("source_mtime", 0) >= source_mtime else None
+                if snapshot:
+                    engine = SimilarityEngine.from_snapshot(snapshot)
+                else:
+                    engine = SimilarityEngine.from_catalog(load_catalog(), source_mtime)
+                    try:
+                        engine.snapshot()
+                    except OSError as e:
+                        print(f"⚠️ Could not write similarity index snapshot: {e}")
+                engine.start_snapshots()
+                _similarity_engine = engine
+                print(f"✅ Similarity index ready ({len(engine)} entries, {engine.index_type})")
+    return _similarity_engine
 
-# Example: add supplier embeddings (mock)
-def add_supplier_embeddings(df: pd.DataFrame, index):
-    # For demo, use numeric columns as embeddings
-    vectors = df[["reliability_score", "past_delivery_rate", "on_time_percentage"]].values.astype(np.float32)
-    index.add(vectors)
-    save_faiss_index(index)
+def close_similarity_engine():
+    """Write pending similarity index changes and stop its background snapshots"""
+    if _similarity_engine is not None:
+        _similarity_engine.close()
@@ -0,0 +1,55 @@
+import os
+import asyncio
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DEFAULT_MAX_CONCURRENCY = int(os.getenv("AZURE_OPENAI_MAX_CONCURRENCY", "8"))
+
+class LLMExecutionEngine:
+    """
+    Fans a batch of LLM-bound coroutines out on the event loop with a
+    bounded number in flight at once.
+    """
+
+    def __init__(self, max_concurrency=None):
+        self.max_concurrency = max(1, int(max_concurrency or DEFAULT_MAX_CONCURRENCY))
+
+    async def map(self, func, items):
+        """
+        Await func(item) for every item and return the outcomes in input order.
+        A failing item yields its exception in place of a result, so one bad
+        row never cancels the rest of the batch.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run(item):
+            async with semaphore:
+                try:
+                    return await func(item)
+                except Exception as e:
+                    return e
+
+        return await asyncio.gather(*(run(item) for item in items))
+
+    async def as_completed(self, func, items):
+        """
+        Like map(), but yield (index, outcome) pairs as soon as each item
+        finishes. Items still pending are cancelled if the consumer stops early.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run(index, item):
+            async with semaphore:
+                try:
+                    return index, await func(item)
+                except Exception as e:
+                    return index, e
+
+        tasks = [asyncio.ensure_future(run(index, item)) for index, item in enumerate(items)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
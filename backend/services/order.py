@@ -1,91 +1,216 @@
 import os
+import json
+import asyncio
+import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
-from openai import AzureOpenAI
+from datetime import datetime
 from dotenv import load_dotenv
-import json
+from .azure_ai_service import get_ai_service
+from .llm_engine import LLMExecutionEngine
+from .tabular_io import json_value
 
 load_dotenv()
 
-def get_azure_client():
-    return AzureOpenAI(
-        api_key=os.getenv("AZURE_OPENAI_KEY"),
-        api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2024-12-01-preview"),
-        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT")
+# Rule-based order risk, as before vectorization: an order is high risk with more than
+# ORDER_MAX_RISK_FLAGS historical flags or fewer than ORDER_TIGHT_TIMELINE_DAYS until
+# delivery (an unknown date counts as due today), and scores 0.7, otherwise 0.3
+ORDER_MAX_RISK_FLAGS = 1
+ORDER_TIGHT_TIMELINE_DAYS = 3
+ORDER_HIGH_RISK_SCORE = 0.7
+ORDER_LOW_RISK_SCORE = 0.3
+# Cut-offs between Low/Medium and Medium/High for the risk scores the LLM returns
+ORDER_RISK_THRESHOLDS = (0.4, 0.7)
+# Orders the flags do not settle and due within this many days of the timeline cut-off
+# (or without a valid date) are sent to the LLM; the rules settle the rest
+ORDER_AMBIGUITY_DAYS = int(os.getenv("ORDER_AMBIGUITY_DAYS", "2"))
+
+# Columns the flagging path reads; columnar uploads decode only these
+ORDER_INPUT_COLUMNS = ("order_id", "supplier_id", "expected_delivery_date", "historical_risk_flags")
+ORDER_REQUIRED_COLUMNS = ("order_id", "expected_delivery_date")
+
+ORDER_RISK_FACTOR_LABELS = (
+    "Multiple historical risk flags",
+    "Previous risk flag on record",
+    "Expected delivery date has passed",
+    "Tight timeline",
+    "Unknown delivery date",
+)
+
+def days_until(dates: pd.Series, now=None):
+    """
+    Whole days from now until each expected delivery date, parsed once for the
+    column; unparseable dates are NaN
+    """
+    delivery_dates = pd.to_datetime(dates, format='%Y-%m-%d', errors='coerce')
+    now = pd.Timestamp(now or datetime.now())
+    return (delivery_dates - now).dt.days.to_numpy(dtype=np.float64)
+
+def risk_levels(risk_score):
+    """High / Medium / Low for an array of risk scores"""
+    medium, high = ORDER_RISK_THRESHOLDS
+    return np.where(risk_score >= high, "High", np.where(risk_score >= medium, "Medium", "Low"))
+
+def score_orders(df: pd.DataFrame, now=None):
+    """
+    Rule-based risk for a whole frame of orders, column-wise. Returns NumPy arrays:
+    days until delivery, risk flags, risk score and level, the mask of orders the
+    rules cannot settle, and one boolean risk-factor column per label.
+    """
+    days = days_until(df['expected_delivery_date'], now) if 'expected_delivery_date' in df.columns else np.full(len(df), np.nan)
+    flags = (
+        pd.to_numeric(df['historical_risk_flags'], errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+        if 'historical_risk_flags' in df.columns else np.zeros(len(df))
     )
+    unknown_date = np.isnan(days)
+    rule_days = np.nan_to_num(days, nan=0.0)
+    high_risk = (flags > ORDER_MAX_RISK_FLAGS) | (rule_days < ORDER_TIGHT_TIMELINE_DAYS)
+    risk_score = np.where(high_risk, ORDER_HIGH_RISK_SCORE, ORDER_LOW_RISK_SCORE)
 
-def flag_high_risk_orders(df: pd.DataFrame):
-    client = get_azure_client()
-    results = []
-    
-    for _, row in df.iterrows():
-        # Calculate days until delivery
-        try:
-            delivery_date = datetime.strptime(row['expected_delivery_date'], '%Y-%m-%d')
-            days_until_delivery = (delivery_date - datetime.now()).days
-        except:
-            days_until_delivery = 0
-        
-        # Create prompt for AI risk analysis
-        prompt = f"""
+    near_cutoff = np.abs(days - ORDER_TIGHT_TIMELINE_DAYS) <= ORDER_AMBIGUITY_DAYS
+    ambiguous = unknown_date | ((flags <= ORDER_MAX_RISK_FLAGS) & near_cutoff)
+
+    risk_mask = np.column_stack((
+        flags > ORDER_MAX_RISK_FLAGS,
+        (flags > 0) & (flags <= ORDER_MAX_RISK_FLAGS),
+        days < 0,
+        (days >= 0) & (days < ORDER_TIGHT_TIMELINE_DAYS),
+        unknown_date,
+    ))
+    return {
+        "days_until_delivery": days,
+        "historical_risk_flags": flags,
+        "risk_score": risk_score,
+        "risk_level": np.where(high_risk, "High", "Low"),
+        "ambiguous": ambiguous,
+        "risk_mask": risk_mask,
+    }
+
+def build_order_risk_prompt(row, days_until_delivery):
+    """
+    Build the risk prompt for one order row
+    """
+    return f"""
         Analyze this order's risk level:
-        - Order ID: {row['order_id']}
-        - Supplier ID: {row['supplier_id']}
-        - Expected Delivery Date: {row['expected_delivery_date']}
+        - Order ID: {row.get('order_id')}
+        - Supplier ID: {row.get('supplier_id')}
+        - Expected Delivery Date: {row.get('expected_delivery_date')}
         - Days Until Delivery: {days_until_delivery}
-        - Historical Risk Flags: {row['historical_risk_flags']}
-        
+        - Historical Risk Flags: {row.get('historical_risk_flags')}
+
         Based on these factors, determine if this is a high-risk order.
         Consider: tight delivery timeline, supplier history, past risk flags.
-        
+
         Return JSON: {{"high_risk": true/false, "risk_score": 0.8, "risk_factors": ["factor1", "factor2"]}}
         """
-        
-        try:
-            response = client.chat.completions.create(
-                model=os.getenv("AZURE_OPENAI_DEPLOYMENT"),
-                messages=[{"role": "user", "content": prompt}],
-                max_completion_tokens=150,
-                temperature=0.1
-            )
-            
-            ai_response = response.choices[0].message.content.strip()
-            try:
-                risk_analysis = json.loads(ai_response)
-            except:
-                # Fallback analysis
-                high_risk = row['historical_risk_flags'] > 1 or days_until_delivery < 3
-                risk_analysis = {
-                    "high_risk": high_risk,
-                    "risk_score": 0.7 if high_risk else 0.3,
-                    "risk_factors": ["Historical issues", "Tight timeline"] if high_risk else []
-                }
-            
-            if risk_analysis.get("high_risk", False):
-                results.append({
-                    "order_id": row['order_id'],
-                    "supplier_id": row['supplier_id'],
-                    "high_risk": True,
-                    "risk_score": risk_analysis.get("risk_score", 0.5),
-                    "risk_factors": risk_analysis.get("risk_factors", []),
-                    "expected_delivery_date": row['expected_delivery_date'],
-                    "days_until_delivery": days_until_delivery,
-                    "historical_risk_flags": row['historical_risk_flags']
-                })
-                
-        except Exception as e:
-            # Fallback to rule-based flagging
-            high_risk = row['historical_risk_flags'] > 1 or days_until_delivery < 3
-            if high_risk:
-                results.append({
-                    "order_id": row['order_id'],
-                    "supplier_id": row['supplier_id'],
-                    "high_risk": True,
-                    "risk_score": 0.7,
-                    "risk_factors": ["Rule-based analysis"],
-                    "expected_delivery_date": row['expected_delivery_date'],
-                    "days_until_delivery": days_until_delivery,
-                    "historical_risk_flags": row['historical_risk_flags']
-                })
-    
-    return results
+
+def _parse_order_risk(ai_response):
+    """Risk score, level, factors and analysis from a model answer; raises on unusable output"""
+    data = json.loads(ai_response)
+    risk_score = min(1.0, max(0.0, float(data["risk_score"])))
+    risk_level = data.get("risk_level")
+    if risk_level not in ("High", "Medium", "Low"):
+        risk_level = str(risk_levels(np.array([risk_score]))[0])
+    # high_risk decides whether the order is flagged, as it always has
+    if data.get("high_risk") is True and risk_level == "Low":
+        risk_level = "Medium"
+    elif data.get("high_risk") is False:
+        risk_level = "Low"
+    risk_factors = data.get("risk_factors") or data.get("primary_risks") or []
+    return risk_score, risk_level, list(risk_factors), data.get("analysis") or data.get("reasoning")
+
+def _factor_lists(risk_mask):
+    """Risk-factor labels per row, built once per distinct pattern of factors"""
+    codes = risk_mask.astype(np.int64) @ (1 << np.arange(risk_mask.shape[1], dtype=np.int64))
+    lookup = {}
+    for code in np.unique(codes).tolist():
+        lookup[code] = [label for bit, label in enumerate(ORDER_RISK_FACTOR_LABELS) if code & (1 << bit)]
+    return [lookup[code] for code in codes.tolist()]
+
+async def flag_orders_async(df: pd.DataFrame, max_concurrency=None, use_llm=True):
+    """
+    Flag Medium and High risk orders. Every order is scored by the rules in one
+    vectorized pass; only orders near the timeline cut-off that their flags do not
+    settle (or without a usable date) are sent to the LLM. Returns (flagged_orders, summary).
+    """
+    df = df.reset_index(drop=True)
+    scores = score_orders(df)
+    risk_score = scores["risk_score"].copy()
+    risk_level = scores["risk_level"].astype(object)
+    source = np.full(len(df), "rules", dtype=object)
+    llm_factors = {}
+    llm_analysis = {}
+
+    ambiguous = np.flatnonzero(scores["ambiguous"]).tolist() if use_llm else []
+    if ambiguous:
+        ai_service = get_ai_service()
+        rows = df.iloc[ambiguous].to_dict('records')
+        days = scores["days_until_delivery"][ambiguous].tolist()
+
+        async def assess(item):
+            row, days_until_delivery = item
+            shown_days = "unknown" if days_until_delivery != days_until_delivery else int(days_until_delivery)
+            ai_response = await ai_service._acall_azure_openai(build_order_risk_prompt(row, shown_days), max_tokens=150)
+            return _parse_order_risk(ai_response)
+
+        outcomes = await LLMExecutionEngine(max_concurrency).map(assess, list(zip(rows, days)))
+        for position, outcome in zip(ambiguous, outcomes):
+            if isinstance(outcome, Exception):
+                # Unreachable model or unusable answer: the rule-based verdict stands
+                source[position] = "fallback"
+                continue
+            risk_score[position], risk_level[position], llm_factors[position], llm_analysis[position] = outcome
+            source[position] = "llm" if ai_service.use_real_ai else "simulation"
+
+    flagged = np.flatnonzero(risk_level != "Low")
+    frame = df.iloc[flagged]
+
+    def column(name):
+        # Native Python values for the flagged rows only, one conversion per column
+        if name not in frame.columns:
+            return [None] * len(frame)
+        return [json_value(value) for value in frame[name].tolist()]
+
+    days = scores["days_until_delivery"][flagged]
+    factor_lists = _factor_lists(scores["risk_mask"][flagged])
+    flagged_orders = []
+    for position, order_id, supplier_id, delivery_date, raw_flags, flags, days_until_delivery, level, score, factors in zip(
+        flagged.tolist(),
+        column('order_id'),
+        column('supplier_id'),
+        column('expected_delivery_date'),
+        column('historical_risk_flags'),
+        scores["historical_risk_flags"][flagged].tolist(),
+        [None if np.isnan(value) else int(value) for value in days.tolist()],
+        risk_level[flagged].tolist(),
+        np.round(risk_score[flagged], 3).tolist(),
+        factor_lists,
+    ):
+        flagged_orders.append({
+            "order_id": order_id,
+            "supplier_id": supplier_id,
+            "high_risk": level == "High",
+            "risk_level": level,
+            "risk_score": score,
+            "risk_factors": llm_factors.get(position) or list(factors),
+            "analysis": llm_analysis.get(position) or (
+                f"{int(flags)} historical risk flag(s), "
+                + (f"{days_until_delivery} day(s) until delivery." if days_until_delivery is not None else "no valid delivery date.")
+            ),
+            "expected_delivery_date": delivery_date,
+            "days_until_delivery": days_until_delivery,
+            "historical_risk_flags": raw_flags,
+            "source": source[position],
+        })
+
+    summary = {
+        "orders": len(df),
+        "flagged": len(flagged_orders),
+        "high_risk": int((risk_level == "High").sum()),
+        "medium_risk": int((risk_level == "Medium").sum()),
+        "llm_orders": len(ambiguous),
+    }
+    return flagged_orders, summary
+
+def flag_high_risk_orders(df: pd.DataFrame):
+    """Blocking flag_orders_async for scripts; returns only the flagged orders"""
+    return asyncio.run(flag_orders_async(df))[0]
@@ -0,0 +1,229 @@
+import os
+import json
+import time
+import math
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PREDICTION_CACHE_PATH = os.getenv("PREDICTION_CACHE_PATH", "data/prediction_cache.db")
+PREDICTION_CACHE_TTL = float(os.getenv("PREDICTION_CACHE_TTL", str(7 * 24 * 3600)))
+PREDICTION_CACHE_MEMORY_ENTRIES = int(os.getenv("PREDICTION_CACHE_MEMORY_ENTRIES", "10000"))
+PREDICTION_CACHE_DISK_ENTRIES = int(os.getenv("PREDICTION_CACHE_DISK_ENTRIES", "500000"))
+PREDICTION_CACHE_ENABLED = os.getenv("PREDICTION_CACHE_ENABLED", "true").lower() == "true"
+
+# Fields the reliability prompt reads, with the default it substitutes when missing
+SUPPLIER_FEATURE_FIELDS = (
+    ("supplier_id", "Unknown"),
+    ("supplier_name", "Unknown"),
+    ("on_time_percentage", 0),
+    ("quality_score", 0),
+    ("reliability_score", 0),
+    ("total_orders", 0),
+    ("defect_rate", 0),
+    ("region", "Unknown"),
+    ("years_active", 0),
+    ("contract_compliance", 0),
+)
+
+# Identifiers and labels are compared as text: supplier_id "001" is not supplier 1
+_TEXT_FIELDS = frozenset(field for field, default in SUPPLIER_FEATURE_FIELDS if isinstance(default, str))
+
+def _normalize_text(value):
+    """Map a text field to its stripped string; missing and blank values to None"""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return str(value).strip() or None
+
+def _normalize_value(value):
+    """Map equivalent spellings of a number (98, 98.0, ' 98 ', numpy floats) to one form"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        if not value:
+            # A blank cell reads as missing, like NaN
+            return None
+        try:
+            value = float(value)
+        except ValueError:
+            return value
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return str(value)
+    if math.isnan(number):
+        return None
+    return repr(round(number, 6))
+
+def supplier_fingerprint(row, prompt_version, deployment):
+    """Content hash of a supplier's prompt inputs, the prompt version and the model deployment"""
+    features = [
+        (_normalize_text if field in _TEXT_FIELDS else _normalize_value)(row.get(field, default))
+        for field, default in SUPPLIER_FEATURE_FIELDS
+    ]
+    payload = json.dumps([prompt_version, deployment, features], separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def supplier_feature_groups(df):
+    """
+    Group label per row of df, computed column-wise: rows whose prompt inputs are
+    equal after normalization (numbers rounded, text stripped) share a label
+    """
+    columns = {}
+    for field, _ in SUPPLIER_FEATURE_FIELDS:
+        if field not in df.columns:
+            # Every row gets the same default, so the column cannot split groups
+            continue
+        values = df[field]
+        numbers = pd.to_numeric(values, errors="coerce")
+        if field not in _TEXT_FIELDS and numbers.notna().sum() == values.notna().sum():
+            columns[field] = numbers.round(6)
+        else:
+            columns[field] = values.astype(str).str.strip()
+    if not columns:
+        return np.zeros(len(df), dtype=np.int64)
+    frame = pd.DataFrame(columns)
+    return frame.groupby(list(columns), dropna=False, sort=False).ngroup().to_numpy()
+
+class PredictionCache:
+    """
+    Two-tier cache of prediction results: an in-process LRU in front of a
+    SQLite table shared by every worker on the host. Both tiers honour the
+    same TTL and are trimmed to a maximum number of entries.
+    """
+
+    def __init__(self, path=PREDICTION_CACHE_PATH, ttl_seconds=PREDICTION_CACHE_TTL,
+                 max_memory_entries=PREDICTION_CACHE_MEMORY_ENTRIES,
+                 max_disk_entries=PREDICTION_CACHE_DISK_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self._memory = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._writes_since_trim = 0
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "writes": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+        }
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS prediction_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_prediction_cache_last_access ON prediction_cache (last_access)"
+        )
+
+    def peek(self, key):
+        """The in-memory tier's entry for key, or None; never touches SQLite or counts a miss"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None or entry[0] <= time.time():
+                return None
+            self._memory.move_to_end(key)
+            self._stats["memory_hits"] += 1
+            return dict(entry[1])
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return dict(entry[1])
+                del self._memory[key]
+
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM prediction_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] <= now:
+                self._stats["misses"] += 1
+                return None
+
+            self._conn.execute("UPDATE prediction_cache SET last_access = ? WHERE key = ?", (now, key))
+            value = json.loads(row[0])
+            self._remember(key, row[1], value)
+            self._stats["disk_hits"] += 1
+            return dict(value)
+
+    def set(self, key, value):
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+        with self._lock:
+            self._remember(key, expires_at, dict(value))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO prediction_cache (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), expires_at, now)
+            )
+            self._stats["writes"] += 1
+            self._writes_since_trim += 1
+            if self._writes_since_trim >= 1000:
+                self._trim_disk(now)
+
+    def _remember(self, key, expires_at, value):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self._stats["memory_evictions"] += 1
+
+    def _trim_disk(self, now):
+        """Drop expired rows, then the least recently used beyond the size cap"""
+        self._writes_since_trim = 0
+        expired = self._conn.execute("DELETE FROM prediction_cache WHERE expires_at <= ?", (now,)).rowcount
+        overflow = self._conn.execute(
+            "DELETE FROM prediction_cache WHERE key IN ("
+            "SELECT key FROM prediction_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,)
+        ).rowcount
+        self._stats["disk_evictions"] += max(expired, 0) + max(overflow, 0)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+            stats["disk_entries"] = self._conn.execute("SELECT COUNT(*) FROM prediction_cache").fetchone()[0]
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        stats["ttl_seconds"] = self.ttl_seconds
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._conn.execute("DELETE FROM prediction_cache")
+
+_prediction_cache = None
+_prediction_cache_lock = threading.Lock()
+
+def get_prediction_cache():
+    """Return the process-wide PredictionCache, or None when caching is disabled"""
+    global _prediction_cache
+    if not PREDICTION_CACHE_ENABLED:
+        return None
+    if _prediction_cache is None:
+        with _prediction_cache_lock:
+            if _prediction_cache is None:
+                _prediction_cache = PredictionCache()
+    return _prediction_cache
@@ -0,0 +1,62 @@
+import json
+from sqlalchemy import select, func
+from ..database import SessionLocal, PredictionHistory
+from .azure_ai_service import get_ai_service
+from .prediction_cache import supplier_fingerprint
+from .supplier import RELIABILITY_PROMPT_VERSION
+
+# Stored results worth reusing: real model answers, not simulations, fallbacks or errors
+REUSABLE_SOURCES = ("llm", "cache", "history")
+LOOKUP_BATCH_SIZE = 500
+# History rows holding one supplier's reliability prediction
+PREDICTION_TYPES = ("single", "batch")
+
+def input_fingerprint(row):
+    """Fingerprint of a supplier record under the current reliability prompt and deployment"""
+    return supplier_fingerprint(row, RELIABILITY_PROMPT_VERSION, get_ai_service().deployment)
+
+def find_stored_predictions(user_id, records, db=None):
+    """
+    Stored results to reuse for (supplier_id, fingerprint) pairs: each supplier's
+    latest reliability prediction for the user, looked up through the
+    (user_id, supplier_id) index, counts only if its inputs match the fingerprint
+    and its source is reusable. Returns {fingerprint: result}.
+    """
+    own_session = db is None
+    db = db or SessionLocal()
+    table = PredictionHistory.__table__
+    wanted = {}
+    for supplier_id, fingerprint in records:
+        wanted.setdefault(str(supplier_id), set()).add(fingerprint)
+    supplier_ids = list(wanted)
+    found = {}
+    try:
+        for start in range(0, len(supplier_ids), LOOKUP_BATCH_SIZE):
+            latest = (
+                select(func.max(table.c.id))
+                .where(table.c.user_id == user_id)
+                .where(table.c.prediction_type.in_(PREDICTION_TYPES))
+                .where(table.c.supplier_id.in_(supplier_ids[start:start + LOOKUP_BATCH_SIZE]))
+                .group_by(table.c.supplier_id)
+            )
+            rows = db.execute(
+                select(table.c.supplier_id, table.c.input_fingerprint, table.c.result_data)
+                .where(table.c.id.in_(latest))
+            ).all()
+            for supplier_id, fingerprint, result_data in rows:
+                if fingerprint is None or fingerprint not in wanted.get(supplier_id, ()):
+                    continue
+                try:
+                    result = json.loads(result_data) if result_data else {}
+                except json.JSONDecodeError:
+                    continue
+                if result.get("source") in REUSABLE_SOURCES and "error" not in result:
+                    found[fingerprint] = result
+    finally:
+        if own_session:
+            db.close()
+    return found
+
+def reused_prediction(result):
+    """A stored result served again, tagged so callers can tell it was not re-predicted"""
+    return dict(result, source="history")
@@ -0,0 +1,274 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import sqlite3
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from .tabular_io import CSV, count_table_rows, iter_table_file
+
+load_dotenv()
+
+PREDICTION_JOBS_PATH = os.getenv("PREDICTION_JOBS_PATH", "data/prediction_jobs.db")
+PREDICTION_JOBS_UPLOAD_DIR = os.getenv("PREDICTION_JOBS_UPLOAD_DIR", "data/job_uploads")
+PREDICTION_JOB_WORKERS = int(os.getenv("PREDICTION_JOB_WORKERS", "2"))
+PREDICTION_JOB_CHUNK_SIZE = int(os.getenv("PREDICTION_JOB_CHUNK_SIZE", "500"))
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+INTERRUPTED = "interrupted"
+
+def _process_alive(pid):
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+def _process_start(pid):
+    """Start time of pid in clock ticks since boot, from /proc; None where it cannot be read"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # starttime is field 22; fields are counted after the parenthesised command name
+    return stat.rsplit(")", 1)[1].split()[19]
+
+_instance_tokens = {}
+
+def worker_token(pid=None):
+    """
+    Token of this process's lifetime: its start time, or a random id per process
+    without /proc. A restarted worker that gets the old PID back gets a new token.
+    """
+    pid = pid or os.getpid()
+    if pid not in _instance_tokens:
+        _instance_tokens[pid] = _process_start(pid) or uuid.uuid4().hex
+    return _instance_tokens[pid]
+
+def _owner_alive(pid, token):
+    if token is None:
+        # Jobs recorded before tokens existed
+        return _process_alive(pid)
+    if pid == os.getpid():
+        return token == worker_token()
+    start = _process_start(pid)
+    if start is None:
+        # No /proc to read another worker's start time from; fall back to the PID
+        return _process_alive(pid)
+    return token == start
+
+class JobStore:
+    """
+    SQLite record of batch prediction jobs and their per-row results, so
+    progress and results survive the request that started the job and are
+    visible to every worker on the host.
+    """
+
+    def __init__(self, path=PREDICTION_JOBS_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS prediction_jobs ("
+            "id TEXT PRIMARY KEY, user_id INTEGER NOT NULL, filename TEXT, upload_path TEXT, owner_pid INTEGER, "
+            "status TEXT NOT NULL, options TEXT, rows_total INTEGER DEFAULT 0, "
+            "rows_done INTEGER DEFAULT 0, rows_failed INTEGER DEFAULT 0, error TEXT, "
+            "created_at REAL NOT NULL, started_at REAL, finished_at REAL, owner_token TEXT)"
+        )
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(prediction_jobs)")}
+        if "owner_token" not in columns:
+            self._conn.execute("ALTER TABLE prediction_jobs ADD COLUMN owner_token TEXT")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS prediction_job_results ("
+            "job_id TEXT NOT NULL, row_index INTEGER NOT NULL, result TEXT NOT NULL, "
+            "PRIMARY KEY (job_id, row_index))"
+        )
+
+    def create(self, user_id, filename, upload_path, rows_total, options):
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO prediction_jobs (id, user_id, filename, upload_path, owner_pid, owner_token, status, options, "
+                "rows_total, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, user_id, filename, upload_path, os.getpid(), worker_token(), QUEUED, json.dumps(options),
+                 rows_total, time.time())
+            )
+        return job_id
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM prediction_jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["options"] = json.loads(job["options"] or "{}")
+        return job
+
+    def set_status(self, job_id, status, error=None):
+        now = time.time()
+        with self._lock:
+            if status == RUNNING:
+                self._conn.execute(
+                    "UPDATE prediction_jobs SET status = ?, started_at = COALESCE(started_at, ?) WHERE id = ?",
+                    (status, now, job_id)
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE prediction_jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                    (status, error, now, job_id)
+                )
+
+    def add_results(self, job_id, row_offset, results, failed):
+        """Store one chunk's results and advance the job's counters in one transaction"""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO prediction_job_results (job_id, row_index, result) VALUES (?, ?, ?)",
+                    [(job_id, row_offset + i, json.dumps(result)) for i, result in enumerate(results)]
+                )
+                self._conn.execute(
+                    "UPDATE prediction_jobs SET rows_done = rows_done + ?, rows_failed = rows_failed + ? WHERE id = ?",
+                    (len(results), failed, job_id)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def results(self, job_id, offset=0, limit=100):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT row_index, result FROM prediction_job_results WHERE job_id = ? "
+                "AND row_index >= ? ORDER BY row_index LIMIT ?",
+                (job_id, offset, limit)
+            ).fetchall()
+        return [dict(json.loads(row["result"]), row_index=row["row_index"]) for row in rows]
+
+    def mark_interrupted(self):
+        """
+        Jobs left queued or running by a worker that no longer exists will not finish;
+        say so. A worker is matched by PID and worker_token, so a restarted one that
+        reuses the PID (PID 1 in a container) does not keep its predecessor's jobs alive.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, owner_pid, owner_token FROM prediction_jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)
+            ).fetchall()
+            orphaned = [row["id"] for row in rows if not _owner_alive(row["owner_pid"], row["owner_token"])]
+            self._conn.executemany(
+                "UPDATE prediction_jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                [(INTERRUPTED, "Server restarted before the job finished", time.time(), job_id) for job_id in orphaned]
+            )
+
+def job_progress(job):
+    """Public view of a job row with percent complete and an ETA from the rate so far"""
+    progress = {
+        "job_id": job["id"],
+        "status": job["status"],
+        "filename": job["filename"],
+        "rows_total": job["rows_total"],
+        "rows_done": job["rows_done"],
+        "rows_failed": job["rows_failed"],
+        "percent_complete": round(100.0 * job["rows_done"] / job["rows_total"], 1) if job["rows_total"] else 0.0,
+        "eta_seconds": None,
+        "error": job["error"],
+    }
+    if job["status"] == RUNNING and job["started_at"] and job["rows_done"]:
+        elapsed = time.time() - job["started_at"]
+        remaining = max(0, job["rows_total"] - job["rows_done"])
+        progress["eta_seconds"] = round(elapsed / job["rows_done"] * remaining, 1)
+    if job["finished_at"] and job["started_at"]:
+        progress["execution_time"] = round(job["finished_at"] - job["started_at"], 3)
+    return progress
+
+class PredictionJobQueue:
+    """
+    Runs batch prediction jobs on a small thread pool. Each job streams its
+    upload in chunks through process_chunk(job, chunk, row_offset), an async
+    callable returning (results, successful, failed), and records every
+    chunk's results before reading the next.
+    """
+
+    def __init__(self, store=None, workers=PREDICTION_JOB_WORKERS,
+                 upload_dir=PREDICTION_JOBS_UPLOAD_DIR, chunk_size=PREDICTION_JOB_CHUNK_SIZE):
+        self.store = store or JobStore()
+        self.upload_dir = upload_dir
+        self.chunk_size = chunk_size
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="prediction-job")
+        os.makedirs(upload_dir, exist_ok=True)
+        self.store.mark_interrupted()
+
+    def save_upload(self, fileobj, fmt=CSV):
+        """Copy an uploaded file to the job upload directory; returns (path, data rows)"""
+        path = os.path.join(self.upload_dir, f"{uuid.uuid4().hex}.{fmt}")
+        with open(path, "wb") as out:
+            shutil.copyfileobj(fileobj, out, 1 << 20)
+        return path, count_table_rows(path, fmt)
+
+    def submit(self, job_id, process_chunk, on_finish=None):
+        self._executor.submit(self._run, job_id, process_chunk, on_finish)
+
+    def _run(self, job_id, process_chunk, on_finish):
+        # Each worker thread drives its own event loop for the async prediction code
+        asyncio.run(self._process(job_id, process_chunk, on_finish))
+
+    async def _process(self, job_id, process_chunk, on_finish):
+        job = self.store.get(job_id)
+        self.store.set_status(job_id, RUNNING)
+        options = job["options"]
+        chunk_size = options.get("chunk_size") or self.chunk_size
+        try:
+            row_offset = 0
+            chunks = iter_table_file(job["upload_path"], options.get("format", CSV), chunk_size, options.get("columns"))
+            for chunk in chunks:
+                results, _, failed = await process_chunk(job, chunk, row_offset)
+                self.store.add_results(job_id, row_offset, results, failed)
+                row_offset += len(chunk)
+            self.store.set_status(job_id, COMPLETED)
+            print(f"✅ Prediction job {job_id} completed ({row_offset} rows)")
+        except Exception as e:
+            print(f"❌ Prediction job {job_id} failed: {e}")
+            self.store.set_status(job_id, FAILED, str(e))
+        finally:
+            try:
+                os.remove(job["upload_path"])
+            except OSError:
+                pass
+        if on_finish:
+            try:
+                on_finish(self.store.get(job_id))
+            except Exception as e:
+                print(f"Error finishing prediction job {job_id}: {e}")
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+def get_job_queue():
+    """Return the process-wide PredictionJobQueue"""
+    global _job_queue
+    if _job_queue is None:
+        with _job_queue_lock:
+            if _job_queue is None:
+                _job_queue = PredictionJobQueue()
+    return _job_queue
@@ -0,0 +1,214 @@
+import os
+import time
+import random
+import asyncio
+import threading
+from openai import RateLimitError
+from dotenv import load_dotenv
+
+load_dotenv()
+
+AZURE_OPENAI_RPM = float(os.getenv("AZURE_OPENAI_RPM", "600"))
+AZURE_OPENAI_TPM = float(os.getenv("AZURE_OPENAI_TPM", "100000"))
+AZURE_OPENAI_MAX_RETRIES = int(os.getenv("AZURE_OPENAI_MAX_RETRIES", "5"))
+AZURE_OPENAI_BACKOFF_BASE = float(os.getenv("AZURE_OPENAI_BACKOFF_BASE", "1.0"))
+AZURE_OPENAI_BACKOFF_MAX = float(os.getenv("AZURE_OPENAI_BACKOFF_MAX", "60"))
+
+class RateLimitExceeded(Exception):
+    """Raised when a call is still throttled after every retry"""
+
+def estimate_tokens(prompt, max_tokens=0):
+    """Rough request cost: ~4 characters per prompt token plus the completion allowance"""
+    return len(prompt) // 4 + 1 + max_tokens
+
+def _retry_after_seconds(error):
+    """Read Retry-After (or Azure's retry-after-ms) from a 429 response, if present"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+class TokenBucket:
+    """
+    Refills continuously at limit_per_minute. Azure evaluates quota over
+    10-second windows, so the burst capacity is a sixth of the minute limit.
+    """
+
+    def __init__(self, limit_per_minute):
+        self.rate = limit_per_minute / 60.0
+        self.capacity = max(1.0, limit_per_minute / 6.0)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount):
+        self.level -= min(amount, self.capacity)
+
+    def give_back(self, amount):
+        self.level = min(self.capacity, self.level + amount)
+
+class AzureRateLimiter:
+    """
+    Process-wide limiter for Azure OpenAI traffic. Every call reserves one
+    request and its estimated tokens before it is sent; 429 responses pause
+    all callers for the Retry-After period and are retried with jittered
+    exponential backoff.
+    """
+
+    def __init__(self, rpm=AZURE_OPENAI_RPM, tpm=AZURE_OPENAI_TPM,
+                 max_retries=AZURE_OPENAI_MAX_RETRIES,
+                 backoff_base=AZURE_OPENAI_BACKOFF_BASE,
+                 backoff_max=AZURE_OPENAI_BACKOFF_MAX):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+        self._stats = {
+            "queue_depth": 0,
+            "calls": 0,
+            "throttled_responses": 0,
+            "exhausted": 0,
+            "total_wait_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+        }
+
+    def _reserve(self, tokens):
+        """Take capacity if available; otherwise return how long to wait before trying again"""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._blocked_until:
+                return self._blocked_until - now
+            self.requests.refill(now)
+            self.tokens.refill(now)
+            wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+            if wait <= 0:
+                self.requests.take(1)
+                self.tokens.take(tokens)
+            return wait
+
+    def _record_wait(self, waited):
+        with self._lock:
+            self._stats["queue_depth"] -= 1
+            self._stats["calls"] += 1
+            self._stats["total_wait_seconds"] += waited
+            self._stats["max_wait_seconds"] = max(self._stats["max_wait_seconds"], waited)
+
+    def acquire(self, tokens):
+        with self._lock:
+            self._stats["queue_depth"] += 1
+        start = time.monotonic()
+        try:
+            while True:
+                wait = self._reserve(tokens)
+                if wait <= 0:
+                    break
+                time.sleep(wait)
+        finally:
+            self._record_wait(time.monotonic() - start)
+
+    async def acquire_async(self, tokens):
+        with self._lock:
+            self._stats["queue_depth"] += 1
+        start = time.monotonic()
+        try:
+            while True:
+                wait = self._reserve(tokens)
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+        finally:
+            self._record_wait(time.monotonic() - start)
+
+    def reconcile(self, estimated_tokens, response):
+        """Refund the part of a reservation the call did not use"""
+        usage = getattr(response, "usage", None)
+        used = getattr(usage, "total_tokens", None)
+        if used is None or used >= estimated_tokens:
+            return
+        with self._lock:
+            self.tokens.give_back(estimated_tokens - used)
+
+    def _on_throttled(self, error, attempt):
+        """Block every caller until the server's Retry-After passes; return this caller's delay"""
+        retry_after = _retry_after_seconds(error)
+        backoff = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        delay = retry_after if retry_after is not None else backoff
+        # Full jitter on top so waiting callers do not retry in lockstep
+        delay += random.uniform(0, backoff)
+        with self._lock:
+            self._stats["throttled_responses"] += 1
+            self._blocked_until = max(self._blocked_until, time.monotonic() + (retry_after or 0))
+        return delay
+
+    def _exhausted(self, error):
+        with self._lock:
+            self._stats["exhausted"] += 1
+        return RateLimitExceeded(f"Azure OpenAI still throttled after {self.max_retries} retries: {error}")
+
+    def call(self, request, estimated_tokens):
+        """Run request() under the limiter, retrying 429s"""
+        for attempt in range(self.max_retries + 1):
+            self.acquire(estimated_tokens)
+            try:
+                response = request()
+                self.reconcile(estimated_tokens, response)
+                return response
+            except RateLimitError as e:
+                if attempt == self.max_retries:
+                    raise self._exhausted(e)
+                time.sleep(self._on_throttled(e, attempt))
+
+    async def acall(self, request, estimated_tokens):
+        """Async call(): request() must return an awaitable"""
+        for attempt in range(self.max_retries + 1):
+            await self.acquire_async(estimated_tokens)
+            try:
+                response = await request()
+                self.reconcile(estimated_tokens, response)
+                return response
+            except RateLimitError as e:
+                if attempt == self.max_retries:
+                    raise self._exhausted(e)
+                await asyncio.sleep(self._on_throttled(e, attempt))
+
+    def stats(self):
+        with self._lock:
+            now = time.monotonic()
+            self.requests.refill(now)
+            self.tokens.refill(now)
+            stats = dict(self._stats)
+            stats["available_requests"] = round(self.requests.level, 2)
+            stats["available_tokens"] = round(self.tokens.level, 2)
+            stats["blocked_for_seconds"] = round(max(0.0, self._blocked_until - now), 3)
+        stats["avg_wait_seconds"] = stats["total_wait_seconds"] / stats["calls"] if stats["calls"] else 0.0
+        return stats
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+def get_rate_limiter():
+    """Return the limiter shared by every Azure OpenAI caller in this process"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _rate_limiter_lock:
+            if _rate_limiter is None:
+                _rate_limiter = AzureRateLimiter()
+    return _rate_limiter
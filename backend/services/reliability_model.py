@@ -0,0 +1,337 @@
+"""Local supplier reliability model (softmax tiers, ridge scores) trained on stored model answers;
+train with: python -m backend.services.reliability_model train"""
+import os
+import json
+import argparse
+import threading
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from sqlalchemy import select
+
+load_dotenv()
+
+RELIABILITY_MODEL_DIR = os.getenv("RELIABILITY_MODEL_DIR", "data/models")
+RELIABILITY_MODEL_VERSION = os.getenv("RELIABILITY_MODEL_VERSION", "")  # empty: newest on disk
+RELIABILITY_MODEL_MIN_ROWS = int(os.getenv("RELIABILITY_MODEL_MIN_ROWS", "50"))
+
+MODEL_FILE_PREFIX = "reliability-"
+MODEL_CLASSES = ("Low", "Medium", "High")
+MODEL_FEATURES = (
+    "on_time_percentage",
+    "quality_score",
+    "reliability_score",
+    "total_orders",
+    "defect_rate",
+    "years_active",
+    "contract_compliance",
+)
+# Stored results that are real model judgments, worth learning from
+TRAINING_SOURCES = ("llm", "cache", "history")
+
+def feature_matrix(df: pd.DataFrame):
+    """Numeric model features of df as a float64 matrix; absent or bad values are NaN"""
+    columns = [
+        pd.to_numeric(df[name], errors="coerce").to_numpy(dtype=np.float64) if name in df.columns
+        else np.full(len(df), np.nan)
+        for name in MODEL_FEATURES
+    ]
+    return np.column_stack(columns) if columns else np.empty((len(df), 0))
+
+def _softmax(logits):
+    logits = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+def _with_bias(x):
+    return np.hstack([x, np.ones((len(x), 1))])
+
+class ReliabilityModel:
+    """
+    Standardization parameters plus softmax tier weights and ridge score weights
+    (None when no training row had a predicted_score; the rule-based composite
+    score stands in). predict() works on whole frames; predictions() returns
+    result dicts shaped like the LLM path's, tagged source "model".
+    """
+
+    def __init__(self, fill, mean, scale, class_weights, score_weights, classes=MODEL_CLASSES,
+                 version=None, metadata=None):
+        self.fill = np.asarray(fill, dtype=np.float64)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.class_weights = np.asarray(class_weights, dtype=np.float64)
+        score_weights = None if score_weights is None else np.asarray(score_weights, dtype=np.float64)
+        self.score_weights = score_weights if score_weights is not None and score_weights.size else None
+        self.classes = tuple(classes)
+        self.version = version
+        self.metadata = metadata or {}
+
+    def _design(self, features):
+        # Missing values take the training median, then everything is standardized
+        features = np.where(np.isnan(features), self.fill, features)
+        return _with_bias((features - self.mean) / self.scale)
+
+    def predict(self, df: pd.DataFrame):
+        """Tier, class probabilities, confidence and predicted_score arrays for every row"""
+        design = self._design(feature_matrix(df))
+        probabilities = _softmax(design @ self.class_weights)
+        best = probabilities.argmax(axis=1)
+        if self.score_weights is not None:
+            predicted_score = design @ self.score_weights
+        else:
+            from .supplier import score_suppliers_vectorized
+            predicted_score = score_suppliers_vectorized(df)["composite_score"]
+        return {
+            "reliability": np.asarray(self.classes)[best],
+            "confidence": probabilities[np.arange(len(best)), best],
+            "predicted_score": np.clip(predicted_score, 0.0, 1.0),
+            "probabilities": probabilities,
+        }
+
+    def predictions(self, df: pd.DataFrame):
+        """Result dicts for every row of df, in order"""
+        from .supplier import score_suppliers_vectorized, labels_by_mask, RISK_FACTOR_LABELS, IMPROVEMENT_LABELS
+
+        predicted = self.predict(df)
+        rules = score_suppliers_vectorized(df)
+        risk_factors = labels_by_mask(rules["risk_mask"], RISK_FACTOR_LABELS, ["Minimal risk factors identified"])
+        improvements = labels_by_mask(rules["improvement_mask"], IMPROVEMENT_LABELS, ["Maintain current performance levels"])
+        on_time = rules["on_time_percentage"]
+        reliability = predicted["reliability"]
+        trend = np.where(
+            reliability == "High", "stable",
+            np.where(reliability == "Medium", np.where(on_time > 80, "improving", "stable"), "declining")
+        )
+        supplier_ids = df['supplier_id'].tolist() if 'supplier_id' in df.columns else ['Unknown'] * len(df)
+        supplier_names = df['supplier_name'].tolist() if 'supplier_name' in df.columns else ['Unknown'] * len(df)
+
+        results = []
+        for supplier_id, supplier_name, tier, confidence, score, future_trend, on_time_pct, quality_score, defect_rate, risks, steps in zip(
+            supplier_ids, supplier_names,
+            reliability.tolist(),
+            predicted["confidence"].tolist(),
+            predicted["predicted_score"].tolist(),
+            trend.tolist(),
+            on_time.tolist(),
+            rules["quality_score"].tolist(),
+            rules["defect_rate"].tolist(),
+            risk_factors,
+            improvements,
+        ):
+            results.append({
+                "supplier_id": supplier_id,
+                "supplier_name": supplier_name,
+                "reliability": tier,
+                "confidence": round(confidence, 4),
+                "predicted_score": round(score, 4),
+                "reasoning": f"Local model estimate from {on_time_pct}% on-time delivery, {quality_score}/10 quality score and {defect_rate}% defect rate: {tier.lower()} reliability.",
+                "risk_factors": list(risks),
+                "improvements": list(steps),
+                "future_trend": future_trend,
+                "source": "model",
+                "model_version": self.version,
+            })
+        return results
+
+    def save(self, directory=RELIABILITY_MODEL_DIR):
+        """Write <prefix><version>.npz and .json; files appear atomically. Returns the .npz path."""
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, f"{MODEL_FILE_PREFIX}{self.version}")
+        with open(base + ".npz.tmp", "wb") as f:
+            np.savez(f, fill=self.fill, mean=self.mean, scale=self.scale,
+                     class_weights=self.class_weights,
+                     score_weights=self.score_weights if self.score_weights is not None else np.empty(0))
+        with open(base + ".json.tmp", "w") as f:
+            json.dump(dict(self.metadata, version=self.version, classes=list(self.classes),
+                           features=list(MODEL_FEATURES)), f, indent=2)
+        os.replace(base + ".json.tmp", base + ".json")
+        os.replace(base + ".npz.tmp", base + ".npz")
+        return base + ".npz"
+
+def model_versions(directory=RELIABILITY_MODEL_DIR):
+    """Versions saved in directory, oldest first"""
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        name[len(MODEL_FILE_PREFIX):-len(".npz")] for name in os.listdir(directory)
+        if name.startswith(MODEL_FILE_PREFIX) and name.endswith(".npz")
+    )
+
+def load_reliability_model(version=None, directory=RELIABILITY_MODEL_DIR):
+    """Load a saved model (the newest when version is empty); None when there is none"""
+    if not version:
+        versions = model_versions(directory)
+        if not versions:
+            return None
+        version = versions[-1]
+    base = os.path.join(directory, f"{MODEL_FILE_PREFIX}{version}")
+    with open(base + ".json") as f:
+        metadata = json.load(f)
+    if list(metadata.get("features", [])) != list(MODEL_FEATURES):
+        raise ValueError(f"Reliability model {version} was trained on different features")
+    with np.load(base + ".npz") as arrays:
+        return ReliabilityModel(
+            arrays["fill"], arrays["mean"], arrays["scale"], arrays["class_weights"], arrays["score_weights"],
+            classes=metadata["classes"], version=version, metadata=metadata
+        )
+
+def _fit_softmax(design, labels, class_count, l2=1e-3, learning_rate=0.5, iterations=500):
+    """Multinomial logistic regression by full-batch gradient descent"""
+    weights = np.zeros((design.shape[1], class_count))
+    targets = np.eye(class_count)[labels]
+    for _ in range(iterations):
+        gradient = design.T @ (_softmax(design @ weights) - targets) / len(design)
+        gradient[:-1] += l2 * weights[:-1]
+        weights -= learning_rate * gradient
+    return weights
+
+def _fit_ridge(design, targets, l2=1e-2):
+    """Closed-form ridge regression; the bias column is not penalized. None without targets."""
+    if not len(targets):
+        # The unpenalized bias would leave the normal matrix singular
+        return None
+    penalty = l2 * np.eye(design.shape[1])
+    penalty[-1, -1] = 0.0
+    return np.linalg.solve(design.T @ design + penalty, design.T @ targets)
+
+def fit_reliability_model(features, tiers, scores, holdout=0.2, seed=7):
+    """
+    Fit a model on raw feature rows, tier labels and predicted scores. A random
+    holdout share is kept out of training to report accuracy and score error.
+    """
+    classes = list(MODEL_CLASSES)
+    labels = np.array([classes.index(tier) for tier in tiers])
+    scores = np.asarray(scores, dtype=np.float64)
+    order = np.random.default_rng(seed).permutation(len(features))
+    test_count = int(len(features) * holdout) if len(features) >= 20 else 0
+    test, train = order[:test_count], order[test_count:]
+
+    fill = np.nanmedian(features[train], axis=0)
+    fill = np.where(np.isnan(fill), 0.0, fill)
+    filled = np.where(np.isnan(features), fill, features)
+    mean = filled[train].mean(axis=0)
+    scale = filled[train].std(axis=0)
+    scale = np.where(scale > 0, scale, 1.0)
+    design = _with_bias((filled - mean) / scale)
+
+    class_weights = _fit_softmax(design[train], labels[train], len(classes))
+    scored = ~np.isnan(scores)
+    score_weights = _fit_ridge(design[train][scored[train]], scores[train][scored[train]])
+
+    metadata = {
+        "trained_at": datetime.utcnow().isoformat(),
+        "score_model": "ridge" if score_weights is not None else "rules",
+        "training_rows": int(len(train)),
+        "holdout_rows": int(len(test)),
+        "class_counts": {tier: int((labels == i).sum()) for i, tier in enumerate(classes)},
+    }
+    if len(test):
+        metadata["holdout_accuracy"] = round(float(
+            (_softmax(design[test] @ class_weights).argmax(axis=1) == labels[test]).mean()
+        ), 4)
+        test_scored = test[scored[test]]
+        if len(test_scored) and score_weights is not None:
+            metadata["holdout_score_mae"] = round(float(
+                np.abs(np.clip(design[test_scored] @ score_weights, 0, 1) - scores[test_scored]).mean()
+            ), 4)
+    version = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    return ReliabilityModel(fill, mean, scale, class_weights, score_weights, classes, version, metadata)
+
+def training_frame(db=None):
+    """
+    One row per distinct supplier input with the latest model judgment for it:
+    the MODEL_FEATURES columns plus reliability and predicted_score
+    """
+    from ..database import SessionLocal, PredictionHistory
+
+    own_session = db is None
+    db = db or SessionLocal()
+    table = PredictionHistory.__table__
+    inputs, tiers, scores, fingerprints = [], [], [], []
+    try:
+        rows = db.execute(
+            select(table.c.input_data, table.c.result_data, table.c.input_fingerprint)
+            .where(table.c.prediction_type.in_(("batch", "single")))
+            .order_by(table.c.id)
+            .execution_options(yield_per=5000)
+        )
+        for input_data, result_data, fingerprint in rows:
+            try:
+                row = json.loads(input_data) if input_data else None
+                result = json.loads(result_data) if result_data else None
+            except json.JSONDecodeError:
+                continue
+            if not isinstance(row, dict) or not isinstance(result, dict):
+                continue
+            if result.get("source") not in TRAINING_SOURCES or "error" in result:
+                continue
+            if result.get("reliability") not in MODEL_CLASSES:
+                continue
+            try:
+                score = float(result.get("predicted_score"))
+            except (TypeError, ValueError):
+                score = np.nan
+            inputs.append(row)
+            tiers.append(result["reliability"])
+            scores.append(score)
+            fingerprints.append(fingerprint)
+    finally:
+        if own_session:
+            db.close()
+
+    frame = pd.DataFrame(inputs, columns=list(MODEL_FEATURES))
+    frame["reliability"] = tiers
+    frame["predicted_score"] = scores
+    frame["input_fingerprint"] = fingerprints
+    # The same input judged several times counts once, with its latest answer
+    latest = frame[frame["input_fingerprint"].notna()].drop_duplicates("input_fingerprint", keep="last")
+    return pd.concat([latest, frame[frame["input_fingerprint"].isna()]]).drop(columns="input_fingerprint")
+
+def train_reliability_model(db=None, directory=RELIABILITY_MODEL_DIR, min_rows=RELIABILITY_MODEL_MIN_ROWS):
+    """Train on the stored history, save a new version and return the model"""
+    frame = training_frame(db)
+    if len(frame) < min_rows:
+        raise ValueError(f"Need at least {min_rows} stored model predictions to train, found {len(frame)}")
+    if frame["reliability"].nunique() < 2:
+        raise ValueError("Stored predictions cover a single reliability tier; nothing to learn")
+    model = fit_reliability_model(feature_matrix(frame), frame["reliability"].tolist(), frame["predicted_score"].to_numpy())
+    path = model.save(directory)
+    print(f"✅ Trained reliability model {model.version} on {len(frame)} suppliers -> {path}")
+    return model
+
+_reliability_model = None
+_reliability_model_loaded = False
+_reliability_model_lock = threading.Lock()
+
+def get_reliability_model():
+    """Return the worker's ReliabilityModel, loaded from disk once; None when none is trained"""
+    global _reliability_model, _reliability_model_loaded
+    if not _reliability_model_loaded:
+        with _reliability_model_lock:
+            if not _reliability_model_loaded:
+                try:
+                    _reliability_model = load_reliability_model(RELIABILITY_MODEL_VERSION)
+                    if _reliability_model:
+                        print(f"✅ Loaded reliability model {_reliability_model.version}")
+                except Exception as e:
+                    print(f"❌ Could not load reliability model: {e}")
+                _reliability_model_loaded = True
+    return _reliability_model
+
+def main():
+    parser = argparse.ArgumentParser(description="Train or inspect the local supplier reliability model")
+    parser.add_argument("command", choices=["train", "list"])
+    parser.add_argument("--directory", default=RELIABILITY_MODEL_DIR)
+    parser.add_argument("--min-rows", type=int, default=RELIABILITY_MODEL_MIN_ROWS)
+    args = parser.parse_args()
+
+    if args.command == "train":
+        model = train_reliability_model(directory=args.directory, min_rows=args.min_rows)
+        print(json.dumps(model.metadata, indent=2))
+    else:
+        for version in model_versions(args.directory):
+            print(version)
+
+if __name__ == "__main__":
+    main()
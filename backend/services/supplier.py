@@ -1,22 +1,48 @@
 import os
+import asyncio
+import numpy as np
 import pandas as pd
 from datetime import datetime
-from ..services.azure_ai_service import AzureAIService
+from ..services.azure_ai_service import get_ai_service
+from ..services.llm_engine import LLMExecutionEngine
+from ..services.prediction_cache import get_prediction_cache, supplier_fingerprint, SUPPLIER_FEATURE_FIELDS
+from ..services.circuit_breaker import CircuitOpenError
 from dotenv import load_dotenv
 import json
 
 load_dotenv()
 
-def predict_reliability(df: pd.DataFrame):
+# Bump whenever either reliability prompt changes so cached results are not reused
+RELIABILITY_PROMPT_VERSION = "reliability-v1"
+
+# Packed mode: several suppliers per completion, sized to fit a token budget
+PACK_MAX_SUPPLIERS = int(os.getenv("PREDICTION_PACK_MAX_SUPPLIERS", "25"))
+PACK_PROMPT_TOKEN_BUDGET = int(os.getenv("PREDICTION_PACK_PROMPT_TOKENS", "6000"))
+PACK_COMPLETION_TOKEN_BUDGET = int(os.getenv("PREDICTION_PACK_COMPLETION_TOKENS", "6000"))
+PACK_TOKENS_PER_RESULT = 220
+
+# Composite-score cut-offs between Low/Medium and Medium/High
+RELIABILITY_TIER_THRESHOLDS = (0.6, 0.8)
+# Tiered mode: rows scoring within this distance of a threshold go to the LLM, the rest are settled by rules
+TIERED_AMBIGUITY_BAND = float(os.getenv("TIERED_AMBIGUITY_BAND", "0.05"))
+
+# Columns the prediction path reads; columnar uploads decode only these
+SUPPLIER_INPUT_COLUMNS = tuple(field for field, _ in SUPPLIER_FEATURE_FIELDS) + (
+    "category", "past_delivery_rate", "risk_level",
+)
+
+def supplier_records(df: pd.DataFrame):
     """
-    Predict supplier reliability using Azure OpenAI
+    Rows of df as plain dicts of native Python values, built column-wise in one pass.
+    Every per-row helper here takes such a record (anything with .get works).
     """
-    ai_service = AzureAIService()
-    results = []
-    
-    for _, row in df.iterrows():
-        # Create a comprehensive prompt for reliability prediction
-        prompt = f"""
+    return df.to_dict('records')
+
+def build_reliability_prompt(row):
+    """
+    Build the reliability prompt for one supplier row
+    """
+    return f"""
         Analyze this supplier's reliability based on historical performance data:
         
         Supplier Details:
@@ -43,31 +69,315 @@ def predict_reliability(df: pd.DataFrame):
         - improvements: suggested improvements
         - future_trend: "improving", "stable", or "declining"
         """
+
+def _finalize_prediction(row, ai_response, ai_service):
+    """
+    Parse the model output for a row, falling back to basic analysis on bad JSON.
+    Returns the prediction and whether it is a real model answer worth caching.
+    """
+    try:
+        prediction_data = json.loads(ai_response)
+        prediction_data['source'] = "llm" if ai_service.use_real_ai else "simulation"
+    except json.JSONDecodeError:
+        # Fallback to basic analysis if JSON parsing fails
+        prediction_data = analyze_supplier_basic(row)
+        prediction_data['source'] = "fallback"
+        prediction_data['fallback_reason'] = "unparseable model response"
+    
+    # Add supplier ID to the result
+    prediction_data['supplier_id'] = row.get('supplier_id', 'Unknown')
+    prediction_data['supplier_name'] = row.get('supplier_name', 'Unknown')
+    from_model = prediction_data['source'] == "llm" and "error" not in prediction_data
+    return prediction_data, from_model
+
+def _fallback_prediction(row, error):
+    """
+    Rule-based result for a row the model could not score, tagged as a fallback
+    """
+    if isinstance(error, CircuitOpenError):
+        # Expected while Azure OpenAI is degraded; not worth a log line per row
+        reason = "circuit_open"
+    else:
+        print(f"Error predicting reliability for supplier {row.get('supplier_id')}: {str(error)}")
+        reason = str(error)
+    fallback_result = analyze_supplier_basic(row)
+    fallback_result['supplier_id'] = row.get('supplier_id', 'Unknown')
+    fallback_result['supplier_name'] = row.get('supplier_name', 'Unknown')
+    fallback_result['source'] = "fallback"
+    fallback_result['fallback_reason'] = reason
+    return fallback_result
+
+def rule_based_predictions(df, source="rules"):
+    """
+    analyze_supplier_basic results for a whole frame, computed column-wise and
+    tagged with the supplier and the given source
+    """
+    results = analyze_suppliers_basic(df)
+    supplier_ids = df['supplier_id'].tolist() if 'supplier_id' in df.columns else ['Unknown'] * len(df)
+    supplier_names = df['supplier_name'].tolist() if 'supplier_name' in df.columns else ['Unknown'] * len(df)
+    for result, supplier_id, supplier_name in zip(results, supplier_ids, supplier_names):
+        result['supplier_id'] = supplier_id
+        result['supplier_name'] = supplier_name
+        result['source'] = source
+    return results
+
+def _fallback_predictions(df, reason):
+    """
+    Vectorized _fallback_prediction for a frame of rows sharing one failure reason
+    """
+    fallback_results = rule_based_predictions(df, source="fallback")
+    for fallback_result in fallback_results:
+        fallback_result['fallback_reason'] = reason
+    return fallback_results
+
+def ambiguous_suppliers(df: pd.DataFrame, band=None):
+    """
+    Mask of rows the rules cannot settle: composite score within band of a tier
+    threshold, or not computable. Only these need the LLM in tiered mode.
+    """
+    band = TIERED_AMBIGUITY_BAND if band is None else band
+    composite_score = score_suppliers_vectorized(df)["composite_score"]
+    ambiguous = np.isnan(composite_score)
+    for threshold in RELIABILITY_TIER_THRESHOLDS:
+        ambiguous |= np.abs(composite_score - threshold) <= band
+    return ambiguous
+
+def _cached_prediction(row, ai_service):
+    """
+    Look a row up in the prediction cache. Returns (cache_key, cached_result_or_None).
+    """
+    cache = get_prediction_cache()
+    if cache is None:
+        return None, None
+    key = supplier_fingerprint(row, RELIABILITY_PROMPT_VERSION, ai_service.deployment)
+    cached = cache.get(key)
+    if cached is not None:
+        cached['source'] = "cache"
+    return key, cached
+
+async def _acached_prediction(row, ai_service):
+    """
+    _cached_prediction for the event loop: the in-memory tier answers in place, a
+    miss there goes to the SQLite tier in a worker thread
+    """
+    cache = get_prediction_cache()
+    if cache is None:
+        return None, None
+    key = supplier_fingerprint(row, RELIABILITY_PROMPT_VERSION, ai_service.deployment)
+    cached = cache.peek(key)
+    if cached is None:
+        cached = await asyncio.to_thread(cache.get, key)
+    if cached is not None:
+        cached['source'] = "cache"
+    return key, cached
+
+def _store_prediction(key, prediction_data, from_model):
+    # Only real model answers are worth keeping; simulations and fallbacks are cheap to redo
+    if key is None or not from_model:
+        return
+    get_prediction_cache().set(key, prediction_data)
+
+def _store_predictions(items):
+    for key, prediction_data, from_model in items:
+        _store_prediction(key, prediction_data, from_model)
+
+async def predict_supplier_async(row):
+    """
+    Predict reliability for a single supplier record without blocking the event loop
+    """
+    ai_service = get_ai_service()
+    cache_key, cached = await _acached_prediction(row, ai_service)
+    if cached is not None:
+        return cached
+    
+    prompt = build_reliability_prompt(row)
+    
+    try:
+        ai_response = await ai_service._acall_azure_openai(prompt, max_tokens=800)
+        prediction_data, from_model = _finalize_prediction(row, ai_response, ai_service)
+        await asyncio.to_thread(_store_prediction, cache_key, prediction_data, from_model)
+        return prediction_data
+    except Exception as e:
+        return _fallback_prediction(row, e)
+
+def degraded_predictions(df: pd.DataFrame):
+    """
+    Predictions for every row of df while the model is unreachable (circuit open):
+    cache hits, and a column-wise rule-based score for the rest, in row order.
+    None when the model is available.
+    """
+    ai_service = get_ai_service()
+    if not ai_service.is_degraded:
+        return None
+    results = [_cached_prediction(row, ai_service)[1] for row in supplier_records(df)]
+    missing = [i for i, result in enumerate(results) if result is None]
+    for i, fallback_result in zip(missing, _fallback_predictions(df.iloc[missing], "circuit_open")):
+        results[i] = fallback_result
+    return results
+
+def _pack_record(row):
+    """Compact, JSON-safe view of the prompt fields of one row"""
+    record = {}
+    for field, default in SUPPLIER_FEATURE_FIELDS:
+        value = row.get(field, default)
+        if hasattr(value, "item"):
+            value = value.item()
+        if isinstance(value, float) and value != value:
+            value = None
+        record[field] = value
+    record["supplier_id"] = str(record["supplier_id"])
+    return record
+
+def build_packed_reliability_prompt(records):
+    """
+    Build one prompt scoring several suppliers, answered as a JSON array keyed by supplier_id
+    """
+    supplier_lines = "\n".join(json.dumps(record, separators=(",", ":")) for record in records)
+    return f"""
+        Analyze the reliability of each supplier below based on historical performance data.
+        Percentages are 0-100, quality_score is out of 10, reliability_score is 0.0 to 1.0.
+        
+        SUPPLIER_BATCH (one JSON object per line):
+{supplier_lines}
         
+        Respond with only a JSON array containing exactly one object per supplier, each with:
+        - supplier_id: copied exactly from the input
+        - reliability: "High", "Medium", or "Low"
+        - confidence: 0.0 to 1.0
+        - predicted_score: 0.0 to 1.0
+        - reasoning: brief explanation
+        - risk_factors: list of potential risks
+        - improvements: suggested improvements
+        - future_trend: "improving", "stable", or "declining"
+        """
+
+def _estimate_tokens(text):
+    # Roughly four characters per token for English and JSON
+    return len(text) // 4 + 1
+
+def packed_batch_size(records):
+    """
+    Suppliers per completion so that both the prompt and the expected answer fit the budget
+    """
+    if not records:
+        return 1
+    sample = records[:50]
+    per_record = sum(_estimate_tokens(json.dumps(r, separators=(",", ":"))) for r in sample) / len(sample)
+    by_prompt = int(PACK_PROMPT_TOKEN_BUDGET // max(per_record, 1))
+    by_completion = PACK_COMPLETION_TOKEN_BUDGET // PACK_TOKENS_PER_RESULT
+    return max(1, min(PACK_MAX_SUPPLIERS, by_prompt, by_completion))
+
+def _split_packs(indexed_records, pack_size):
+    """
+    Group records into packs of at most pack_size with unique supplier_ids, so every
+    answer in an array maps back to exactly one row
+    """
+    # The n-th occurrence of a supplier_id goes to the n-th round of packs
+    rounds = []
+    occurrences = {}
+    for item in indexed_records:
+        supplier_id = item[1]["supplier_id"]
+        n = occurrences.get(supplier_id, 0)
+        occurrences[supplier_id] = n + 1
+        if n == len(rounds):
+            rounds.append([])
+        rounds[n].append(item)
+    
+    packs = []
+    for items in rounds:
+        for start in range(0, len(items), pack_size):
+            packs.append(items[start:start + pack_size])
+    return packs
+
+def _parse_packed_response(ai_response, expected_ids):
+    """
+    Validate a packed answer; returns {supplier_id: prediction} for well-formed entries only
+    """
+    try:
+        data = json.loads(ai_response)
+    except (TypeError, json.JSONDecodeError):
+        return {}
+    if isinstance(data, dict):
+        data = data.get("predictions", data.get("suppliers", []))
+    if not isinstance(data, list):
+        return {}
+    
+    parsed = {}
+    for item in data:
+        if not isinstance(item, dict):
+            continue
+        supplier_id = str(item.get("supplier_id"))
+        if supplier_id not in expected_ids or supplier_id in parsed:
+            continue
+        if item.get("reliability") not in ("High", "Medium", "Low"):
+            continue
         try:
-            # Use the AI service to get prediction
-            ai_response = ai_service._call_azure_openai(prompt, max_tokens=800)
-            
-            # Try to parse JSON response
-            try:
-                prediction_data = json.loads(ai_response)
-            except json.JSONDecodeError:
-                # Fallback to basic analysis if JSON parsing fails
-                prediction_data = analyze_supplier_basic(row)
-            
-            # Add supplier ID to the result
+            item["confidence"] = float(item.get("confidence"))
+        except (TypeError, ValueError):
+            continue
+        parsed[supplier_id] = item
+    return parsed
+
+async def predict_reliability_packed_async(df: pd.DataFrame, max_concurrency=None):
+    """
+    Score suppliers K at a time in a single completion. Rows whose answer is missing
+    or malformed are retried on their own through predict_supplier_async.
+    """
+    ai_service = get_ai_service()
+    rows = supplier_records(df)
+    results = [None] * len(rows)
+    cache_keys = [None] * len(rows)
+    
+    pending = []
+    # The SQLite tier is read off the event loop
+    lookups = await asyncio.to_thread(lambda: [_cached_prediction(row, ai_service) for row in rows])
+    for i, (key, cached) in enumerate(lookups):
+        cache_keys[i] = key
+        if cached is not None:
+            results[i] = cached
+        else:
+            pending.append((i, _pack_record(rows[i])))
+    
+    if ai_service.is_degraded:
+        # Circuit open: skip the model entirely and score the rest column-wise
+        indices = [i for i, _ in pending]
+        for i, fallback_result in zip(indices, _fallback_predictions(df.iloc[indices], "circuit_open")):
+            results[i] = fallback_result
+        return results
+    
+    packs = _split_packs(pending, packed_batch_size([record for _, record in pending]))
+    
+    async def score_pack(pack):
+        prompt = build_packed_reliability_prompt([record for _, record in pack])
+        max_tokens = min(PACK_COMPLETION_TOKEN_BUDGET, PACK_TOKENS_PER_RESULT * len(pack) + 200)
+        ai_response = await ai_service._acall_azure_openai(prompt, max_tokens=max_tokens)
+        return _parse_packed_response(ai_response, {record["supplier_id"] for _, record in pack})
+    
+    engine = LLMExecutionEngine(max_concurrency)
+    outcomes = await engine.map(score_pack, packs)
+    
+    retry = []
+    answered = []
+    for pack, outcome in zip(packs, outcomes):
+        answers = outcome if isinstance(outcome, dict) else {}
+        for i, record in pack:
+            prediction_data = answers.get(record["supplier_id"])
+            if prediction_data is None:
+                retry.append(i)
+                continue
+            row = rows[i]
             prediction_data['supplier_id'] = row.get('supplier_id', 'Unknown')
             prediction_data['supplier_name'] = row.get('supplier_name', 'Unknown')
-            
-            results.append(prediction_data)
-            
-        except Exception as e:
-            # Fallback analysis in case of API failure
-            print(f"Error predicting reliability for supplier {row.get('supplier_id')}: {str(e)}")
-            fallback_result = analyze_supplier_basic(row)
-            fallback_result['supplier_id'] = row.get('supplier_id', 'Unknown')
-            fallback_result['supplier_name'] = row.get('supplier_name', 'Unknown')
-            results.append(fallback_result)
+            prediction_data['source'] = "llm" if ai_service.use_real_ai else "simulation"
+            answered.append((cache_keys[i], prediction_data, prediction_data['source'] == "llm"))
+            results[i] = prediction_data
+    await asyncio.to_thread(_store_predictions, answered)
+    
+    if retry:
+        print(f"Packed prediction: retrying {len(retry)} of {len(pending)} suppliers individually")
+        retried = await engine.map(predict_supplier_async, [rows[i] for i in retry])
+        for i, outcome in zip(retry, retried):
+            results[i] = outcome
     
     return results
 
@@ -134,3 +444,115 @@ def analyze_supplier_basic(row):
         "improvements": improvements,
         "future_trend": trend
     }
+
+RISK_FACTOR_LABELS = (
+    "Poor on-time delivery performance",
+    "Below average quality scores",
+    "High defect rate",
+    "Low historical reliability",
+)
+IMPROVEMENT_LABELS = (
+    "Improve delivery scheduling and logistics",
+    "Enhance quality control processes",
+    "Implement defect reduction programs",
+)
+
+def _numeric_column(df, name):
+    if name in df.columns:
+        return df[name].to_numpy(dtype=np.float64)
+    return np.zeros(len(df), dtype=np.float64)
+
+def score_suppliers_vectorized(df: pd.DataFrame):
+    """
+    Column-wise version of the analyze_supplier_basic arithmetic for a whole frame.
+    Returns NumPy arrays: composite scores, tier/confidence/trend per row and boolean
+    risk-factor and improvement masks (one column per label).
+    """
+    on_time_pct = _numeric_column(df, 'on_time_percentage')
+    quality_score = _numeric_column(df, 'quality_score')
+    reliability_score = _numeric_column(df, 'reliability_score')
+    defect_rate = _numeric_column(df, 'defect_rate')
+    
+    # Same operation order as the scalar version so results match bit for bit;
+    # np.where mirrors max(0, x), which also yields 0 for NaN
+    defect_headroom = 100 - defect_rate
+    defect_headroom = np.where(defect_headroom > 0, defect_headroom, 0.0)
+    composite_score = (
+        (on_time_pct / 100) * 0.3 +
+        (quality_score / 10) * 0.25 +
+        reliability_score * 0.25 +
+        (defect_headroom / 100) * 0.2
+    )
+    
+    high = composite_score >= 0.8
+    medium = ~high & (composite_score >= 0.6)
+    reliability = np.where(high, "High", np.where(medium, "Medium", "Low"))
+    confidence = np.where(high, 0.85, np.where(medium, 0.75, 0.80))
+    trend = np.where(
+        high, "stable",
+        np.where(medium, np.where(on_time_pct > 80, "improving", "stable"), "declining")
+    )
+    
+    risk_mask = np.column_stack((
+        on_time_pct < 80,
+        quality_score < 7,
+        defect_rate > 5,
+        reliability_score < 0.7,
+    ))
+    improvement_mask = np.column_stack((
+        on_time_pct < 90,
+        quality_score < 8,
+        defect_rate > 2,
+    ))
+    
+    return {
+        "on_time_percentage": on_time_pct,
+        "quality_score": quality_score,
+        "defect_rate": defect_rate,
+        "composite_score": composite_score,
+        "reliability": reliability,
+        "confidence": confidence,
+        "future_trend": trend,
+        "risk_mask": risk_mask,
+        "improvement_mask": improvement_mask,
+    }
+
+def labels_by_mask(mask, labels, default):
+    """Map each distinct boolean row pattern to its label list once"""
+    codes = mask.astype(np.uint8) @ (1 << np.arange(mask.shape[1], dtype=np.uint8))
+    lookup = {}
+    for code in np.unique(codes).tolist():
+        chosen = [label for bit, label in enumerate(labels) if code & (1 << bit)]
+        lookup[code] = chosen if chosen else default
+    return [lookup[code] for code in codes.tolist()]
+
+def analyze_suppliers_basic(df: pd.DataFrame):
+    """
+    Batch analyze_supplier_basic: same dicts, same order, computed column-wise
+    """
+    scores = score_suppliers_vectorized(df)
+    risk_factors = labels_by_mask(scores["risk_mask"], RISK_FACTOR_LABELS, ["Minimal risk factors identified"])
+    improvements = labels_by_mask(scores["improvement_mask"], IMPROVEMENT_LABELS, ["Maintain current performance levels"])
+    
+    results = []
+    for on_time_pct, quality_score, defect_rate, composite_score, reliability, confidence, trend, risks, steps in zip(
+        scores["on_time_percentage"].tolist(),
+        scores["quality_score"].tolist(),
+        scores["defect_rate"].tolist(),
+        scores["composite_score"].tolist(),
+        scores["reliability"].tolist(),
+        scores["confidence"].tolist(),
+        scores["future_trend"].tolist(),
+        risk_factors,
+        improvements,
+    ):
+        results.append({
+            "reliability": reliability,
+            "confidence": confidence,
+            "predicted_score": composite_score,
+            "reasoning": f"Based on {on_time_pct}% on-time delivery, {quality_score}/10 quality score, and {defect_rate}% defect rate, supplier shows {reliability.lower()} reliability.",
+            "risk_factors": list(risks),
+            "improvements": list(steps),
+            "future_trend": trend
+        })
+    return results
@@ -0,0 +1,177 @@
+import os
+import shutil
+import tempfile
+import pandas as pd
+
+CSV = "csv"
+PARQUET = "parquet"
+ARROW = "arrow"
+
+FORMAT_EXTENSIONS = {
+    ".csv": CSV,
+    ".parquet": PARQUET,
+    ".pq": PARQUET,
+    ".arrow": ARROW,
+    ".feather": ARROW,
+    ".ipc": ARROW,
+}
+FORMAT_MEDIA_TYPES = {
+    CSV: "text/csv",
+    PARQUET: "application/vnd.apache.parquet",
+    ARROW: "application/vnd.apache.arrow.file",
+}
+CONTENT_TYPE_FORMATS = {
+    "application/vnd.apache.parquet": PARQUET,
+    "application/x-parquet": PARQUET,
+    "application/vnd.apache.arrow.file": ARROW,
+    "application/vnd.apache.arrow.stream": ARROW,
+}
+
+def json_value(value):
+    """A table cell as a JSON-safe native value: NumPy scalars unwrapped, NaN as None"""
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+def _pyarrow():
+    """Import pyarrow on first use; CSV-only deployments do not need it"""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+        import pyarrow.ipc
+    except ImportError:
+        raise ValueError("Parquet/Arrow support requires pyarrow (pip install pyarrow)")
+    return pyarrow
+
+def upload_format(filename=None, content_type=None):
+    """Table format of an upload from its file extension, then its content type; CSV by default"""
+    extension = os.path.splitext(filename or "")[1].lower()
+    if extension in FORMAT_EXTENSIONS:
+        return FORMAT_EXTENSIONS[extension]
+    return CONTENT_TYPE_FORMATS.get((content_type or "").split(";")[0].strip().lower(), CSV)
+
+def spool_to_disk(fileobj, suffix, directory=None):
+    """Copy an upload to a named file so it can be memory-mapped; caller removes it"""
+    handle, path = tempfile.mkstemp(suffix=suffix, dir=directory)
+    with os.fdopen(handle, "wb") as out:
+        shutil.copyfileobj(fileobj, out, 1 << 20)
+    return path
+
+def _projection(schema_names, columns):
+    if columns is None:
+        return None
+    return [name for name in schema_names if name in set(columns)]
+
+def _arrow_table(path, columns=None):
+    """Memory-mapped Arrow IPC file (or stream) restricted to the wanted columns"""
+    pa = _pyarrow()
+    source = pa.memory_map(path, "r")
+    try:
+        table = pa.ipc.open_file(source).read_all()
+    except pa.ArrowInvalid:
+        source.seek(0)
+        table = pa.ipc.open_stream(source).read_all()
+    projected = _projection(table.schema.names, columns)
+    return table.select(projected) if projected is not None else table
+
+def read_table_file(path, fmt, columns=None):
+    """
+    Read a whole CSV, Parquet or Arrow file. For columnar formats only the
+    requested columns that exist are decoded, straight from a memory map.
+    """
+    if fmt == PARQUET:
+        pa = _pyarrow()
+        parquet_file = pa.parquet.ParquetFile(path, memory_map=True)
+        projected = _projection(parquet_file.schema_arrow.names, columns)
+        return parquet_file.read(columns=projected).to_pandas()
+    if fmt == ARROW:
+        return _arrow_table(path, columns).to_pandas()
+    return pd.read_csv(path)
+
+def iter_table_file(path, fmt, chunk_size, columns=None):
+    """Yield a file as DataFrames of at most chunk_size rows"""
+    if fmt == PARQUET:
+        pa = _pyarrow()
+        parquet_file = pa.parquet.ParquetFile(path, memory_map=True)
+        projected = _projection(parquet_file.schema_arrow.names, columns)
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=projected):
+            yield batch.to_pandas()
+    elif fmt == ARROW:
+        # Slicing a memory-mapped table is zero-copy until a chunk is converted
+        for batch in _arrow_table(path, columns).to_batches(max_chunksize=chunk_size):
+            yield batch.to_pandas()
+    else:
+        for chunk in pd.read_csv(path, chunksize=chunk_size):
+            yield chunk
+
+def count_table_rows(path, fmt):
+    """Rows in a file without decoding it: footer metadata for Parquet/Arrow, newlines for CSV"""
+    if fmt == PARQUET:
+        return _pyarrow().parquet.ParquetFile(path).metadata.num_rows
+    if fmt == ARROW:
+        return _arrow_table(path).num_rows
+    lines = 0
+    last = b"\n"
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            lines += block.count(b"\n")
+            last = block[-1:]
+    if last != b"\n":
+        lines += 1
+    return max(0, lines - 1)
+
+def read_upload(fileobj, fmt, columns=None):
+    """Read an uploaded file object; columnar formats are spooled to disk and memory-mapped"""
+    if fmt == CSV:
+        return pd.read_csv(fileobj)
+    path = spool_to_disk(fileobj, f".{fmt}")
+    try:
+        return read_table_file(path, fmt, columns)
+    finally:
+        os.remove(path)
+
+def iter_upload(fileobj, fmt, chunk_size, columns=None):
+    """Chunked read_upload: yield DataFrames of at most chunk_size rows"""
+    if fmt == CSV:
+        yield from pd.read_csv(fileobj, chunksize=chunk_size)
+        return
+    path = spool_to_disk(fileobj, f".{fmt}")
+    try:
+        yield from iter_table_file(path, fmt, chunk_size, columns)
+    finally:
+        os.remove(path)
+
+class TableWriter:
+    """
+    Incrementally write DataFrames to a file as CSV, Parquet or an Arrow IPC
+    file, so large exports never hold every row in memory at once.
+    """
+
+    def __init__(self, fileobj, fmt):
+        self.fileobj = fileobj
+        self.fmt = fmt
+        self._writer = None
+        self._schema = None
+        self._wrote_header = False
+
+    def write(self, df: pd.DataFrame):
+        if self.fmt == CSV:
+            df.to_csv(self.fileobj, index=False, header=not self._wrote_header)
+            self._wrote_header = True
+            return
+        pa = _pyarrow()
+        table = pa.Table.from_pandas(df, schema=self._schema, preserve_index=False)
+        if self._writer is None:
+            # Later chunks are converted to the first chunk's schema
+            self._schema = table.schema
+            if self.fmt == PARQUET:
+                self._writer = pa.parquet.ParquetWriter(self.fileobj, self._schema)
+            else:
+                self._writer = pa.ipc.new_file(self.fileobj, self._schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
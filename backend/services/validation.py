@@ -0,0 +1,129 @@
+import os
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv()
+
+VALIDATION_MAX_REPORTED_ROWS = int(os.getenv("VALIDATION_MAX_REPORTED_ROWS", "100"))
+
+# Columns that, when present, must have a value in every row
+SUPPLIER_REQUIRED_COLUMNS = ("supplier_id",)
+
+# Numeric supplier columns and their allowed range; missing columns fall back to prompt defaults
+SUPPLIER_NUMERIC_RANGES = {
+    "on_time_percentage": (0, 100),
+    "quality_score": (0, 10),
+    "reliability_score": (0, 1),
+    "defect_rate": (0, 100),
+    "contract_compliance": (0, 100),
+    "past_delivery_rate": (0, 1),
+    "total_orders": (0, None),
+    "years_active": (0, None),
+}
+
+# Columns the reliability prompt reads; absent ones are reported so callers know defaults were used
+SUPPLIER_EXPECTED_COLUMNS = (
+    "supplier_id", "supplier_name", "on_time_percentage", "quality_score",
+    "reliability_score", "defect_rate", "region",
+)
+
+def _range_text(low, high):
+    if high is None:
+        return f">= {low}"
+    return f"{low}-{high}"
+
+def validate_suppliers(df: pd.DataFrame, row_offset=0):
+    """
+    Coerce and check a supplier frame column by column before any model work.
+    Numeric columns are converted (bad values become NaN). Returns
+    (coerced_df, valid_mask, row_errors, report): row_errors maps each rejected
+    position to its messages, and report lists missing columns, error counts
+    per column and the errors of the first rejected rows.
+    """
+    df = df.copy()
+    row_count = len(df)
+    valid = np.ones(row_count, dtype=bool)
+    checks = []  # (column, mask of failing rows, message)
+
+    for name in SUPPLIER_REQUIRED_COLUMNS:
+        if name in df.columns:
+            values = df[name]
+            blank = values.isna().to_numpy() | (values.astype(str).str.strip() == "").to_numpy()
+            checks.append((name, blank, "missing value"))
+
+    for name, (low, high) in SUPPLIER_NUMERIC_RANGES.items():
+        if name not in df.columns:
+            continue
+        raw = df[name]
+        numbers = pd.to_numeric(raw, errors="coerce")
+        not_numeric = (numbers.isna() & raw.notna()).to_numpy()
+        # A blank cell is treated like a missing value, not a bad one
+        if raw.dtype == object:
+            not_numeric &= (raw.astype(str).str.strip() != "").to_numpy()
+        values = numbers.to_numpy(dtype=np.float64)
+        out_of_range = values < low
+        if high is not None:
+            out_of_range |= values > high
+        checks.append((name, not_numeric, "not a number"))
+        checks.append((name, out_of_range, f"out of range ({_range_text(low, high)})"))
+        df[name] = numbers
+
+    error_counts = {}
+    for name, failing, _ in checks:
+        count = int(failing.sum())
+        if count:
+            error_counts[name] = error_counts.get(name, 0) + count
+            valid &= ~failing
+
+    rejected = np.flatnonzero(~valid)
+    row_errors = {index: [] for index in rejected.tolist()}
+    for name, failing, message in checks:
+        for index in np.flatnonzero(failing).tolist():
+            row_errors[index].append(f"{name}: {message}")
+
+    supplier_ids = df["supplier_id"] if "supplier_id" in df.columns else None
+    report = {
+        "rows": row_count,
+        "valid_rows": int(valid.sum()),
+        "rejected_rows": int(len(rejected)),
+        "missing_columns": [name for name in SUPPLIER_EXPECTED_COLUMNS if name not in df.columns],
+        "error_counts": error_counts,
+        "errors": [
+            {
+                "row_index": row_offset + index,
+                "supplier_id": None if supplier_ids is None or pd.isna(supplier_ids.iat[index]) else str(supplier_ids.iat[index]),
+                "errors": errors,
+            }
+            for index, errors in list(row_errors.items())[:VALIDATION_MAX_REPORTED_ROWS]
+        ],
+    }
+    return df, valid, row_errors, report
+
+def rejected_result(row, errors):
+    """Result entry for a row refused by validation, in the shape of a failed prediction"""
+    def text(name):
+        value = row.get(name, "Unknown")
+        return None if pd.isna(value) else value
+
+    return {
+        "supplier_id": text("supplier_id"),
+        "supplier_name": text("supplier_name"),
+        "error": "Invalid input: " + "; ".join(errors),
+        "reliability": "unknown",
+        "source": "rejected",
+        "validation_errors": errors,
+    }
+
+def merge_validation_reports(total, report):
+    """Fold one chunk's report into a running total (errors list stays capped)"""
+    if total is None:
+        return dict(report, error_counts=dict(report["error_counts"]), errors=list(report["errors"]))
+    total["rows"] += report["rows"]
+    total["valid_rows"] += report["valid_rows"]
+    total["rejected_rows"] += report["rejected_rows"]
+    for name, count in report["error_counts"].items():
+        total["error_counts"][name] = total["error_counts"].get(name, 0) + count
+    room = VALIDATION_MAX_REPORTED_ROWS - len(total["errors"])
+    total["errors"].extend(report["errors"][:max(room, 0)])
+    return total
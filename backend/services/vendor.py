@@ -1,104 +1,312 @@
 import os
+import numpy as np
 import pandas as pd
-from openai import AzureOpenAI
 from dotenv import load_dotenv
 import json
+from .azure_ai_service import get_ai_service
+from .tabular_io import json_value
 
 load_dotenv()
 
-def get_azure_client():
-    return AzureOpenAI(
-        api_key=os.getenv("AZURE_OPENAI_KEY"),
-        api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2024-12-01-preview"),
-        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT")
-    )
+# Columns the recommendation path reads; columnar uploads decode only these
+VENDOR_INPUT_COLUMNS = (
+    "supplier_id", "supplier_name", "category", "region", "average_lead_time",
+    "quality_rating", "price_competitiveness", "communication_score",
+)
+VENDOR_REQUIRED_COLUMNS = ("supplier_id", "category")
+
+# Shortest-lead-time candidates scored per vendor, and alternatives kept per vendor
+RECOMMENDATION_CANDIDATES = int(os.getenv("VENDOR_RECOMMENDATION_CANDIDATES", "5"))
+RECOMMENDATION_ALTERNATIVES = 2
+# Replaced vendors listed per recommendation (the count is always complete)
+RECOMMENDATION_MAX_LISTED = 20
+# Candidates shortlisted into each LLM recommendation prompt, however large the catalog
+VENDOR_PROMPT_CANDIDATES = int(os.getenv("VENDOR_PROMPT_CANDIDATES", "8"))
+
+# Catalog columns written into prompts (with their short labels), and the longest text kept per value
+PROMPT_COLUMNS = (
+    ("supplier_id", "id"), ("category", "category"), ("region", "region"),
+    ("average_lead_time", "lead_days"), ("quality_rating", "quality"),
+    ("price_competitiveness", "price"), ("communication_score", "communication"),
+)
+PROMPT_MAX_TEXT = 32
+
+# Weights of the rule-based recommendation score; ratings are on a 0-5 scale
+RECOMMENDATION_WEIGHTS = {
+    "lead_time": 0.5,
+    "quality_rating": 0.2,
+    "price_competitiveness": 0.15,
+    "communication_score": 0.15,
+}
+RATING_SCALE = 5.0
+
+class VendorIndex:
+    """
+    A vendor catalog grouped by category and by (category, region), each group
+    holding its members' positions sorted by lead time (missing lead times last).
+    Finding a vendor's alternatives is a dict lookup plus a short slice instead of
+    a scan of the catalog.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        df = df.reset_index(drop=True)
+        if 'region' not in df.columns:
+            df = df.assign(region='Unknown')
+        self.df = df
+        self._vendors = None
+        self.categories = df['category'].to_numpy(dtype=object)
+        self.regions = df['region'].to_numpy(dtype=object)
+        self.supplier_ids = df['supplier_id'].astype(str).to_numpy()
+        self.lead_times = (
+            pd.to_numeric(df['average_lead_time'], errors='coerce').to_numpy(dtype=np.float64)
+            if 'average_lead_time' in df.columns else np.full(len(df), np.nan)
+        )
+        order = np.argsort(np.where(np.isnan(self.lead_times), np.inf, self.lead_times), kind='stable')
+        ordered = df.iloc[order]
+        # Groups of the lead-time-ordered frame list positions in lead-time order
+        self.by_category = {
+            key: order[positions] for key, positions in ordered.groupby('category', sort=False).indices.items()
+        }
+        self.by_category_region = {
+            key: order[positions] for key, positions in ordered.groupby(['category', 'region'], sort=False).indices.items()
+        }
+        self._id_counts = pd.Series(self.supplier_ids).value_counts().to_dict()
+
+    def __len__(self):
+        return len(self.df)
+
+    @property
+    def vendors(self):
+        """Catalog rows as dicts, built on first use"""
+        if self._vendors is None:
+            self._vendors = self.df.to_dict('records')
+        return self._vendors
+
+    def vendor(self, position):
+        """One catalog row as a dict of native values"""
+        if self._vendors is not None:
+            return self._vendors[position]
+        return self.df.iloc[position].to_dict()
+
+    def group(self, category, region=None):
+        """Positions of a category (or category and region), shortest lead time first"""
+        if region is None:
+            return self.by_category.get(category, np.empty(0, dtype=np.int64))
+        return self.by_category_region.get((category, region), np.empty(0, dtype=np.int64))
+
+    def candidates(self, position, limit=None):
+        """
+        Alternatives for the vendor at position, shortest lead time first: other
+        vendors in its category and region, or in its category when there are none.
+        With a limit only the first entries of the group are examined.
+        """
+        category, region = self.categories[position], self.regions[position]
+        supplier_id = self.supplier_ids[position]
+        for members in (self.group(category, region), self.group(category)):
+            if limit is not None:
+                # Enough entries to still have `limit` after dropping the vendor's own rows
+                members = members[:limit + self._id_counts.get(supplier_id, 0)]
+            others = members[self.supplier_ids[members] != supplier_id]
+            if len(others):
+                return others if limit is None else others[:limit]
+        return np.empty(0, dtype=np.int64)
+
+def _rating(index, name, positions):
+    if name not in index.df.columns:
+        return np.full(len(positions), 0.5)
+    values = pd.to_numeric(index.df[name], errors='coerce').to_numpy(dtype=np.float64)[positions]
+    return np.clip(np.nan_to_num(values / RATING_SCALE, nan=0.5), 0.0, 1.0)
+
+def recommendation_scores(index: VendorIndex, current, candidates):
+    """
+    Rule-based score (0-1) of each candidate as a replacement for the paired
+    current vendor, for whole arrays of pairs at once: lead-time gain plus ratings
+    """
+    current = np.asarray(current, dtype=np.int64)
+    candidates = np.asarray(candidates, dtype=np.int64)
+    current_lead = index.lead_times[current]
+    candidate_lead = index.lead_times[candidates]
+    # Equal lead time scores 0.5; half the lead time 0.75; unknown lead times are neutral
+    gain = np.clip((current_lead - candidate_lead) / np.where(current_lead > 0, current_lead, np.nan), -1.0, 1.0)
+    score = RECOMMENDATION_WEIGHTS["lead_time"] * np.nan_to_num(0.5 + 0.5 * gain, nan=0.5)
+    for name in ("quality_rating", "price_competitiveness", "communication_score"):
+        score += RECOMMENDATION_WEIGHTS[name] * _rating(index, name, candidates)
+    return np.clip(score, 0.0, 1.0)
+
+def rank_alternate_vendors(df: pd.DataFrame, index: VendorIndex = None):
+    """
+    Recommended vendors for a catalog: every vendor's best alternatives (among its
+    RECOMMENDATION_CANDIDATES shortest-lead-time candidates), merged into one list
+    of recommended vendors with the best score they earned, highest first
+    """
+    index = index or VendorIndex(df)
+    current, candidates = [], []
+    for position in range(len(index)):
+        found = index.candidates(position, RECOMMENDATION_CANDIDATES)
+        current.extend([position] * len(found))
+        candidates.extend(found.tolist())
+    if not candidates:
+        return []
+    scores = recommendation_scores(index, current, candidates)
+
+    pairs = pd.DataFrame({"current": current, "candidate": candidates, "score": scores})
+    # Each vendor keeps its top alternatives; each alternative keeps its best score
+    pairs = pairs.sort_values(["current", "score"], ascending=[True, False], kind='stable')
+    pairs = pairs[pairs.groupby("current").cumcount() < RECOMMENDATION_ALTERNATIVES]
+    best = pairs.sort_values("score", ascending=False, kind='stable').drop_duplicates("candidate")
+    replaces = pairs.groupby("candidate")["current"].agg(list).to_dict()
+
+    recommendations = []
+    for candidate, score in zip(best["candidate"].tolist(), best["score"].tolist()):
+        vendor = index.vendor(candidate)
+        replaced = replaces[candidate]
+        lead_time = json_value(vendor.get('average_lead_time'))
+        recommendations.append({
+            "supplier_id": json_value(vendor.get('supplier_id')),
+            "supplier_name": json_value(vendor.get('supplier_name')),
+            "category": json_value(vendor.get('category')),
+            "region": json_value(vendor.get('region')),
+            "average_lead_time": lead_time,
+            "recommendation_score": round(score, 3),
+            "alternative_for": [str(index.supplier_ids[position]) for position in replaced[:RECOMMENDATION_MAX_LISTED]],
+            "alternative_for_count": len(replaced),
+            "reasoning": (
+                f"Recommended alternative for {len(replaced)} vendor(s) in {vendor.get('category')}"
+                + (f" with a {lead_time}-day lead time." if lead_time is not None else ".")
+            ),
+        })
+    return recommendations
+
+def shortlist_candidates(index: VendorIndex, position, limit=None, candidates=None):
+    """
+    The top `limit` alternatives for the vendor at position by rule-based score
+    (ties in lead-time order), as (positions, scores). The whole candidate group is
+    scored in one vectorized pass, so the shortlist is deterministic and its size
+    fixed however large the group is.
+    """
+    limit = limit or VENDOR_PROMPT_CANDIDATES
+    candidates = index.candidates(position) if candidates is None else np.asarray(candidates, dtype=np.int64)
+    if not len(candidates):
+        return candidates, np.empty(0)
+    scores = recommendation_scores(index, np.full(len(candidates), position), candidates)
+    order = np.argsort(-scores, kind='stable')[:limit]
+    return candidates[order], scores[order]
+
+def _prompt_value(value):
+    value = json_value(value)
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return f"{value:g}"
+    return str(value).replace(",", " ").replace("\n", " ")[:PROMPT_MAX_TEXT]
+
+def compact_vendor_table(index: VendorIndex, positions, scores=None):
+    """
+    Vendors for a prompt as a header line plus one comma-separated line each,
+    with only PROMPT_COLUMNS and the rule-based score
+    """
+    names = [(name, label) for name, label in PROMPT_COLUMNS if name in index.df.columns]
+    header = [label for _, label in names]
+    columns = [index.df[name].to_numpy()[positions].tolist() for name, _ in names]
+    if scores is not None:
+        header.append("score")
+        columns.append(np.round(scores, 3).tolist())
+    lines = [",".join(header)]
+    for values in zip(*columns):
+        lines.append(",".join(_prompt_value(value) for value in values))
+    return "\n".join(lines)
+
+def shortlist_for_vendor(current_vendor, vendors: pd.DataFrame, limit=None):
+    """
+    Shortlisted alternatives to current_vendor (a dict or row, which need not be in
+    vendors): its category/region group, or every other vendor when the group is
+    empty, cut to the top `limit`. Returns (compact table, shortlisted supplier_ids).
+    """
+    current = dict(current_vendor)
+    frame = pd.concat([vendors, pd.DataFrame([current])], ignore_index=True)
+    index = VendorIndex(frame)
+    position = len(frame) - 1
+    candidates = index.candidates(position)
+    if not len(candidates):
+        candidates = np.flatnonzero(index.supplier_ids != str(current.get('supplier_id')))
+    positions, scores = shortlist_candidates(index, position, limit, candidates)
+    return compact_vendor_table(index, positions, scores), index.supplier_ids[positions].tolist()
 
 def recommend_alternate_vendors(df: pd.DataFrame):
-    client = get_azure_client()
+    ai_service = get_ai_service()
     recommendations = []
-    
-    # Group by category and region for better recommendations
-    for _, row in df.iterrows():
-        # Find similar vendors in same category/region
-        candidates = df[
-            (df['category'] == row['category']) & 
-            (df['region'] == row['region']) & 
-            (df['supplier_id'] != row['supplier_id'])
-        ].copy()
-        
-        if candidates.empty:
-            # Try same category, different region
-            candidates = df[
-                (df['category'] == row['category']) & 
-                (df['supplier_id'] != row['supplier_id'])
-            ].copy()
-        
-        if not candidates.empty:
-            # Create prompt for AI recommendation
-            vendor_data = candidates.to_dict('records')
+
+    # Candidates come from an index built once: per-group positions in lead-time order
+    index = VendorIndex(df)
+
+    for position, row in enumerate(index.vendors):
+        # Shortlist the best-scoring vendors of the same category/region (else category)
+        candidates, scores = shortlist_candidates(index, position)
+        shortlisted = index.supplier_ids[candidates].tolist()
+
+        if shortlisted:
+            # Create prompt for AI recommendation; its size is fixed by the shortlist
             prompt = f"""
             Current vendor: {row['supplier_id']} in {row['category']} category, {row['region']} region
-            Lead time: {row['average_lead_time']} days
-            
-            Alternative vendors:
-            {json.dumps(vendor_data, indent=2)}
-            
+            Lead time: {row.get('average_lead_time')} days
+
+            Alternative vendors (best {len(shortlisted)} by lead time and 0-5 ratings; score is a 0-1 estimate):
+            {compact_vendor_table(index, candidates, scores)}
+
             Recommend the top 2 alternative vendors considering:
             1. Shorter lead times
             2. Same or compatible category
             3. Regional preferences
             4. Overall reliability
-            
+
             Return JSON: {{"recommendations": [
                 {{"supplier_id": "SUP001", "score": 0.95, "reason": "Best lead time"}},
                 {{"supplier_id": "SUP002", "score": 0.85, "reason": "Same region"}}
             ]}}
             """
-            
+
             try:
-                response = client.chat.completions.create(
-                    model=os.getenv("AZURE_OPENAI_DEPLOYMENT"),
-                    messages=[{"role": "user", "content": prompt}],
-                    max_completion_tokens=300,
-                    temperature=0.2
-                )
-                
-                ai_response = response.choices[0].message.content.strip()
+                ai_response = ai_service._call_azure_openai(prompt, max_tokens=300).strip()
                 try:
                     ai_recommendations = json.loads(ai_response)
-                    recommended_vendors = ai_recommendations.get("recommendations", [])
+                    # Only shortlisted vendors can be recommended
+                    recommended_vendors = [
+                        vendor for vendor in ai_recommendations.get("recommendations", [])
+                        if str(vendor.get("supplier_id")) in shortlisted
+                    ]
+                    if not recommended_vendors:
+                        raise ValueError("no shortlisted vendor recommended")
                 except:
-                    # Fallback: sort by lead time
-                    candidates_sorted = candidates.sort_values('average_lead_time')
+                    # Fallback: the best rule-based score, the first shortlisted candidate
                     recommended_vendors = [
                         {
-                            "supplier_id": candidates_sorted.iloc[0]['supplier_id'],
-                            "score": 0.8,
-                            "reason": "Shortest lead time"
+                            "supplier_id": shortlisted[0],
+                            "score": round(float(scores[0]), 3),
+                            "reason": "Best lead time and ratings"
                         }
                     ]
-                
+
                 recommendations.append({
                     "original_supplier": row['supplier_id'],
                     "category": row['category'],
                     "region": row['region'],
-                    "current_lead_time": row['average_lead_time'],
+                    "current_lead_time": row.get('average_lead_time'),
                     "alternatives": recommended_vendors
                 })
-                
+
             except Exception as e:
                 # Simple fallback recommendation
-                best_candidate = candidates.sort_values('average_lead_time').iloc[0]
+                best_candidate = index.vendor(int(candidates[0]))
                 recommendations.append({
                     "original_supplier": row['supplier_id'],
                     "category": row['category'],
                     "region": row['region'],
-                    "current_lead_time": row['average_lead_time'],
+                    "current_lead_time": row.get('average_lead_time'),
                     "alternatives": [{
                         "supplier_id": best_candidate['supplier_id'],
                         "score": 0.7,
-                        "reason": f"Better lead time ({best_candidate['average_lead_time']} days)"
+                        "reason": f"Better lead time ({best_candidate.get('average_lead_time')} days)"
                     }]
                 })
-    
+
     return recommendations
@@ -0,0 +1,164 @@
+"""
+End-to-end throughput benchmark of the prediction paths against the mock server.
+
+    python -m loadtest.mock_openai_server --port 8090 &
+    python -m loadtest.benchmark --endpoint http://127.0.0.1:8090 --rows 500
+
+Points the Azure OpenAI settings at the given endpoint before importing the
+services, then times supplier predictions (per-row and packed), order
+flagging and vendor recommendation on synthetic data.
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import statistics
+
+def synthetic_suppliers(rows, seed=7):
+    import pandas as pd
+    rng = random.Random(seed)
+    regions = ["Asia", "Europe", "North America", "South America"]
+    return pd.DataFrame([{
+        "supplier_id": f"SUP{i:06d}",
+        "supplier_name": f"Supplier {i}",
+        "on_time_percentage": round(rng.uniform(60, 100), 1),
+        "quality_score": round(rng.uniform(4, 10), 1),
+        "reliability_score": round(rng.uniform(0.4, 1.0), 2),
+        "total_orders": rng.randint(0, 2000),
+        "defect_rate": round(rng.uniform(0, 12), 2),
+        "region": rng.choice(regions),
+        "years_active": rng.randint(0, 30),
+        "contract_compliance": round(rng.uniform(60, 100), 1),
+    } for i in range(rows)])
+
+def synthetic_orders(rows, seed=7):
+    import pandas as pd
+    from datetime import date, timedelta
+    rng = random.Random(seed)
+    today = date.today()
+    return pd.DataFrame([{
+        "order_id": f"ORD{i:06d}",
+        "supplier_id": f"SUP{rng.randint(0, 999):06d}",
+        "expected_delivery_date": (today + timedelta(days=rng.randint(-5, 60))).isoformat(),
+        "historical_risk_flags": rng.randint(0, 4),
+    } for i in range(rows)])
+
+def synthetic_vendors(rows, seed=7):
+    import pandas as pd
+    rng = random.Random(seed)
+    categories = ["Electronics", "Manufacturing", "Automotive", "Chemicals", "Textiles"]
+    regions = ["Asia", "Europe", "North America"]
+    return pd.DataFrame([{
+        "supplier_id": f"SUP{i:06d}",
+        "supplier_name": f"Vendor {i}",
+        "category": rng.choice(categories),
+        "region": rng.choice(regions),
+        "average_lead_time": rng.randint(3, 45),
+        "quality_rating": round(rng.uniform(3, 5), 1),
+        "price_competitiveness": round(rng.uniform(3, 5), 1),
+        "communication_score": round(rng.uniform(3, 5), 1),
+    } for i in range(rows)])
+
+def report(name, rows, elapsed, latencies=None):
+    line = f"{name:<32} {rows:>7} rows  {elapsed:8.2f} s  {rows / elapsed if elapsed else 0:9.1f} rows/s"
+    if latencies:
+        latencies = sorted(latencies)
+        p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+        line += f"  p50 {statistics.median(latencies) * 1000:7.1f} ms  p95 {p95 * 1000:7.1f} ms"
+    print(line)
+
+async def bench_supplier_rows(df, concurrency):
+    from backend.services.supplier import predict_supplier_async, supplier_records
+    from backend.services.llm_engine import LLMExecutionEngine
+
+    async def timed(row):
+        start = time.perf_counter()
+        await predict_supplier_async(row)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    latencies = await LLMExecutionEngine(concurrency).map(timed, supplier_records(df))
+    report("supplier (per row)", len(df), time.perf_counter() - start,
+           [latency for latency in latencies if isinstance(latency, float)])
+
+async def bench_supplier_packed(df, concurrency):
+    from backend.services.supplier import predict_reliability_packed_async
+    start = time.perf_counter()
+    await predict_reliability_packed_async(df, concurrency)
+    report("supplier (packed)", len(df), time.perf_counter() - start)
+
+def bench_orders(df):
+    from backend.services.order import flag_high_risk_orders
+    start = time.perf_counter()
+    flag_high_risk_orders(df)
+    report("order flagging", len(df), time.perf_counter() - start)
+
+def bench_vendors(df):
+    from backend.services.vendor import recommend_alternate_vendors
+    start = time.perf_counter()
+    recommend_alternate_vendors(df)
+    report("vendor recommendation", len(df), time.perf_counter() - start)
+
+def mock_stats(endpoint, reset=False):
+    import httpx
+    try:
+        if reset:
+            return httpx.post(f"{endpoint}/stats/reset", timeout=5).json()
+        return httpx.get(f"{endpoint}/stats", timeout=5).json()
+    except Exception as e:
+        return {"error": str(e)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark prediction paths against a mock OpenAI server")
+    parser.add_argument("--endpoint", default="http://127.0.0.1:8090")
+    parser.add_argument("--rows", type=int, default=200)
+    parser.add_argument("--order-rows", type=int, default=None)
+    parser.add_argument("--vendor-rows", type=int, default=None)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--only", choices=["supplier", "packed", "orders", "vendors"], action="append")
+    parser.add_argument("--rpm", type=float, help="override AZURE_OPENAI_RPM for the client-side limiter")
+    parser.add_argument("--tpm", type=float, help="override AZURE_OPENAI_TPM for the client-side limiter")
+    parser.add_argument("--use-cache", action="store_true", help="keep the prediction cache enabled")
+    args = parser.parse_args()
+
+    # Configure the services before they are imported
+    os.environ["AZURE_OPENAI_ENDPOINT"] = args.endpoint
+    os.environ["AZURE_OPENAI_API_KEY"] = os.environ["AZURE_OPENAI_KEY"] = "mock-key"
+    os.environ.setdefault("AZURE_OPENAI_DEPLOYMENT_NAME", "mock-deployment")
+    os.environ.setdefault("AZURE_OPENAI_DEPLOYMENT", os.environ["AZURE_OPENAI_DEPLOYMENT_NAME"])
+    if args.rpm:
+        os.environ["AZURE_OPENAI_RPM"] = str(args.rpm)
+    if args.tpm:
+        os.environ["AZURE_OPENAI_TPM"] = str(args.tpm)
+    if not args.use_cache:
+        os.environ["PREDICTION_CACHE_ENABLED"] = "false"
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    from backend.services.azure_ai_service import get_ai_service
+    if not get_ai_service().probe_health()["status"] == "healthy":
+        print(f"Mock server at {args.endpoint} is not answering; start it with python -m loadtest.mock_openai_server")
+        sys.exit(1)
+
+    mock_stats(args.endpoint, reset=True)
+    selected = set(args.only or ["supplier", "packed", "orders", "vendors"])
+    suppliers = synthetic_suppliers(args.rows)
+
+    async def supplier_benches():
+        if "supplier" in selected:
+            await bench_supplier_rows(suppliers, args.concurrency)
+        if "packed" in selected:
+            await bench_supplier_packed(suppliers, args.concurrency)
+
+    asyncio.run(supplier_benches())
+    if "orders" in selected:
+        bench_orders(synthetic_orders(args.order_rows or args.rows))
+    if "vendors" in selected:
+        bench_vendors(synthetic_vendors(args.vendor_rows or args.rows))
+
+    print(f"mock server: {mock_stats(args.endpoint)}")
+    print(f"rate limiter: {get_ai_service().health_status()['rate_limiter']}")
+
+if __name__ == "__main__":
+    main()
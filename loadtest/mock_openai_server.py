@@ -0,0 +1,257 @@
+"""
+Local stand-in for an Azure OpenAI chat-completions deployment.
+
+Answers are shaped like the prompts in backend/services (supplier reliability,
+packed reliability, order risk and vendor recommendations), and latency,
+error rates, 429s and token accounting are configurable, so the prediction
+paths can be load tested end to end without a real deployment.
+
+    python -m loadtest.mock_openai_server --port 8090 --latency-ms 800 --rate-limit-rate 0.02
+"""
+import os
+import re
+import math
+import json
+import time
+import random
+import asyncio
+import argparse
+from collections import deque
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+class MockConfig:
+    def __init__(self):
+        self.latency_ms = float(os.getenv("MOCK_LATENCY_MS", "500"))
+        self.latency_jitter_ms = float(os.getenv("MOCK_LATENCY_JITTER_MS", "200"))
+        self.latency_distribution = os.getenv("MOCK_LATENCY_DISTRIBUTION", "lognormal")  # fixed, normal, lognormal
+        self.ms_per_output_token = float(os.getenv("MOCK_MS_PER_OUTPUT_TOKEN", "0"))
+        self.error_rate = float(os.getenv("MOCK_ERROR_RATE", "0"))
+        self.rate_limit_rate = float(os.getenv("MOCK_RATE_LIMIT_RATE", "0"))
+        self.rpm = float(os.getenv("MOCK_RPM", "0"))  # 0 disables quota enforcement
+        self.tpm = float(os.getenv("MOCK_TPM", "0"))
+        self.retry_after = float(os.getenv("MOCK_RETRY_AFTER", "2"))
+        self.seed = os.getenv("MOCK_SEED")
+
+config = MockConfig()
+app = FastAPI(title="Mock Azure OpenAI")
+_random = random.Random(config.seed)
+_window = deque()  # (timestamp, tokens) of accepted requests in the last minute
+_stats = {"requests": 0, "ok": 0, "errors": 0, "rate_limited": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+def _count_tokens(text):
+    return len(text) // 4 + 1
+
+def _sample_latency():
+    if config.latency_distribution == "fixed":
+        latency = config.latency_ms
+    elif config.latency_distribution == "normal":
+        latency = _random.gauss(config.latency_ms, config.latency_jitter_ms)
+    else:
+        # Log-normal with the configured mean and spread gives the long tail real deployments show
+        mean = max(config.latency_ms, 1.0)
+        sigma = min(2.0, config.latency_jitter_ms / mean) if config.latency_jitter_ms else 0.0
+        latency = _random.lognormvariate(0, sigma) * mean / math.exp(sigma * sigma / 2)
+    return max(0.0, latency) / 1000
+
+def _number(prompt, label, default=0.0):
+    match = re.search(re.escape(label) + r"\s*([-\d.]+)", prompt)
+    try:
+        return float(match.group(1)) if match else default
+    except ValueError:
+        return default
+
+def _tier(score):
+    if score >= 0.8:
+        return "High", "stable"
+    if score >= 0.6:
+        return "Medium", "improving"
+    return "Low", "declining"
+
+def _reliability(on_time, quality, reliability, defect_rate):
+    score = (on_time / 100) * 0.3 + (quality / 10) * 0.25 + reliability * 0.25 + (max(0, 100 - defect_rate) / 100) * 0.2
+    score = max(0.0, min(1.0, score + _random.uniform(-0.03, 0.03)))
+    tier, trend = _tier(score)
+    risks = []
+    if on_time < 80:
+        risks.append("Poor on-time delivery performance")
+    if quality < 7:
+        risks.append("Below average quality scores")
+    if defect_rate > 5:
+        risks.append("High defect rate")
+    return {
+        "reliability": tier,
+        "confidence": round(_random.uniform(0.7, 0.95), 2),
+        "predicted_score": round(score, 3),
+        "reasoning": f"Mock assessment: {on_time}% on-time, {quality}/10 quality, {defect_rate}% defects.",
+        "risk_factors": risks or ["Minimal risk factors identified"],
+        "improvements": ["Improve delivery scheduling and logistics"] if on_time < 90 else ["Maintain current performance levels"],
+        "future_trend": trend,
+    }
+
+def _respond_to(prompt):
+    """Build an answer in the shape the calling prompt asks for"""
+    if "SUPPLIER_BATCH" in prompt:
+        answers = []
+        for line in prompt.splitlines():
+            line = line.strip()
+            if not line.startswith("{"):
+                continue
+            try:
+                supplier = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            answer = _reliability(
+                float(supplier.get("on_time_percentage") or 0),
+                float(supplier.get("quality_score") or 0),
+                float(supplier.get("reliability_score") or 0),
+                float(supplier.get("defect_rate") or 0),
+            )
+            answer["supplier_id"] = supplier.get("supplier_id")
+            answers.append(answer)
+        return json.dumps(answers)
+
+    if "reliability" in prompt.lower() and "On-Time Percentage:" in prompt:
+        return json.dumps(_reliability(
+            _number(prompt, "On-Time Percentage:"),
+            _number(prompt, "Quality Score:"),
+            _number(prompt, "Reliability Score:"),
+            _number(prompt, "Defect Rate:"),
+        ))
+
+    if "Historical Risk Flags:" in prompt:
+        flags = _number(prompt, "Historical Risk Flags:")
+        days = _number(prompt, "Days Until Delivery:", 30)
+        score = min(1.0, 0.2 + 0.2 * flags + (0.3 if days < 3 else 0.0))
+        return json.dumps({
+            "high_risk": score >= 0.6,
+            "risk_score": round(score, 2),
+            "risk_factors": [factor for factor, hit in (
+                ("Historical issues", flags > 1),
+                ("Tight timeline", days < 3),
+            ) if hit],
+        })
+
+    if "recommend" in prompt.lower():
+        candidates = _table_ids(prompt)
+        return json.dumps({"recommendations": [
+            {"supplier_id": supplier_id, "score": round(0.95 - 0.1 * rank, 2), "reason": "Mock ranking"}
+            for rank, supplier_id in enumerate(candidates[:2])
+        ]})
+
+    return "ok"
+
+def _table_ids(prompt):
+    # The compact vendor table from vendor.compact_vendor_table: a header line
+    # starting with "id", then one comma-separated line per vendor
+    lines = [line.strip() for line in prompt.splitlines()]
+    for start, line in enumerate(lines):
+        header = line.split(",")
+        if header[0] == "id" and len(header) > 1:
+            ids = []
+            for row in lines[start + 1:]:
+                if not row:
+                    break
+                ids.append(row.split(",")[0])
+            return ids
+    return []
+
+def _over_quota(now, tokens):
+    while _window and now - _window[0][0] > 60:
+        _window.popleft()
+    if config.rpm and len(_window) + 1 > config.rpm:
+        return True
+    if config.tpm and sum(t for _, t in _window) + tokens > config.tpm:
+        return True
+    return False
+
+def _rate_limited():
+    _stats["rate_limited"] += 1
+    return JSONResponse(
+        status_code=429,
+        headers={"retry-after": str(int(config.retry_after)), "retry-after-ms": str(int(config.retry_after * 1000))},
+        content={"error": {"code": "429", "message": "Requests to the deployment have exceeded the rate limit."}},
+    )
+
+async def _chat_completion(request: Request, deployment: str):
+    _stats["requests"] += 1
+    body = await request.json()
+    prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+    prompt_tokens = _count_tokens(prompt)
+    max_tokens = body.get("max_completion_tokens") or body.get("max_tokens") or 800
+
+    now = time.time()
+    if _over_quota(now, prompt_tokens + max_tokens) or _random.random() < config.rate_limit_rate:
+        return _rate_limited()
+    _window.append((now, prompt_tokens + max_tokens))
+
+    content = _respond_to(prompt)
+    completion_tokens = min(_count_tokens(content), max_tokens)
+    await asyncio.sleep(_sample_latency() + completion_tokens * config.ms_per_output_token / 1000)
+
+    if _random.random() < config.error_rate:
+        _stats["errors"] += 1
+        return JSONResponse(status_code=500, content={"error": {"code": "500", "message": "Mock internal server error"}})
+
+    _stats["ok"] += 1
+    _stats["prompt_tokens"] += prompt_tokens
+    _stats["completion_tokens"] += completion_tokens
+    return {
+        "id": f"chatcmpl-mock-{_stats['requests']}",
+        "object": "chat.completion",
+        "created": int(now),
+        "model": deployment,
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": content},
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+@app.post("/openai/deployments/{deployment}/chat/completions")
+async def azure_chat_completion(deployment: str, request: Request):
+    return await _chat_completion(request, deployment)
+
+@app.post("/v1/chat/completions")
+async def openai_chat_completion(request: Request):
+    return await _chat_completion(request, "mock")
+
+@app.get("/stats")
+async def stats():
+    return _stats
+
+@app.post("/stats/reset")
+async def reset_stats():
+    for key in _stats:
+        _stats[key] = 0
+    return _stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Azure OpenAI chat-completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, default=config.latency_ms)
+    parser.add_argument("--latency-jitter-ms", type=float, default=config.latency_jitter_ms)
+    parser.add_argument("--latency-distribution", choices=["fixed", "normal", "lognormal"], default=config.latency_distribution)
+    parser.add_argument("--ms-per-output-token", type=float, default=config.ms_per_output_token)
+    parser.add_argument("--error-rate", type=float, default=config.error_rate)
+    parser.add_argument("--rate-limit-rate", type=float, default=config.rate_limit_rate)
+    parser.add_argument("--rpm", type=float, default=config.rpm)
+    parser.add_argument("--tpm", type=float, default=config.tpm)
+    parser.add_argument("--retry-after", type=float, default=config.retry_after)
+    args = parser.parse_args()
+
+    for key, value in vars(args).items():
+        if hasattr(config, key):
+            setattr(config, key, value)
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -82,9 +82,11 @@ class SupplierPredictorTracer:
                              successful_predictions: int,
                              failed_predictions: int,
                              total_execution_time: float,
-                             user_id: int) -> Dict[str, Any]:
+                             user_id: int,
+                             dedup_ratio: Optional[float] = None) -> Dict[str, Any]:
         """
-        Trace batch predictions for analytics
+        Trace batch predictions for analytics; dedup_ratio is the share of rows
+        answered from an identical row in the same batch
         """
         if not self.client:
             return {}
@@ -100,7 +102,8 @@ class SupplierPredictorTracer:
                     "successful_predictions": successful_predictions,
                     "failed_predictions": failed_predictions,
                     "success_rate": (successful_predictions / suppliers_count) * 100 if suppliers_count > 0 else 0,
-                    "avg_prediction_time": total_execution_time / suppliers_count if suppliers_count > 0 else 0
+                    "avg_prediction_time": total_execution_time / suppliers_count if suppliers_count > 0 else 0,
+                    "dedup_ratio": dedup_ratio
                 },
                 "metadata": {
                     "total_execution_time_ms": total_execution_time * 1000,